@@ -0,0 +1,243 @@
+"""
+Asyncio counterpart of sim_runner for running sweeps inside an asyncio service.
+
+The replications are dispatched to an executor (the persistent worker pool of sim_runner by
+default), so the event loop stays free. iter_simulations yields the results as an async iterator in completion order,
+with back-pressure (at most max_pending replications are submitted ahead of the consumer),
+per-task timeouts and cancellation: closing the iterator or cancelling the consuming task
+cancels every replication that has not started yet.
+
+The timeout of a replication in a process pool counts from its start in the worker, which
+interrupts it (sim_runner._timed_run) and is free again right away. Other executors (or a
+platform without SIGALRM) cannot interrupt a running replication: its timeout counts from the
+submission, which is at most its start because no more replications are submitted than there
+are workers, its result is discarded and its worker stays occupied (no new replication is
+submitted in its place) until the replication ends.
+"""
+
+import asyncio
+import os
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Iterable, Tuple, Union
+
+import pandas as pd
+
+from progress import SweepProgress
+from sim_runner import (
+    TIMEOUT_MSG,
+    _share_dir,
+    _timed_run,
+    make_replications,
+    read_scenarios_excel,
+    worker_pool,
+    write_results_excel,
+)
+
+
+async def iter_simulations(
+    params_seq: Iterable[Dict],
+    simulate: Callable,
+    animate=False,
+    chatty=False,
+    workers: int = None,
+    executor: Executor = None,
+    max_pending: int = None,
+    timeout: float = None,
+    progress: SweepProgress = None,
+    shared_outputs: Union[bool, str] = False,
+) -> AsyncIterator[Dict]:
+    """
+    Run a simulation for each parameter set and yield the results as they complete.
+    workers: number of processes of the persistent worker pool (sim_runner.worker_pool),
+        used if no executor is given (default: number of cpus)
+    executor: executor to run the simulations in (not shut down afterwards); pass its number
+        of workers as workers
+    max_pending: maximum number of submitted, unfinished replications (default and maximum:
+        workers, so that every submitted replication starts immediately)
+    timeout: wall time in seconds per replication from its start (see above); a replication that
+        takes longer yields a result with only its parameters and msg "simulation timed out"
+    A replication that raises yields its parameters with msg "another exception: ...",
+    like simulate does for exceptions during the run.
+    shared_outputs: return the logs and time series as shared handles, as in
+        sim_runner.run_simulations
+    """
+    async for _, result in _iter_indexed(
+        params_seq,
+        simulate,
+        animate,
+        chatty,
+        workers,
+        executor,
+        max_pending,
+        timeout,
+        progress,
+        shared_outputs,
+    ):
+        yield result
+
+
+async def _iter_indexed(
+    params_seq: Iterable[Dict],
+    simulate: Callable,
+    animate: bool,
+    chatty: bool,
+    workers: int,
+    executor: Executor,
+    max_pending: int,
+    timeout: float,
+    progress: SweepProgress,
+    shared_outputs: Union[bool, str] = False,
+) -> AsyncIterator[Tuple[int, Dict]]:
+    """iter_simulations, yielding (index in params_seq, result)."""
+    loop = asyncio.get_running_loop()
+    if executor is None:
+        executor = worker_pool(workers)
+    n_workers = workers or os.cpu_count() or 1
+    max_pending = n_workers if max_pending is None else min(max_pending, n_workers)
+    # the workers of a process pool interrupt a replication themselves when its time is up
+    worker_timeout = isinstance(executor, ProcessPoolExecutor) and hasattr(signal, "setitimer")
+    run = partial(
+        _timed_run,
+        simulate=simulate,
+        animate=animate,
+        chatty=chatty,
+        share_dir=_share_dir(shared_outputs),
+        timeout=timeout if worker_timeout else None,
+    )
+    loop_timeout = None if worker_timeout else timeout
+    params_iter = enumerate(params_seq)
+    # the next replication is fetched ahead, so that the end of params_seq is known also when
+    # every worker is occupied by a timed out replication
+    upcoming = next(params_iter, None)
+    # submitted replications that occupy a worker: future -> (index, params, deadline)
+    pending: Dict[asyncio.Future, Tuple[int, Dict, float]] = {}
+    timed_out = set()  # pending futures whose result is discarded
+
+    def submit() -> None:
+        nonlocal upcoming
+        while len(pending) < max_pending and upcoming is not None:
+            index, params = upcoming
+            future = loop.run_in_executor(executor, run, params)
+            deadline = loop.time() + loop_timeout if loop_timeout is not None else None
+            pending[future] = (index, params, deadline)
+            upcoming = next(params_iter, None)
+
+    try:
+        submit()
+        # timed out replications still running are not waited for at the end
+        while len(pending) > len(timed_out) or (pending and upcoming is not None):
+            deadlines = [
+                deadline
+                for future, (_, _, deadline) in pending.items()
+                if deadline is not None and future not in timed_out
+            ]
+            wait_time = max(0, min(deadlines) - loop.time()) if deadlines else None
+            done, _ = await asyncio.wait(
+                pending, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED
+            )
+            finished = []
+            for future in done:
+                index, params, _ = pending.pop(future)
+                if future in timed_out:
+                    timed_out.discard(future)
+                else:
+                    finished.append((index, _task_result(future, params, progress)))
+            now = loop.time()
+            for future, (index, params, deadline) in pending.items():
+                if deadline is not None and deadline <= now and future not in timed_out:
+                    timed_out.add(future)
+                    finished.append((index, _timeout_result(params, loop_timeout, progress)))
+            for index, result in finished:
+                yield index, result
+            submit()  # only after the consumer asked for more: back-pressure
+    finally:
+        for future in pending:  # cancels the replications that have not started yet
+            future.cancel()
+
+
+def _timeout_result(params: Dict, timeout: float, progress: SweepProgress) -> Dict:
+    result = {**params, "msg": TIMEOUT_MSG}
+    if progress is not None:
+        progress.task_done(result, timeout, worker="timeout")
+    return result
+
+
+def _task_result(task: asyncio.Future, params: Dict, progress: SweepProgress) -> Dict:
+    try:
+        result, wall_time, worker = task.result()
+    except Exception as e:
+        result, wall_time, worker = {**params, "msg": f"another exception: {e}"}, 0, "error"
+    if progress is not None:
+        progress.task_done(result, wall_time, worker=worker)
+    return result
+
+
+async def run_simulations_async(
+    params_seq: Iterable[Dict],
+    simulate: Callable,
+    animate=False,
+    chatty=False,
+    sink: "JsonlResultWriter" = None,
+    progress: SweepProgress = None,
+    workers: int = None,
+    executor: Executor = None,
+    max_pending: int = None,
+    timeout: float = None,
+    shared_outputs: Union[bool, str] = False,
+) -> pd.DataFrame:
+    """
+    Async counterpart of sim_runner.run_simulations: the results are appended to the sink
+    as they complete, the returned dataframe is in the order of params_seq.
+    """
+    rows = {}
+    async for index, result in _iter_indexed(
+        params_seq,
+        simulate,
+        animate,
+        chatty,
+        workers,
+        executor,
+        max_pending,
+        timeout,
+        progress,
+        shared_outputs,
+    ):
+        rows[index] = result if sink is None else sink.append(result)
+    return pd.DataFrame([rows[index] for index in sorted(rows)])
+
+
+async def run_scenarios_async(
+    input_filename: str,
+    output_filename: str,
+    simulate: Callable,
+    num_replications=10,
+    reproducible=True,
+    start_seed=0,
+    sink=None,
+    progress_filename: str = None,
+    antithetic=False,
+    workers: int = None,
+    timeout: float = None,
+) -> pd.DataFrame:
+    """Async counterpart of sim_runner.run_scenarios; the Excel files are read and written in a thread."""
+    scenarios = await asyncio.to_thread(read_scenarios_excel, input_filename)
+    replications = make_replications(
+        scenarios, num_replications, reproducible, start_seed, antithetic
+    )
+    progress = (
+        SweepProgress(len(replications), progress_filename)
+        if progress_filename
+        else None
+    )
+    results = await run_simulations_async(
+        replications,
+        simulate,
+        sink=sink,
+        progress=progress,
+        workers=workers,
+        timeout=timeout,
+    )
+    await asyncio.to_thread(write_results_excel, results, output_filename)
+    return results
@@ -2,9 +2,11 @@
 Module providing basic ingredients for animating discrete processes using Salabim.
 """
 
+import os
+import tempfile
 import salabim as sim
-from typing import Callable, Tuple, Union
-from math import sqrt
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from math import ceil, inf, nan, sqrt
 
 
 ZOOM = 1
@@ -34,8 +36,71 @@ STATION_QUEUE_DIRECTION = "n"
 TANK_WIDTH = STATION_WIDTH * 2 / 3
 TANK_HEIGHT = STATION_HEIGHT
 
+STATIC_LAYER = 1_000_000  # opaque background image, below every other animation object
 
-class BasicEntity(sim.Component):
+
+def _first_resource(args) -> Union[sim.Resource, None]:
+    """Return the first resource of request/release arguments (resource or (resource, quantity, ...))."""
+    if not args:
+        return None
+    return args[0][0] if isinstance(args[0], (tuple, list)) else args[0]
+
+
+class DualModeComponent(sim.Component):
+    """
+    Component with its process written once, as generator method steps(), that runs in both
+    salabim modes (sim.Environment(yieldless=True/False)).
+    In steps(), blocking calls are written as `yield self.hold(...)` (request, passivate, ...)
+    and blocking helpers, written as generators as well, are called with `yield from`.
+    Yieldless, the blocking calls switch greenlets and the yields only pass None up;
+    yield based, salabim drives the generator itself.
+    Subclasses that define process() themselves work as with sim.Component.
+    hold, request, release, passivate and activate are counted and traced (see trace).
+    """
+
+    @property
+    def process(self):
+        if not hasattr(self, "steps"):
+            return None  # data component
+        return self._run_steps if self.env.yieldless() else self.steps
+
+    def _run_steps(self):
+        for _ in self.steps():
+            pass
+
+    def trace(self, kind: str, station=None) -> None:
+        """
+        Count an event in env.n_events and record it in the binary event trace of the environment,
+        if any (see event_trace).
+        """
+        env = self.env
+        env.n_events = getattr(env, "n_events", 0) + 1
+        recorder = getattr(env, "event_recorder", None)
+        if recorder is not None:
+            recorder.record(self, kind, station)
+
+    def hold(self, *args, **kwargs):
+        self.trace("hold")
+        return super().hold(*args, **kwargs)
+
+    def request(self, *args, **kwargs):
+        self.trace("request", _first_resource(args))
+        return super().request(*args, **kwargs)
+
+    def release(self, *args):
+        self.trace("release", _first_resource(args))
+        return super().release(*args)
+
+    def passivate(self, *args, **kwargs):
+        self.trace("passivate")
+        return super().passivate(*args, **kwargs)
+
+    def activate(self, *args, **kwargs):
+        self.trace("activate")
+        return super().activate(*args, **kwargs)
+
+
+class BasicEntity(DualModeComponent):
     """
     Basic entity component with a graphic representation as rectangle and text.
     """
@@ -80,10 +145,36 @@ class BasicEntity(sim.Component):
             layer=-1,
             parent=self,
         )
+        self._queue_aos = {}  # queue id -> (appearance, animation_objects), see animation_objects
+        self.record(
+            "create",
+            self.name(),
+            x,
+            y,
+            width,
+            height,
+            fillcolor,
+            textcolor,
+            font,
+            fontsize,
+            speed,
+            visible,
+        )
+
+    def remove_animation_children(self) -> None:
+        self.record("end")
+        super().remove_animation_children()
+
+    def record(self, kind: str, *args) -> None:
+        """Record a change of the visual state in the animation recording of the environment, if any (see replay)."""
+        recorder = getattr(self.env, "animation_recorder", None)
+        if recorder is not None:
+            recorder.record_entity(self, kind, *args)
 
     def visible(self, visible: bool = True):
         self.anim_rect.update(visible=visible)
         self.anim_text.update(visible=visible)
+        self.record("visible", visible)
 
     def invisible(self):
         self.visible(False)
@@ -92,6 +183,7 @@ class BasicEntity(sim.Component):
         duration = 0 if duration is None else self.env.spec_to_duration(duration)
         t1 = self.env.now() + max(0, duration)
         self.anim_rect.update(fillcolor1=fillcolor, t1=t1)
+        self.record("fillcolor", fillcolor, t1)
 
     def move(self, x1: float, y1: float, duration: float = None):
         """
@@ -116,6 +208,7 @@ class BasicEntity(sim.Component):
             y1=y1 + self.height / 2,
             t1=t1,
         )
+        self.record("move", x1, y1, t1)
         self.x = x1
         self.y = y1
 
@@ -128,10 +221,26 @@ class BasicEntity(sim.Component):
     ) -> None:
         """
         Move the entity to new coordinates (uniform motion on straight line)
-        without self.hold().
+        and hold it for the duration of the motion.
         If duration=None, use speed and distance to compute duration.
-        Use this to move an entity from within its own process, holding it for
-        the duration of the motion.
+        Use this to move an entity from within its own yieldless process.
+        In steps() (see DualModeComponent) use `yield from self.move_and_hold_steps(...)`.
+        """
+        if not self.env.yieldless():
+            raise TypeError("in a yield based process use yield from self.move_and_hold_steps(...)")
+        for _ in self.move_and_hold_steps(x1, y1, duration, mode):
+            pass
+
+    def move_and_hold_steps(
+        self,
+        x1: float,
+        y1: float,
+        duration: Union[float, Callable] = None,
+        mode: str = None,
+    ) -> Iterator[None]:
+        """
+        move_and_hold as generator, for steps() in both process modes:
+        `yield from self.move_and_hold_steps(...)` (see DualModeComponent).
         """
         self.x = self.anim_rect.x()
         self.y = self.anim_rect.y()
@@ -149,7 +258,8 @@ class BasicEntity(sim.Component):
             y1=y1 + self.height / 2,
             t1=t1,
         )
-        self.hold(till=t1, mode=mode)
+        self.record("move", x1, y1, t1)
+        yield self.hold(till=t1, mode=mode)
         self.x = x1
         self.y = y1
 
@@ -157,19 +267,267 @@ class BasicEntity(sim.Component):
         """
         Return a list of animation objects for this entity. Used by sim.AnimateQueue.
         See documentation of sim.AnimateQueue for details.
-        TODO: Maybe we can return the animation objects directly?
+        The objects are cached per queue id and shown again when the entity re-enters the queue
+        with the same appearance (name, colors, font, size); any other appearance builds new ones.
         """
-        ao0 = sim.AnimateRectangle(
-            text=self.name(),
-            textcolor=self.anim_text.textcolor(),
-            font=self.anim_text.font(),
-            fontsize=self.anim_text.fontsize(),
-            spec=(0, 0, self.width, self.height),
-            linewidth=0,
-            fillcolor=self.anim_rect.fillcolor(),
-            parent=self,
+        appearance = (
+            self.name(),
+            self.anim_text.textcolor(),
+            self.anim_text.font(),
+            self.anim_text.fontsize(),
+            self.anim_rect.fillcolor(),
+            self.width,
+            self.height,
+        )
+        cached_appearance, cached = self._queue_aos.get(id, (None, None))
+        if cached is not None and cached[2].is_removed():
+            # AnimateQueue removed it when the entity left the queue
+            if cached_appearance == appearance:
+                cached[2].show()
+                return cached
+            cached = None
+        name, textcolor, font, fontsize, fillcolor, width, height = appearance
+        animation_objects = (
+            width * 1.1,
+            height * 1.1,
+            sim.AnimateRectangle(
+                text=name,
+                textcolor=textcolor,
+                font=font,
+                fontsize=fontsize,
+                spec=(0, 0, width, height),
+                linewidth=0,
+                fillcolor=fillcolor,
+                parent=self,
+            ),
         )
-        return (self.width * 1.1, self.height * 1.1, ao0)
+        if cached is None:  # a cached object still shown belongs to another use of the queue id
+            self._queue_aos[id] = (appearance, animation_objects)
+        return animation_objects
+
+
+def stats_only_monitors(*objects) -> None:
+    """
+    Let every monitor of the objects (components, queues, resources, states, stores), including
+    the monitors of their internal queues, keep only running statistics instead of the full history.
+    Use it before the run: the monitors are reset.
+    This bounds the memory of the monitors, not of the model: the components in the system are kept
+    anyway. It is no speed-up: salabim updates the running statistics in Python on every tally, which
+    costs more than appending to the history. In chem_simulation (seed 1, 1000 days, rate_multiplier
+    0.5) the run takes 20% longer and its peak memory drops from 12.4 to 8.9 MB, the batches in
+    the system being most of the rest.
+    The status and mode monitors of components hold strings, which salabim cannot add to running
+    statistics (every tally raises and catches a ValueError), so they are switched off instead;
+    status() and mode() keep working.
+    """
+    for obj in objects:
+        for name, value in vars(obj).items():
+            if isinstance(value, sim.Monitor):
+                value.reset(stats_only=True)
+                if name in ("status", "mode") and isinstance(obj, sim.Component):
+                    value.monitor(False)
+                elif name == "available_quantity" and isinstance(obj, sim.Queue) and obj.capacity() == inf:
+                    value.monitor(False)  # always inf
+            elif isinstance(value, sim.Queue) and value is not obj:
+                stats_only_monitors(value)
+
+
+def on_tally(monitor: sim.Monitor, callback: Callable[[float], None]) -> None:
+    """Call callback(value) after every value tallied by the monitor (this instance only)."""
+    monitor_tally = monitor.tally
+
+    def tally(value, weight=1):
+        monitor_tally(value, weight)
+        callback(value)
+
+    monitor.tally = tally
+
+
+class QuantileSketch:
+    """
+    Constant memory estimate of quantiles of a stream of values with the P-square algorithm
+    (Jain and Chlamtac, 1985): five markers per quantile instead of the full history.
+    The first five values of each quantile are kept exactly.
+    """
+
+    def __init__(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)):
+        self.probabilities = tuple(quantiles)
+        assert all(0 < p < 1 for p in self.probabilities)
+        self.n = 0
+        self._heights = [[] for _ in self.probabilities]
+        self._positions = [[1, 2, 3, 4, 5] for _ in self.probabilities]
+        self._desired = [[1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5] for p in self.probabilities]
+        self._increments = [[0, p / 2, p, (1 + p) / 2, 1] for p in self.probabilities]
+
+    @classmethod
+    def attach(cls, monitor: sim.Monitor, quantiles: Iterable[float]) -> "QuantileSketch":
+        """Return a sketch that is fed with every value tallied by the (non level) monitor."""
+        sketch = cls(quantiles)
+        on_tally(monitor, sketch.add)
+        return sketch
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        if self.n <= 5:
+            for heights in self._heights:
+                heights.append(value)
+                heights.sort()
+            return
+        for q, n, desired, increments in zip(
+            self._heights, self._positions, self._desired, self._increments
+        ):
+            if value < q[0]:
+                q[0] = value
+                k = 0
+            elif value >= q[4]:
+                q[4] = value
+                k = 3
+            else:
+                k = 0
+                while value >= q[k + 1]:
+                    k += 1
+            for i in range(k + 1, 5):
+                n[i] += 1
+            for i in range(5):
+                desired[i] += increments[i]
+            for i in (1, 2, 3):
+                d = desired[i] - n[i]
+                if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                    d = 1 if d > 0 else -1
+                    parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                        (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                        + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                    )
+                    if q[i - 1] < parabolic < q[i + 1]:
+                        q[i] = parabolic
+                    else:  # linear prediction keeps the markers ordered
+                        q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                    n[i] += d
+
+    def quantile(self, p: float) -> float:
+        """Return the estimate of quantile p (one of the quantiles of the sketch), nan if empty."""
+        heights = self._heights[self.probabilities.index(p)]
+        if self.n == 0:
+            return float("nan")
+        if self.n <= 5:  # exact, with linear interpolation like numpy
+            position = p * (self.n - 1)
+            i = int(position)
+            j = min(i + 1, self.n - 1)
+            return heights[i] + (heights[j] - heights[i]) * (position - i)
+        return heights[2]
+
+    def quantiles(self) -> Dict[float, float]:
+        return {p: self.quantile(p) for p in self.probabilities}
+
+
+class WindowedStatistics:
+    """
+    Statistics per time window of a monitor, aggregated on every tally, so no history is needed.
+    Windows are [t0 + k * window, t0 + (k + 1) * window), e.g. shifts (8 hours) or days (24 hours).
+    Level monitors (queue length, occupancy, states): time weighted mean and maximum of the level.
+    Other monitors (length of stay): number, mean and maximum of the values tallied in the window.
+    """
+
+    def __init__(self, monitor: sim.Monitor, window: float, t0: float = 0):
+        assert window > 0
+        self.window = window
+        self.t0 = t0
+        self.env = monitor.env
+        self.level = monitor._level
+        self._rows: Dict[int, list] = {}  # window index -> [sum, weight, maximum]
+        self._value = float(monitor._tally) if self.level else None
+        self._t = self.env.now()
+
+    @classmethod
+    def attach(cls, monitor: sim.Monitor, window: float, t0: float = 0) -> "WindowedStatistics":
+        """Return windowed statistics that are fed with every value tallied by the monitor."""
+        statistics = cls(monitor, window, t0)
+        on_tally(monitor, statistics.add)
+        return statistics
+
+    def index(self, t: float) -> int:
+        return int((t - self.t0) // self.window)
+
+    def _row(self, k: int) -> list:
+        row = self._rows.get(k)
+        if row is None:
+            row = self._rows[k] = [0.0, 0.0, -inf]
+        return row
+
+    def _accrue(self, t: float) -> None:
+        """Add the current level from the last tally until t to the windows in between."""
+        k = self.index(self._t)
+        while self._t < t:
+            end = min(t, self.t0 + (k + 1) * self.window)
+            row = self._row(k)
+            row[0] += self._value * (end - self._t)
+            row[1] += end - self._t
+            row[2] = max(row[2], self._value)
+            self._t = end
+            k += 1
+
+    def add(self, value: float) -> None:
+        value = float(value)  # states can be bool
+        now = self.env.now()
+        if self.level:
+            self._accrue(now)
+            self._value = value
+        else:
+            row = self._row(self.index(now))
+            row[0] += value
+            row[1] += 1
+            row[2] = max(row[2], value)
+
+    def rows(self) -> Dict[int, Dict[str, float]]:
+        """Statistics per window index, up to now (mean and max, and n for non level monitors)."""
+        if self.level:
+            self._accrue(self.env.now())
+        rows = {}
+        for k, (total, weight, maximum) in sorted(self._rows.items()):
+            row = {"mean": total / weight if weight else nan, "max": maximum}
+            if not self.level:
+                row["n"] = int(weight)
+            rows[k] = row
+        return rows
+
+
+def resource_window_statistics(
+    resource: sim.Resource, window: float
+) -> Dict[str, WindowedStatistics]:
+    """Windowed utilization (occupancy), queue length and waiting time of a resource."""
+    return {
+        "utilization": WindowedStatistics.attach(resource.occupancy, window),
+        "queue_length": WindowedStatistics.attach(resource.requesters().length, window),
+        "waiting_time": WindowedStatistics.attach(resource.requesters().length_of_stay, window),
+    }
+
+
+def window_report(statistics: Dict[str, WindowedStatistics]) -> List[Dict]:
+    """
+    Merge named windowed statistics (with the same windows) into one row per window, from the
+    first window up to now: window_start, window_end, <name>_mean, <name>_max (and <name>_n).
+    """
+    if not statistics:
+        return []
+    first = next(iter(statistics.values()))
+    rows = {name: s.rows() for name, s in statistics.items()}
+    # the window that ends at now is the last one
+    last_window = ceil((first.env.now() - first.t0) / first.window) - 1
+    last = max(last_window, *(max(r, default=0) for r in rows.values()))
+    report = []
+    for k in range(last + 1):
+        row = {
+            "window_start": first.t0 + k * first.window,
+            "window_end": first.t0 + (k + 1) * first.window,
+        }
+        for name, s in statistics.items():
+            empty = {"mean": nan, "max": nan}
+            if not s.level:
+                empty = {**empty, "n": 0}
+            for key, value in rows[name].get(k, empty).items():
+                row[f"{name}_{key}"] = value
+        report.append(row)
+    return report
 
 
 class BasicStation:
@@ -200,6 +558,23 @@ class BasicStation:
         self.y = y
         self.width = width
         self.height = height
+        # geometry and colors, used to rebuild the station visuals (e.g. for replay)
+        self.layout = dict(
+            display_name=display_name,
+            x=x,
+            y=y,
+            width=width,
+            height=height,
+            fillcolor=fillcolor,
+            textcolor=textcolor,
+            font=font,
+            fontsize=fontsize,
+            text_anchor=text_anchor,
+            label_color=label_color,
+            label_indent=label_indent,
+            label_offset=label_offset,
+        )
+        self.label_monitors = []
         self.anim_background = sim.AnimateRectangle(
             spec=(
                 self.x,
@@ -214,8 +589,10 @@ class BasicStation:
             textcolor=textcolor,
             text_anchor=text_anchor,
         )
+        self._label_text = None  # cached label text, None means it has to be recomputed
+        self._label_watched = False  # the cache is only used when the label monitors are watched
         self.anim_label = sim.AnimateText(
-            text=lambda _: self.label(),
+            text=lambda _: self.label_text(),
             x=self.x + label_indent,
             y=self.y - label_offset,
             textcolor=label_color,
@@ -227,6 +604,35 @@ class BasicStation:
     def label(self) -> str:
         return ""
 
+    def label_text(self) -> str:
+        """
+        Return the label, computed only once after each state change instead of on every frame.
+        Subclasses register the monitors their label depends on with watch_label.
+        """
+        if not self._label_watched:
+            return self.label()
+        if self._label_text is None:
+            self._label_text = self.label()
+        return self._label_text
+
+    def invalidate_label(self) -> None:
+        self._label_text = None
+
+    def watch_label(self, *monitors: sim.Monitor) -> None:
+        """
+        Invalidate the label whenever one of the monitors is tallied, i.e. its state changes.
+        Only done when the environment animates; labels are not drawn in headless runs.
+        """
+        self.label_monitors.extend(monitors)
+        if not monitors or not monitors[0].env.animate():
+            return
+        self._label_watched = True
+        for monitor in monitors:
+            on_tally(monitor, self._on_label_monitor)
+
+    def _on_label_monitor(self, value) -> None:
+        self._label_text = None
+
 
 class CounterStation(BasicStation):
     """
@@ -249,12 +655,15 @@ class CounterStation(BasicStation):
 
     def inc_count(self, step: int = 1) -> None:
         self.count.set(self.count() + step)
+        self.invalidate_label()
 
     def dec_count(self, step: int = 1) -> None:
         self.count.set(self.count() - step)
+        self.invalidate_label()
 
     def reset_count(self, value: int = 0) -> None:
         self.count.set(value)
+        self.invalidate_label()
 
 
 class QueueStation(sim.Queue, BasicStation):
@@ -273,15 +682,39 @@ class QueueStation(sim.Queue, BasicStation):
         x: float = 0,
         y: float = 0,
         display_name: str = "station",
+        stats_only: bool = False,
+        quantiles: Iterable[float] = (),
+        window: float = None,
         **kwargs,
     ):
+        """
+        stats_only: keep only running statistics (mean, max, time weighted mean, ...) in the
+            length and length_of_stay monitors instead of their full history (see stats_only_monitors)
+        quantiles: estimate these quantiles of the length of stay in length_of_stay_quantiles
+        window: keep statistics of the queue length and length of stay per window of this
+            length in window_statistics (see window_report)
+        """
         self.x = x
         self.y = y
         self.queue_offset = queue_offset
         sim.Queue.__init__(self, **kwargs)
+        if stats_only:
+            stats_only_monitors(self)
+        self.length_of_stay_quantiles = (
+            QuantileSketch.attach(self.length_of_stay, quantiles) if quantiles else None
+        )
+        self.window_statistics = (
+            {
+                "queue_length": WindowedStatistics.attach(self.length, window),
+                "length_of_stay": WindowedStatistics.attach(self.length_of_stay, window),
+            }
+            if window
+            else None
+        )
         BasicStation.__init__(
             self, **kwargs, display_name=display_name, x=x, y=y, fillcolor="red"
         )
+        self.watch_label(self.length)
         self.anim_queue = (
             sim.AnimateQueue(
                 self,
@@ -316,10 +749,35 @@ class ResourceStation(sim.Resource, BasicStation):
         queue_max_length=None,
         queue_offset=STATION_QUEUE_OFFSET,
         queue_direction=STATION_QUEUE_DIRECTION,
+        stats_only: bool = False,
+        quantiles: Iterable[float] = (),
+        window: float = None,
         **kwargs,
     ):
+        """
+        stats_only: keep only running statistics in the monitors of the resource and its
+            requesters and claimers queues instead of their full history (see stats_only_monitors)
+        quantiles: estimate these quantiles of the waiting time (length of stay in the
+            requesters queue) in waiting_time_quantiles
+        window: keep statistics of the utilization, queue length and waiting time per window
+            of this length in window_statistics (see window_report)
+        """
         sim.Resource.__init__(self, **kwargs)
+        if stats_only:
+            stats_only_monitors(self)
+        self.waiting_time_quantiles = (
+            QuantileSketch.attach(self.requesters().length_of_stay, quantiles)
+            if quantiles
+            else None
+        )
+        self.window_statistics = resource_window_statistics(self, window) if window else None
         BasicStation.__init__(self, **kwargs)
+        self.watch_label(
+            self.claimed_quantity,
+            self.capacity,
+            self.requesters().length,
+            self.claimers().length,
+        )
         self.anim_queue = (
             sim.AnimateQueue(
                 self.requesters(),
@@ -342,3 +800,44 @@ class ResourceStation(sim.Resource, BasicStation):
 
     def label(self) -> str:
         return f"cap: {self.claimed_quantity()}/{self.capacity()}\nqueue: {len(self.requesters())}\ndone: {self.claimers().number_of_departures}"
+
+
+def render_static(
+    animation_objects: Iterable, env: sim.Environment = None, layer: float = STATIC_LAYER
+) -> sim.AnimateImage:
+    """
+    Render animation objects that never change once into a single opaque background image
+    and replace them by it.
+    Salabim otherwise re-evaluates and pastes every object on every frame; after this call
+    only the dynamic objects (entities, queues, labels) are drawn per frame.
+    """
+    from PIL import Image  # only needed when animating
+
+    animation_objects = list(animation_objects)
+    env = env or animation_objects[0].env
+    static = set(animation_objects)
+    # texts of rectangles, polygons, ... are separate (depending) objects in salabim
+    static.update(ao.depending_object for ao in animation_objects if ao.depending_object)
+    others = [ao for ao in env.an_objects if ao not in static]
+    for ao in others:
+        ao.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "static.png")
+        env.snapshot(filename)
+        with Image.open(filename) as snapshot:
+            # opaque: pasting the partly transparent text edges would blend them a second time
+            image = snapshot.convert("RGB")
+    for ao in others:
+        ao.show()
+    for ao in animation_objects:
+        ao.remove()
+    return sim.AnimateImage(
+        image, x=0, y=0, anchor="sw", layer=layer, screen_coordinates=True, env=env
+    )
+
+
+def render_static_stations(
+    stations: Iterable[BasicStation], env: sim.Environment = None
+) -> sim.AnimateImage:
+    """Render the background rectangles and names of stations once, see render_static."""
+    return render_static((station.anim_background for station in stations), env=env)
@@ -0,0 +1,134 @@
+"""
+Batch means estimation of steady-state KPIs from a single long run per scenario.
+
+Instead of many short replications, each paying set-up and warm-up, one long run is made and the
+observations after the warm-up are split into non-overlapping batches. The batch size is doubled
+until the lag-1 autocorrelation of the batch means is no longer significant, so the batch means
+can be treated as independent and give a t confidence interval for the steady-state mean.
+
+Observation series taken from a simulate result:
+    time_in_system          per completed batch, in order of completion (needs the batch log)
+    queue_reaction_length   the sampled queue length before the reactor (time average)
+    throughput              completed batches per THROUGHPUT_INTERVAL
+"""
+
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from reporting import CONFIDENCE, t_quantile
+from shared_outputs import SharedTable
+
+MAX_BATCHES = 1024  # number of batches to start the batch size search with
+MIN_BATCHES = 10
+ALPHA = 0.05  # significance level of the autocorrelation test
+THROUGHPUT_INTERVAL = 24  # one day in simulation time (hours)
+
+
+def lag1_autocorrelation(x: np.ndarray) -> float:
+    deviations = x - x.mean()
+    denominator = np.dot(deviations, deviations)
+    if denominator == 0:
+        return 0.0
+    return float(np.dot(deviations[:-1], deviations[1:]) / denominator)
+
+
+def batch_means(
+    x: Iterable[float],
+    confidence: float = CONFIDENCE,
+    alpha: float = ALPHA,
+    min_batches: int = MIN_BATCHES,
+    max_batches: int = MAX_BATCHES,
+) -> Dict:
+    """
+    Batch means estimate of the mean of the (stationary) series x.
+    The batch size starts at len(x) / max_batches and is doubled until the lag-1 autocorrelation
+    of the batch means is not significantly positive (one sided test at level alpha).
+    If that needs fewer than min_batches batches, the last estimate with min_batches or more
+    batches is returned with independent False: the interval is then too narrow.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    z = t_quantile(1 - alpha, np.inf)
+    batch_size = max(1, n // max_batches)
+    estimate = None
+    while n // batch_size >= min_batches:
+        n_batches = n // batch_size
+        means = x[: n_batches * batch_size].reshape(n_batches, batch_size).mean(axis=1)
+        r1 = lag1_autocorrelation(means)
+        estimate = (batch_size, means, r1, r1 <= z / np.sqrt(n_batches))
+        if estimate[3]:
+            break
+        batch_size *= 2
+    if estimate is None:  # too few observations
+        batch_size, means, r1, independent = None, np.array([]), np.nan, False
+        mean = half_width = np.nan
+    else:
+        batch_size, means, r1, independent = estimate
+        mean = means.mean()
+        half_width = float(
+            t_quantile(1 - (1 - confidence) / 2, len(means) - 1)
+            * means.std(ddof=1)
+            / np.sqrt(len(means))
+        )
+    n_batches = len(means)
+    return {
+        "n": n,
+        "batch_size": batch_size,
+        "n_batches": n_batches,
+        "lag1_autocorrelation": r1,
+        "independent": bool(independent),
+        "mean": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "half_width": half_width,
+    }
+
+
+def steady_state_series(
+    result: Dict, warmup: float, throughput_interval: float = THROUGHPUT_INTERVAL
+) -> Dict[str, np.ndarray]:
+    """Return the observation series of a simulate result after the warm-up period."""
+    series = {}
+    log = result["df_log_batches_entered"]
+    if log is None:
+        raise ValueError("Batch means need the batch log, run simulate without stats_only.")
+    if isinstance(log, SharedTable):  # run with shared_outputs
+        log = log.to_frame()
+    log = pd.DataFrame(log, columns=["type", "t_entered_system", "t_left_system"])
+    log = log[log["t_entered_system"] >= warmup].sort_values("t_left_system", kind="stable")
+    time_in_system = log["t_left_system"] - log["t_entered_system"]
+    series["time_in_system"] = time_in_system.to_numpy()
+    for product_type, values in time_in_system.groupby(log["type"], observed=True):
+        series[f"time_in_system_{product_type}"] = values.to_numpy()
+    times, values = result["queue_reaction_length"].decode()
+    series["queue_reaction_length"] = values[times >= warmup].astype(float)
+    bins = np.arange(warmup, result["t_end"] + throughput_interval / 2, throughput_interval)
+    series["throughput"] = np.histogram(log["t_left_system"], bins)[0].astype(float)
+    return series
+
+
+def run_batch_means(
+    scenarios: Iterable[Dict],
+    simulate: Callable,
+    warmup: float,
+    random_seed=0,
+    confidence: float = CONFIDENCE,
+    throughput_interval: float = THROUGHPUT_INTERVAL,
+) -> pd.DataFrame:
+    """
+    Run one long simulation per scenario (use a long run_duration in the scenarios) and return
+    the batch means estimates as a long table indexed by (column, scenario), like
+    reporting.scenario_summary, with the batch size, the number of batches, the lag-1
+    autocorrelation of the batch means and the independent flag as extra columns.
+    """
+    estimates = {}
+    for params in scenarios:
+        result = simulate(**{**params, "random_seed": random_seed, "animate": False})
+        series = steady_state_series(result, warmup, throughput_interval)
+        for column, x in series.items():
+            estimates[(column, params.get("scenario"))] = batch_means(x, confidence)
+    table = pd.DataFrame.from_dict(estimates, orient="index")
+    table.index = pd.MultiIndex.from_tuples(table.index, names=["column", "scenario"])
+    return table.sort_index(level=0, sort_remaining=False)
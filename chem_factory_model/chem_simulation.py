@@ -1,8 +1,23 @@
 import salabim as sim
+import inspect
 import math
-from base_library import BasicEntity, ResourceStation, QueueStation
-import statistics as stat
-import pandas as pd
+from base_library import (
+    BasicEntity,
+    DualModeComponent,
+    QuantileSketch,
+    WindowedStatistics,
+    stats_only_monitors,
+    resource_window_statistics,
+    window_report,
+    ResourceStation,
+    QueueStation,
+    render_static_stations,
+)
+from timeseries import CompressedTimeSeries
+from stability import InstabilityDetector
+from event_trace import EventRecorder
+from replay import AnimationRecorder
+from distributions import BlockExponential, BlockTriangular, variate_stream
 
 # Time units conversion constants
 HOUR = 1
@@ -143,46 +158,86 @@ BILL_OF_MATERIALS = {
 }
 
 
-class QueueMonitor(sim.Component):
-    """A component that monitors and records the state of a queue over time."""
+PRODUCT_COLORS = {
+    "product_1": "green",
+    "product_2": "blue",
+}
+
+# Route of each product through the plant as ordered list of steps:
+#   ("collect", queue, batch size)   wait until batch size batches are in the queue
+#   ("move", station)                move to the station
+#   ("reaction", processing time)    process on the reaction server
+#   ("diminish", batch size)         remove part of the batch group after the reaction
+#   ("process", server, processing time)
+# Names refer to attributes of the environment set up in simulate();
+# a dict attribute (e.g. batch_queue_reaction) is indexed by product type.
+PRODUCT_ROUTES = {
+    "product_1": [
+        ("collect", "batch_queue_reaction", "n_batches_product1"),
+        ("move", "server_reaction"),
+        ("reaction", "server_reaction_product1_pt"),
+        ("diminish", "n_batches_product1"),
+        ("move", "batch_queue_distillation"),
+        ("collect", "batch_queue_distillation", "n_batches_distillation"),
+        ("process", "server_distillation", "server_distillation_pt"),
+        ("process", "server_evaluation", "server_evaluation_product1_pt"),
+        ("process", "server_packaging", "server_packaging_product1_pt"),
+    ],
+    "product_2": [
+        ("collect", "batch_queue_reaction", "n_batches_product2"),
+        ("move", "server_reaction"),
+        ("reaction", "server_reaction_product2_pt"),
+        ("move", "batch_queue_distillation"),
+        ("collect", "batch_queue_crystallization", "n_batches_crystallization"),
+        ("process", "server_crystallization", "server_crystallization_pt"),
+        ("process", "server_evaluation", "server_evaluation_product2_pt"),
+        ("process", "server_packaging", "server_packaging_product2_pt"),
+    ],
+}
+
+
+class QueueMonitor(DualModeComponent):
+    """
+    A component that monitors and records the state of a queue over time.
+    The samples are stored run-length encoded, see timeseries.CompressedTimeSeries.
+    """
 
     def setup(self, queue: sim.Queue, interval: int = 1 * HOUR):
         """Setup method for initializing the queue monitor."""
         self.queue = queue
         self.interval = interval
-        self.data = []
+        self.data = CompressedTimeSeries(interval=interval)
 
-    def process(self):
+    def steps(self):
         """Process method to continuously monitor and record the queue length over time."""
         while True:
-            self.data.append((self.env.now(), len(self.queue)))
-            self.hold(self.interval)
+            self.data.append(self.env.now(), len(self.queue))
+            yield self.hold(self.interval)
 
 
-class ConstantRateSource(sim.Component):
+class ConstantRateSource(DualModeComponent):
     """A source component that generates batches at a constant rate."""
 
-    def setup(self, product_type, arrival_rate):
-        """Setup method for initializing the constant inter-arrival time."""
+    def setup(self, product_type, arrival_rate, inter_arrival_time=None):
+        """
+        Setup method for initializing the constant inter-arrival time.
+        inter_arrival_time: distribution to use instead of sim.Exponential(mean=1 / arrival_rate)
+        """
         self.arrival_rate = arrival_rate
-        self.constant_inter_arrival_time = sim.Exponential(mean=1 / self.arrival_rate)
+        self.constant_inter_arrival_time = (
+            inter_arrival_time or sim.Exponential(mean=1 / self.arrival_rate)
+        )
         self.product_type = product_type
 
-    def process(self):
+    def steps(self):
         """Process method to continuously generate batches at the specified constant rate."""
         while True:
-            self.hold(self.constant_inter_arrival_time)
+            yield self.hold(self.constant_inter_arrival_time())
             Batch(type=self.product_type)
             self.env.n_batches_created[self.product_type] += 1
 
 
-class Part(sim.Component):
-    def setup(self, type, parts=None):
-        self.type = type
-        self.parts = parts
-
-
-class ReactionServer(sim.Component):
+class ReactionServer(DualModeComponent):
     """Custom reaction server that handles processing and cleaning after every 5 batches."""
 
     def setup(
@@ -194,6 +249,9 @@ class ReactionServer(sim.Component):
         x=0,
         y=0,
         display_name="Reaction",
+        stats_only=False,
+        quantiles=(),
+        window=None,
         **kwargs,
     ):
         self.capacity = capacity
@@ -201,8 +259,23 @@ class ReactionServer(sim.Component):
         self.cleaning_time_product2 = cleaning_time_product2
         self.cleaning_time_product_change = cleaning_time_product_change
         self.resource = sim.Resource(capacity=capacity, name="ReactionServer")
+        if stats_only:
+            stats_only_monitors(self.resource)
+        self.waiting_time_quantiles = (
+            QuantileSketch.attach(self.resource.requesters().length_of_stay, quantiles)
+            if quantiles
+            else None
+        )
         self.batches_processed = 0
         self.cleaning = sim.State("cleaning", value=False)
+        self.window_statistics = (
+            {
+                **resource_window_statistics(self.resource, window),
+                "cleaning": WindowedStatistics.attach(self.cleaning.value, window),
+            }
+            if window
+            else None
+        )
         self.current_claimer = None
         self.last_claimer = None
         # For animation, we can create a station
@@ -212,6 +285,7 @@ class ReactionServer(sim.Component):
             x=x,
             y=y,
             display_name=display_name,
+            stats_only=stats_only,
             **kwargs,
         )
         self.anim_queue = sim.AnimateQueue(
@@ -227,31 +301,34 @@ class ReactionServer(sim.Component):
             # titlefontsize=mm.FONT_SIZE,
         )
 
-    def process(self):
+    def steps(self):
         while True:
             if self.batches_processed >= self.env.n_batches_product1:
                 self.batches_processed = 0
                 self.cleaning.set(True)
                 self.resource.set_capacity(0)  # Make resource unavailable
                 if self.current_claimer == "product_1":
-                    self.hold(self.env.cleaning_time_reaction_product1)
+                    yield self.hold(self.env.cleaning_time_reaction_product1)
                 else:
-                    self.hold(self.env.cleaning_time_reaction_product2)
+                    yield self.hold(self.env.cleaning_time_reaction_product2)
                 if (
                     self.current_claimer is not None
                     and self.current_claimer != self.last_claimer
                 ):
-                    self.hold(self.env.cleaning_time_reaction_product_change)
+                    yield self.hold(self.env.cleaning_time_reaction_product_change)
 
                 # Reset batches_processed
                 self.cleaning.set(False)
                 self.resource.set_capacity(self.capacity)
             else:
-                self.passivate()
+                yield self.passivate()
 
 
 class Batch(BasicEntity):
-    """Represents a Batch moving through various processing stages in the simulation."""
+    """
+    Represents a Batch moving through various processing stages in the simulation.
+    The stages are taken from the compiled route of its product type (see PRODUCT_ROUTES).
+    """
 
     def setup(self, type):
 
@@ -260,84 +337,52 @@ class Batch(BasicEntity):
         self.bom = BILL_OF_MATERIALS[type]
         self.raw_materials = self.bom["parts"]
         self.weight = self.bom["weight"]
-        if self.type == "product_1":
-            self.update_fillcolor("green")
-        elif self.type == "product_2":
-            self.update_fillcolor("blue")
+        if self.type in PRODUCT_COLORS:
+            self.update_fillcolor(PRODUCT_COLORS[self.type])
 
-    def process(self):
+    def steps(self):
         """Process method defining the path and actions of a Batch through the system."""
         t_entered = self.env.now()
+        if self.env.in_system is not None:
+            self.env.in_system[self] = t_entered
         self.invisible()
-        parts = self.collect_parts()
-        self.hold(self.bom["duration"])
-        self.parts = Part(type=self.type, parts=parts)
-
-        if self.type == "product_1":
-            self.collect_batches(
-                self.env.batch_queue_reaction[self.type],
-                self.env.n_batches_product1,
-            )
-        elif self.type == "product_2":
-            self.collect_batches(
-                self.env.batch_queue_reaction[self.type],
-                self.env.n_batches_product2,
-            )
-        self.visible()
-        self.move_and_hold(
-            self.env.server_reaction.station.x,
-            self.env.server_reaction.station.y,
-            duration=self.env.arrival_duration,
-            mode="moving",
-        )
-        self.invisible()
-        # start the subprocess reaction
-        self.subprocess_reaction()
-        if self.type == "product_1":
-            self.diminish_batchgroup(total_batches_in_group=self.env.n_batches_product1)
-        self.visible()
-        self.move_and_hold(
-            self.env.batch_queue_distillation.x,
-            self.env.batch_queue_distillation.y,
-            duration=self.env.arrival_duration,
-            mode="moving",
-        )
-        self.invisible()
+        yield from self.collect_parts()
+        yield self.hold(self.bom["duration"])
+        self.env.n_assembled[self.type] += 1
 
-        if self.type == "product_1":
-            self.collect_batches(
-                self.env.batch_queue_distillation, self.env.n_batches_distillation
-            )
-            self.subprocess_distillation()
-        elif self.type == "product_2":
-            self.collect_batches(
-                self.env.batch_queue_crystallization, self.env.n_batches_crystallization
-            )
-            self.subprocess_crystallization()
+        for step, args in self.env.routes[self.type]:
+            yield from step(self, *args)
 
-        self.subprocess_evaluation()
-        self.subprocess_packaging()
         t_left = self.env.now()
         delta_t = t_left - t_entered
-        self.env.time_in_system.append(delta_t)
+        self.env.time_in_system.tally(delta_t)
         self.env.batches_completed[self.type] += 1
-        self.env.log.append(
-            {
-                "type": self.type,
-                "t_entered_system": t_entered,
-                "t_left_system": t_left,
-            }
+        if self.env.log is not None:
+            self.env.log.append(
+                {
+                    "type": self.type,
+                    "t_entered_system": t_entered,
+                    "t_left_system": t_left,
+                }
+            )
+            del self.env.in_system[self]
+
+    def move_to(self, station):
+        """Show the batch moving to the station."""
+        self.visible()
+        yield from self.move_and_hold_steps(
+            station.x,
+            station.y,
+            duration=self.env.arrival_duration,
+            mode="moving",
         )
+        self.invisible()
 
-    def subprocess_reaction(self):
+    def subprocess_reaction(self, processing_time):
         self.env.server_reaction.current_claimer = self.type
-        self.request(self.env.server_reaction.resource, mode="requesting")
+        yield self.request(self.env.server_reaction.resource, mode="requesting")
         self.visible()
-        if self.type == "product_1":
-            server_reaction_pt = self.env.server_reaction_product1_pt()
-        elif self.type == "product_2":
-            server_reaction_pt = self.env.server_reaction_product2_pt()
-        self.hold(server_reaction_pt, mode="processing")
+        yield self.hold(processing_time(), mode="processing")
         self.release(self.env.server_reaction.resource)
         # Increment the batches_processed counter
         self.env.server_reaction.batches_processed += 1
@@ -346,82 +391,25 @@ class Batch(BasicEntity):
         if self.env.server_reaction.batches_processed >= self.env.n_batches_product1:
             self.env.server_reaction.activate()
 
-    def subprocess_distillation(self):
-        """Subprocess for the first type of analysis."""
-        self.move_and_hold(
-            self.env.server_distillation.x,
-            self.env.server_distillation.y,
+    def subprocess(self, server, processing_time):
+        """Subprocess for a processing station (distillation, crystallization, evaluation, packaging)."""
+        yield from self.move_and_hold_steps(
+            server.x,
+            server.y,
             duration=self.env.arrival_duration,
             mode="moving",
         )
         self.invisible()
-        self.request(self.env.server_distillation)
+        yield self.request(server, mode="requesting")
         self.visible()
-        server_distillation_pt = self.env.server_distillation_pt()
-        self.hold(server_distillation_pt, mode="processing")
-        self.release(self.env.server_distillation)
-
-    def subprocess_crystallization(self):
-        """Subprocess for Cristallizaton."""
-        self.move_and_hold(
-            self.env.server_crystallization.x,
-            self.env.server_crystallization.y,
-            duration=self.env.arrival_duration,
-            mode="moving",
-        )
-        self.invisible()
-        self.request(self.env.server_crystallization, mode="requesting")
-        self.visible()
-        server_crystallization_pt = self.env.server_crystallization_pt()
-
-        self.hold(server_crystallization_pt, mode="processing")
-        self.release(self.env.server_crystallization)
-
-    def subprocess_evaluation(self):
-        """Subprocess for the evaluation."""
-        self.move_and_hold(
-            self.env.server_evaluation.x,
-            self.env.server_evaluation.y,
-            duration=self.env.arrival_duration,
-            mode="moving",
-        )
-        self.invisible()
-        self.request(self.env.server_evaluation)
-        self.visible()
-        if self.type == "product_1":
-            evaluation_pt = self.env.server_evaluation_product1_pt()
-        elif self.type == "product_2":
-            evaluation_pt = self.env.server_evaluation_product2_pt()
-        else:
-            raise Exception("Unknown product type.")
-        self.hold(evaluation_pt, mode="processing")
-        self.release(self.env.server_evaluation)
-
-    def subprocess_packaging(self):
-        """Subprocess for the evaluation."""
-        self.move_and_hold(
-            self.env.server_packaging.x,
-            self.env.server_packaging.y,
-            duration=self.env.arrival_duration,
-            mode="moving",
-        )
-        self.invisible()
-        self.request(self.env.server_packaging)
-        self.visible()
-        if self.type == "product_1":
-            packaging_pt = self.env.server_packaging_product1_pt()
-        elif self.type == "product_2":
-            packaging_pt = self.env.server_packaging_product2_pt()
-        else:
-            raise Exception("Unknown product type.")
-        self.hold(packaging_pt, mode="processing")
-        self.release(self.env.server_packaging)
+        yield self.hold(processing_time(), mode="processing")
+        self.release(server)
 
     def collect_batches(self, q_server, n_batches):
         # Collect n batches before server processing
         q_server.add(self)
         if len(q_server) < n_batches:
-            self.passivate()
+            yield self.passivate()
         else:
             # When n batches are collected, activate all of them
             for batch in list(q_server):
@@ -433,7 +421,7 @@ class Batch(BasicEntity):
     def reorder_parts(self):
         """Reorder the parts needed if projected stock is below reorder point."""
         for type, quantity in self.bom["parts"].items():
-            current_stock = len(self.env.stock[type])
+            current_stock = self.env.stock[type].available_quantity()
             ordered_stock = len([o for o in self.env.orders if o.type == type])
             projected_stock = current_stock + ordered_stock - quantity
             if projected_stock <= BILL_OF_MATERIALS[type]["reorder_point"]:
@@ -441,21 +429,15 @@ class Batch(BasicEntity):
                     Batch(type=type).enter(self.env.orders)
 
     def collect_parts(self):
-        """Wait until all parts are available and get them from stock."""
-        types_needed = [
-            type
-            for type, quantity in self.bom["parts"].items()
-            for _ in range(quantity)
-        ]
-        n = len(types_needed)
-        parts_collected = []
-        while len(types_needed) > 0:
-            part = self.from_store([self.env.stock[type] for type in set(types_needed)])
-            parts_collected.append(part)
-            types_needed.remove(part.type)
-        if len(parts_collected) != n:
-            raise Exception("Not all parts collected.")
-        return sorted(parts_collected, key=lambda p: p.type)
+        """
+        Wait until all parts are available and take them from stock.
+        The claimed stock is never released: it is consumed.
+        """
+        parts = self.bom["parts"]
+        yield self.request(*[(self.env.stock[type], quantity) for type, quantity in parts.items()])
+        consumed = self.env.material_consumed[self.type]
+        for type, quantity in parts.items():
+            consumed[type] += quantity
 
     def diminish_batchgroup(self, total_batches_in_group=5):
         """
@@ -473,7 +455,7 @@ class Batch(BasicEntity):
         batches_to_destroy = list(range(1, num_batches_to_destroy + 1))
 
         if batch_number_in_group in batches_to_destroy:
-            self.move_and_hold(
+            yield from self.move_and_hold_steps(
                 100,
                 0,
                 duration=2,
@@ -484,6 +466,129 @@ class Batch(BasicEntity):
             self.env.count_batches_after_reaction = 0
 
 
+def compile_routes(env: sim.Environment, routes: dict = PRODUCT_ROUTES) -> dict:
+    """
+    Resolve the routes once into lists of (Batch method, arguments) per product type,
+    so batches walk their route without name lookups or product type comparisons.
+    """
+
+    def resolve(name, product_type):
+        value = getattr(env, name)
+        return value[product_type] if isinstance(value, dict) else value
+
+    def station(name, product_type):
+        value = resolve(name, product_type)
+        # the reaction server animates through its station
+        return value.station if isinstance(value, ReactionServer) else value
+
+    compiled = {}
+    for product_type, route in routes.items():
+        steps = []
+        for kind, *names in route:
+            if kind == "collect":
+                queue, batch_size = names
+                step = Batch.collect_batches, (
+                    resolve(queue, product_type),
+                    resolve(batch_size, product_type),
+                )
+            elif kind == "move":
+                step = Batch.move_to, (station(names[0], product_type),)
+            elif kind == "reaction":
+                step = Batch.subprocess_reaction, (resolve(names[0], product_type),)
+            elif kind == "diminish":
+                step = Batch.diminish_batchgroup, (resolve(names[0], product_type),)
+            elif kind == "process":
+                server, processing_time = names
+                step = Batch.subprocess, (
+                    resolve(server, product_type),
+                    resolve(processing_time, product_type),
+                )
+            else:
+                raise ValueError(f"Unknown route step {kind} for {product_type}.")
+            steps.append(step)
+        compiled[product_type] = steps
+    return compiled
+
+
+# parameters that can be changed in a warm state (simulate(fork_at=..., fork=...)):
+# capacities of the downstream servers, batch sizes and the processing times (*_pt_low/high/mode)
+FORKABLE_CAPACITIES = {
+    "server_distillation_capacity": "server_distillation",
+    "server_crystallization_capacity": "server_crystallization",
+    "server_evaluation_capacity": "server_evaluation",
+    "server_packaging_capacity": "server_packaging",
+}
+FORKABLE_BATCH_SIZES = (
+    "n_batches_product1",
+    "n_batches_product2",
+    "n_batches_distillation",
+    "n_batches_crystallization",
+)
+FORKABLE_PT_SUFFIXES = ("_pt_low", "_pt_high", "_pt_mode")
+
+
+def check_forkable(changes: dict) -> None:
+    """Raise ValueError if one of the changed parameters cannot be changed in a warm state."""
+    parameters = inspect.signature(simulate).parameters
+    for key in changes:
+        if not (
+            key in FORKABLE_CAPACITIES
+            or key in FORKABLE_BATCH_SIZES
+            or (key.endswith(FORKABLE_PT_SUFFIXES) and key in parameters)
+        ):
+            raise ValueError(f"{key} cannot be changed in a running simulation.")
+
+
+def waiting_time_quantile_kpis(env: sim.Environment) -> dict:
+    """Estimated waiting time quantiles per server, e.g. distillation_waiting_time_p90."""
+    servers = {
+        "server_reaction": env.server_reaction,
+        "distillation": env.server_distillation,
+        "server_crystallization": env.server_crystallization,
+        "server_evaluation": env.server_evaluation,
+        "server_packaging": env.server_packaging,
+    }
+    return {
+        f"{name}_waiting_time_p{100 * p:g}": value
+        for name, server in servers.items()
+        if server.waiting_time_quantiles is not None
+        for p, value in server.waiting_time_quantiles.quantiles().items()
+    }
+
+
+def material_consumption_kpis(env: sim.Environment) -> dict:
+    """Assembled batches and consumed materials (count and weight) per product type."""
+    kpis = {}
+    for product_type, consumed in env.material_consumed.items():
+        kpis[f"n_assembled_{product_type}"] = env.n_assembled[product_type]
+        for material, quantity in consumed.items():
+            kpis[f"{product_type}_consumed_{material}"] = quantity
+        kpis[f"{product_type}_consumed_weight"] = sum(
+            quantity * BILL_OF_MATERIALS[material]["weight"]
+            for material, quantity in consumed.items()
+        )
+    return kpis
+
+
+def station_window_report(env: sim.Environment) -> list:
+    """Rows per station and window of the windowed statistics of the stations (report_window)."""
+    stations = [
+        *env.batch_queue_reaction.values(),
+        env.server_reaction,
+        env.batch_queue_distillation,
+        env.server_distillation,
+        env.batch_queue_crystallization,
+        env.server_crystallization,
+        env.server_evaluation,
+        env.server_packaging,
+    ]
+    return [
+        {"station": station.name(), **row}
+        for station in stations
+        for row in window_report(station.window_statistics)
+    ]
+
+
 def set_speed(speed: float, env: sim.Environment = None) -> None:
     env.speed(float(speed))
 
@@ -494,6 +599,23 @@ def simulate(
     replication_nr=0,
     random_seed="*",  # Use seed for reproducibility
     animate=ANIMATION,
+    video=None,  # e.g. "run.mp4" (needs opencv) or "frames/frame*.png": render headless
+    video_fps=30,
+    video_speed=ANIMATION_SPEED,  # simulated hours per video second
+    trace_file=None,  # binary event trace, see event_trace.read_event_trace
+    trace_components=None,  # name prefixes, e.g. "batch"; None traces all entities
+    trace_sample_rate=1.0,
+    animation_recording=None,  # file to record the visual state changes to, see replay.replay
+    block_sampling=False,  # draw variates in numpy blocks per distribution (other random sequence)
+    antithetic=False,  # antithetic counterpart of the run with the same seed, needs block_sampling
+    stats_only=False,  # monitors keep running statistics only, no batch log; slower, see stats_only_monitors
+    waiting_time_quantiles=(),  # e.g. (0.5, 0.9): estimated waiting time quantiles per server
+    report_window=None,  # e.g. 8 * HOUR: statistics per shift for every station in window_report
+    fork_at=None,  # time of the warm state for fork(env), see warm_start.fork_continuations
+    fork=None,  # fork(env) -> dict of parameters to continue with after fork_at, see check_forkable
+    yieldless=True,  # salabim process mode: greenlets (True) or generators (False), same results
+    stop_unstable=False,  # stop the run when the WIP keeps growing, see stability.py
+    instability_window=60 * DAY,  # window of the trend test; detection after 2 windows at least
     run_duration=RUN_DURATION,
     rate_multiplier=1,
     n_batches_product1=5,
@@ -538,11 +660,20 @@ def simulate(
     Main simulation function that sets up and runs a simulation scenario.
     """
     params = locals().copy()  # Capture the function arguments as parameters
-    print(locals())
-    env = sim.Environment(random_seed=random_seed)
+    del params["fork"]  # a callback, not a parameter of the results
+    if antithetic and not block_sampling:
+        # salabim distributions share one stream, so the variates of the pair get out of step
+        raise ValueError("antithetic runs need block_sampling (a stream per distribution).")
+    env = sim.Environment(
+        random_seed=random_seed, blind_animation=video is not None, yieldless=yieldless
+    )
     # Animation-Setup
-    env.animate(animate)
+    env.animate(animate or video is not None)
     env.speed(2)
+    if video is not None:
+        env.fps(video_fps)
+        env.speed(video_speed)
+        env.video(video)
     sim.AnimateSlider(
         x=100,
         y=100,
@@ -555,20 +686,35 @@ def simulate(
         env=env,
     )
 
+    env.event_recorder = (
+        EventRecorder(trace_file, trace_components, trace_sample_rate)
+        if trace_file
+        else None
+    )
+    env.animation_recorder = AnimationRecorder(env) if animation_recording else None
+    env.n_events = 0
     env.n_batches_product1 = n_batches_product1
     env.n_batches_product2 = n_batches_product2
     env.n_batches_distillation = n_batches_distillation
     env.n_batches_crystallization = n_batches_crystallization
     env.count_batches_after_reaction = 0
     env.time_entered = 0
-    # setup initial stock
+    # setup initial stock: the stock level of each material is the available quantity of an
+    # anonymous resource, batches consume parts by claiming them
     env.stock = {
-        type: sim.Store(
-            name=type,
-            fill=[Part(type=type) for _ in range(bom["initial_stock"])],
-        )
+        type: sim.Resource(name=type, capacity=bom["initial_stock"], anonymous=True)
         for type, bom in BILL_OF_MATERIALS.items()
     }
+    env.material_consumed = {
+        product_type: dict.fromkeys(BILL_OF_MATERIALS[product_type]["parts"], 0)
+        for product_type in PRODUCT_ROUTES
+    }
+    env.n_assembled = dict.fromkeys(PRODUCT_ROUTES, 0)
+
+    # monitoring options of all stations
+    monitoring = dict(
+        stats_only=stats_only, quantiles=waiting_time_quantiles, window=report_window
+    )
 
     # Batch queue before reaction
     env.batch_queue_reaction = {
@@ -578,6 +724,7 @@ def simulate(
             y=450,
             display_name="Q_P1_RawMaterial",
             queue_direction="n",
+            **monitoring,
         ),
         "product_2": QueueStation(
             name="BatchQueue_Reaction_Product2",
@@ -586,6 +733,7 @@ def simulate(
             display_name="Q_P2_RawMaterial",
             queue_direction="s",
             queue_offset=-40,
+            **monitoring,
         ),
     }
 
@@ -598,12 +746,14 @@ def simulate(
         x=140,
         y=350,
         display_name="Reaction",
+        **monitoring,
     )
     env.batch_queue_distillation = QueueStation(
         name="BatchQueue_Distillation",
         x=250,
         y=500,
         display_name="Store_Distillation",
+        **monitoring,
     )
     env.server_distillation = ResourceStation(
         name="Distillation",
@@ -612,6 +762,7 @@ def simulate(
         y=500,
         width=120,
         display_name="Distillation",
+        **monitoring,
     )
     env.batch_queue_crystallization = QueueStation(
         name="BatchQueue_crystallization",
@@ -620,6 +771,7 @@ def simulate(
         display_name="Store__crystallization",
         queue_direction="s",
         queue_offset=-40,
+        **monitoring,
     )
     env.server_crystallization = ResourceStation(
         name="Crystallization",
@@ -628,6 +780,7 @@ def simulate(
         y=150,
         width=120,
         display_name="Crystallization",
+        **monitoring,
     )
 
     env.server_evaluation = ResourceStation(
@@ -636,6 +789,7 @@ def simulate(
         x=600,
         y=350,
         display_name="Evaluation",
+        **monitoring,
     )
 
     env.server_packaging = ResourceStation(
@@ -644,59 +798,104 @@ def simulate(
         x=800,
         y=350,
         display_name="Packaging",
+        **monitoring,
     )
 
+    stations = [
+        *env.batch_queue_reaction.values(),
+        env.server_reaction.station,
+        env.batch_queue_distillation,
+        env.server_distillation,
+        env.batch_queue_crystallization,
+        env.server_crystallization,
+        env.server_evaluation,
+        env.server_packaging,
+    ]
+    if env.animation_recorder is not None:
+        env.animation_recorder.add_stations(stations)
+        env.animation_recorder.add_queues()
+    if video is not None:
+        # station geometry never changes: render it once instead of on every frame
+        render_static_stations(stations, env=env)
+
+    def triangular(name, low, high, mode, rng=None):
+        """
+        Triangular distribution, block sampled from its own stream if block_sampling is set
+        (rng continues an existing stream, otherwise the stream starts at the seed).
+        """
+        if block_sampling:
+            rng = variate_stream(random_seed, name) if rng is None else rng
+            return BlockTriangular(low, high, mode, rng=rng, antithetic=antithetic)
+        return sim.Triangular(low=low, high=high, mode=mode)
+
+    def exponential(name, mean):
+        """Exponential distribution, block sampled from its own stream if block_sampling is set."""
+        if block_sampling:
+            rng = variate_stream(random_seed, name)
+            return BlockExponential(mean, rng=rng, antithetic=antithetic)
+        return sim.Exponential(mean=mean)
+
     # Define processing times for each station using a Triangular distribution
-    env.server_reaction_product1_pt = sim.Triangular(
+    env.server_reaction_product1_pt = triangular(
+        "server_reaction_product1_pt",
         low=server_reaction_product1_pt_low * HOUR,
         high=server_reaction_product1_pt_high * HOUR,
         mode=server_reaction_product1_pt_mode * HOUR,
     )
-    env.server_reaction_product2_pt = sim.Triangular(
+    env.server_reaction_product2_pt = triangular(
+        "server_reaction_product2_pt",
         low=server_reaction_product2_pt_low * HOUR,
         high=server_reaction_product2_pt_high * HOUR,
         mode=server_reaction_product2_pt_mode * HOUR,
     )
-    env.cleaning_time_product1 = sim.Triangular(
-        low=5 * HOUR, mode=7 * HOUR, high=10 * HOUR
+    env.cleaning_time_product1 = triangular(
+        "cleaning_time_product1", low=5 * HOUR, mode=7 * HOUR, high=10 * HOUR
     )
     env.cleaning_time_reaction_product1 = cleaning_time_reaction_product1
     env.cleaning_time_reaction_product2 = cleaning_time_reaction_product2
     env.cleaning_time_reaction_product_change = cleaning_time_reaction_product_change
 
     # Dreicksverteilungen t
-    env.server_delivery_pt = sim.Triangular(low=3 * HOUR, high=5 * HOUR, mode=4 * HOUR)
-    env.server_distillation_pt = sim.Triangular(
+    env.server_delivery_pt = triangular(
+        "server_delivery_pt", low=3 * HOUR, high=5 * HOUR, mode=4 * HOUR
+    )
+    env.server_distillation_pt = triangular(
+        "server_distillation_pt",
         low=server_distillation_pt_low * HOUR,
         high=server_distillation_pt_high * HOUR,
         mode=server_distillation_pt_mode * HOUR,
         # low=3 * HOUR, high=6 * HOUR, mode=4 * HOUR
     )
-    env.server_crystallization_pt = sim.Triangular(
+    env.server_crystallization_pt = triangular(
+        "server_crystallization_pt",
         low=server_crystallization_pt_low * HOUR,
         high=server_crystallization_pt_high * HOUR,
         mode=server_crystallization_pt_mode * HOUR,
         # low=2 * HOUR, high=2 * HOUR, mode=2 * HOUR
     )
-    env.server_evaluation_product1_pt = sim.Triangular(
+    env.server_evaluation_product1_pt = triangular(
+        "server_evaluation_product1_pt",
         low=server_evaluation_product1_pt_low * HOUR,
         high=server_evaluation_product1_pt_high * HOUR,
         mode=server_evaluation_product1_pt_mode * HOUR,
         # low=0.2 * HOUR, high=0.75 * HOUR, mode=0.4 * HOUR
     )
-    env.server_evaluation_product2_pt = sim.Triangular(
+    env.server_evaluation_product2_pt = triangular(
+        "server_evaluation_product2_pt",
         low=server_evaluation_product2_pt_low * HOUR,
         high=server_evaluation_product2_pt_high * HOUR,
         mode=server_evaluation_product2_pt_mode * HOUR,
         # low=0.2 * HOUR, high=0.75 * HOUR, mode=0.4 * HOUR
     )
-    env.server_packaging_product1_pt = sim.Triangular(
+    env.server_packaging_product1_pt = triangular(
+        "server_packaging_product1_pt",
         low=server_packaging_product1_pt_low * HOUR,
         high=server_packaging_product1_pt_high * HOUR,
         mode=server_packaging_product1_pt_mode * HOUR,
         # low=0.8 * HOUR, high=1.2 * HOUR, mode=1 * HOUR
     )
-    env.server_packaging_product2_pt = sim.Triangular(
+    env.server_packaging_product2_pt = triangular(
+        "server_packaging_product2_pt",
         low=server_packaging_product2_pt_low * HOUR,
         high=server_packaging_product2_pt_high * HOUR,
         mode=server_packaging_product2_pt_mode * HOUR,
@@ -704,41 +903,115 @@ def simulate(
     )
     env.arrival_duration = 1  # Duration for moving between stations
     env.n_batches_created = {
-        "product_1": 0,
-        "product_2": 0,
+        product_type: 0 for product_type in PRODUCT_ROUTES
     }  # Counter for the number of batches created}
     env.batches_completed = {
-        "product_1": 0,
-        "product_2": 0,
+        product_type: 0 for product_type in PRODUCT_ROUTES
     }  # Counter for the number of batches completed
-    env.log = []
-    env.time_in_system = []
+    env.log = None if stats_only else []
+    env.in_system = None if stats_only else {}  # batch -> entry time, until it leaves
+    env.time_in_system = sim.Monitor("time_in_system", stats_only=stats_only)
+    env.routes = compile_routes(env)
 
-    ConstantRateSource(env=env, product_type="product_1", arrival_rate= rate_multiplier / DAY)
-    ConstantRateSource(env=env, product_type="product_2", arrival_rate= rate_multiplier / DAY)
+    sources = [
+        ConstantRateSource(
+            env=env,
+            product_type=product_type,
+            arrival_rate=rate_multiplier / DAY,
+            inter_arrival_time=exponential(
+                f"inter_arrival_time_{product_type}", mean=1 / (rate_multiplier / DAY)
+            ),
+        )
+        for product_type in PRODUCT_ROUTES
+    ]
 
     # Initialize the queue monitor
     monitor_queue_reaction = QueueMonitor(
         env=env, queue=env.server_reaction.resource.requesters()
     )
+    if stats_only:
+        # the long living components and the stores would still record their full history
+        stats_only_monitors(
+            *sources,
+            monitor_queue_reaction,
+            env.server_reaction,
+            env.server_reaction.cleaning,
+            *env.stock.values(),
+        )
     # Start the ReactionServer process
     env.server_reaction.activate()  # t
 
+    detector = (
+        InstabilityDetector(
+            level=lambda: sum(env.n_batches_created.values())
+            - sum(env.batches_completed.values()),
+            window=instability_window,
+        )
+        if stop_unstable
+        else None
+    )
+    if detector is not None and stats_only:
+        stats_only_monitors(detector)
+
+    def unstable():
+        return detector is not None and detector.detected_at is not None
+
+    def continue_with(changes):
+        """Apply changed parameters to the running model (see check_forkable)."""
+        check_forkable(changes)
+        for key, value in changes.items():
+            if key in FORKABLE_CAPACITIES:
+                getattr(env, FORKABLE_CAPACITIES[key]).set_capacity(value)
+            elif key in FORKABLE_BATCH_SIZES:
+                setattr(env, key, value)
+        params.update(changes)
+        pt_keys = [key for key in changes if key.endswith(FORKABLE_PT_SUFFIXES)]
+        for name in {key.rsplit("_", 1)[0] for key in pt_keys}:
+            setattr(
+                env,
+                name,
+                triangular(
+                    name,
+                    low=params[f"{name}_low"] * HOUR,
+                    high=params[f"{name}_high"] * HOUR,
+                    mode=params[f"{name}_mode"] * HOUR,
+                    # continue the stream: restarting it would repeat the warm-up variates
+                    rng=getattr(env, name).rng if block_sampling else None,
+                ),
+            )
+        # in place, so batches already on their route use the new steps as well
+        for product_type, steps in compile_routes(env).items():
+            env.routes[product_type][:] = steps
+
     # Run the simulation
     try:
-        env.run(run_duration)
+        if fork_at is not None:
+            env.run(till=fork_at)
+            if not unstable():
+                continue_with(fork(env))
+        if not unstable():
+            env.run(till=run_duration)
     except sim.SimulationStopped:
         msg = "simulation stopped"
     except Exception as e:
         msg = f"another exception: {e}"
     else:
         msg = "simulation ended"
+    if video is not None:
+        env.video_close()
+    if env.event_recorder is not None:
+        env.event_recorder.close()
+    if env.animation_recorder is not None:
+        env.animation_recorder.save(animation_recording)
 
     # Collect and return simulation results
     return {
         **params,
         "msg": msg,
         "t_end": env.now(),
+        "n_events": env.n_events,  # hold/request/release/passivate/activate calls, see DualModeComponent
+        "unstable": unstable(),
+        "unstable_at": detector.detected_at if unstable() else None,
         # Collect statistics
         "server_reaction_waiting_time_mean": env.server_reaction.resource.requesters().length_of_stay.mean(),
         "server_reaction_waiting_time_max": env.server_reaction.resource.requesters().length_of_stay.maximum(),
@@ -764,11 +1037,25 @@ def simulate(
         "finished_batchesproduct_2": env.batches_completed["product_2"],
         "unfinished_batchesproduct_2": env.n_batches_created["product_2"]
         - env.batches_completed["product_2"],
-        "time_in_system_max": max(env.time_in_system) if env.time_in_system else 0,
+        "time_in_system_max": (
+            env.time_in_system.maximum() if env.time_in_system.number_of_entries() else 0
+        ),
         "time_in_system_mean": (
-            stat.mean(env.time_in_system) if env.time_in_system else 0
+            env.time_in_system.mean() if env.time_in_system.number_of_entries() else 0
         ),
+        **waiting_time_quantile_kpis(env),
+        **material_consumption_kpis(env),
+        "window_report": station_window_report(env) if report_window else None,
         "df_log_batches_entered": (env.log),
+        # batches still in the system at t_end, see flow_metrics
+        "df_log_batches_in_system": (
+            None
+            if env.in_system is None
+            else [
+                {"type": batch.type, "t_entered_system": t_entered}
+                for batch, t_entered in env.in_system.items()
+            ]
+        ),
     }
 
 
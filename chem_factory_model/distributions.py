@@ -0,0 +1,120 @@
+"""
+Block-sampled random variates.
+
+Salabim distributions draw one sample per call through Python code. The classes here draw
+variates in numpy blocks from a dedicated, seeded stream per distribution and serve them
+one by one from a buffer. For a given random_seed and stream name the sequence is reproducible
+and independent of the order in which the other distributions are sampled.
+
+Block variates are generated by inversion (inverse cdf of uniforms), so a distribution can be
+switched to antithetic sampling (1 - u instead of u). Antithetic runs need these per distribution
+streams: with one shared stream, the runs of a pair consume their uniforms in different orders
+after the first few events and are no longer each other's counterparts.
+"""
+
+import zlib
+from typing import Callable
+
+import numpy as np
+
+BLOCK_SIZE = 4096
+
+
+def variate_stream(random_seed, name: str) -> np.random.Generator:
+    """
+    Return the numpy random stream for distribution `name` in a run with random_seed.
+    random_seed "*" or None gives an unseeded (non reproducible) stream, like in salabim.
+    """
+    if random_seed is None or random_seed == "*":
+        return np.random.default_rng()
+    return np.random.default_rng([int(random_seed), zlib.crc32(name.encode())])
+
+
+class BlockSampled:
+    """
+    Distribution that serves samples from blocks of `block_size` variates.
+    ppf(u) has to map a numpy array of uniforms to variates (inverse cumulative distribution function).
+    Call the object to get the next sample, like a salabim distribution.
+    antithetic: use 1 - u instead of u
+    """
+
+    def __init__(
+        self,
+        ppf: Callable[[np.ndarray], np.ndarray],
+        rng: np.random.Generator,
+        block_size: int = BLOCK_SIZE,
+        antithetic: bool = False,
+    ):
+        self.ppf = ppf
+        self.rng = rng
+        self.block_size = block_size
+        self.antithetic = antithetic
+        self._buffer = []
+        self._index = 0
+
+    def __call__(self) -> float:
+        if self._index >= len(self._buffer):
+            u = self.rng.random(self.block_size)
+            if self.antithetic:
+                u = 1.0 - u
+            # tolist: indexing a list of floats is much cheaper than indexing an array
+            self._buffer = self.ppf(u).tolist()
+            self._index = 0
+        value = self._buffer[self._index]
+        self._index += 1
+        return value
+
+    def sample(self) -> float:
+        return self()
+
+
+class BlockTriangular(BlockSampled):
+    """Triangular distribution (low, high, mode), block sampled."""
+
+    def __init__(
+        self,
+        low: float,
+        high: float,
+        mode: float,
+        rng: np.random.Generator,
+        block_size: int = BLOCK_SIZE,
+        antithetic: bool = False,
+    ):
+        assert low <= mode <= high
+        self.low = low
+        self.high = high
+        self.mode = mode
+        super().__init__(self._ppf, rng, block_size, antithetic)
+
+    def _ppf(self, u: np.ndarray) -> np.ndarray:
+        low, high, mode = self.low, self.high, self.mode
+        if low == high:
+            return np.full(len(u), float(low))
+        c = (mode - low) / (high - low)
+        return np.where(
+            u < c,
+            low + np.sqrt(u * (high - low) * (mode - low)),
+            high - np.sqrt((1 - u) * (high - low) * (high - mode)),
+        )
+
+    def mean(self) -> float:
+        return (self.low + self.high + self.mode) / 3
+
+
+class BlockExponential(BlockSampled):
+    """Exponential distribution with the given mean, block sampled."""
+
+    def __init__(
+        self,
+        mean: float,
+        rng: np.random.Generator,
+        block_size: int = BLOCK_SIZE,
+        antithetic: bool = False,
+    ):
+        self._mean = mean
+        super().__init__(
+            lambda u: -mean * np.log1p(-u), rng, block_size, antithetic
+        )
+
+    def mean(self) -> float:
+        return self._mean
@@ -0,0 +1,152 @@
+"""
+Low-overhead binary event trace for simulation runs.
+
+Instead of salabim's text trace (sim.Environment(trace=True)), which formats and prints every event,
+EventRecorder writes fixed-size binary records (time, component, event kind, station) to a buffered file.
+Components can be selected by name prefix and events can be sampled, so the recorder can stay on
+in production sweeps. read_event_trace decodes a trace file into a DataFrame.
+
+File layout: MAGIC, records (RECORD), JSON name tables, 8 byte length of the JSON part.
+"""
+
+import json
+import struct
+from typing import TYPE_CHECKING, Dict, Iterable, Union
+
+import numpy as np
+
+if TYPE_CHECKING:  # pandas is imported when the trace is read, not by simulate
+    import pandas as pd
+
+MAGIC = b"SALABIMTRACE1\n"
+EVENT_KINDS = ("hold", "request", "release", "passivate", "activate")
+RECORD = struct.Struct("<dIBH")  # time, component id, event kind, station id
+RECORD_DTYPE = np.dtype(
+    [("time", "<f8"), ("component", "<u4"), ("kind", "u1"), ("station", "<u2")]
+)
+NO_STATION = 0xFFFF
+BUFFER_SIZE = 1 << 20
+
+_KIND_IDS = {kind: i for i, kind in enumerate(EVENT_KINDS)}
+
+
+class EventRecorder:
+    """
+    Records hold/request/release/passivate/activate events of selected components.
+
+    components: name prefixes of the components to record (e.g. "batch"); None records all
+    sample_rate: fraction of the (selected) events that is recorded, e.g. 0.1 records every 10th event;
+        sampling is deterministic and does not touch the random streams of the simulation
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        components: Union[str, Iterable[str]] = None,
+        sample_rate: float = 1.0,
+        buffer_size: int = BUFFER_SIZE,
+    ):
+        assert 0 < sample_rate <= 1
+        if isinstance(components, str):
+            components = [name.strip() for name in components.split(",")]
+        self.filepath = filepath
+        self.prefixes = None if components is None else tuple(components)
+        self.sample_rate = sample_rate
+        self.n_recorded = 0
+        self._credit = 0.0
+        self._component_ids: Dict = {}  # component -> id, or None if not selected
+        self._component_names = []
+        self._station_ids: Dict[str, int] = {}
+        self._file = open(filepath, "wb", buffering=buffer_size)
+        self._file.write(MAGIC)
+
+    def _component_id(self, component) -> int:
+        try:
+            return self._component_ids[component]
+        except KeyError:
+            name = component.name()
+            if self.prefixes is None or name.startswith(self.prefixes):
+                cid = len(self._component_names)
+                self._component_names.append(name)
+            else:
+                cid = None
+            self._component_ids[component] = cid
+            return cid
+
+    def _station_id(self, station) -> int:
+        name = station.name()
+        try:
+            return self._station_ids[name]
+        except KeyError:
+            sid = self._station_ids[name] = len(self._station_ids)
+            return sid
+
+    def record(self, component, kind: str, station=None) -> None:
+        """
+        Record an event of component.
+        Without station (hold, passivate, activate) the resource that the component claimed last
+        and still holds is used, NO_STATION if it holds none.
+        """
+        cid = self._component_id(component)
+        if cid is None:
+            return
+        if self.sample_rate < 1:
+            self._credit += self.sample_rate
+            if self._credit < 1:
+                return
+            self._credit -= 1
+        if station is None:
+            claimed = component.claimed_resources()  # anonymous resources (stock) are not listed
+            sid = self._station_id(claimed[-1]) if claimed else NO_STATION
+        else:
+            sid = self._station_id(station)
+        self._file.write(RECORD.pack(component.env.now(), cid, _KIND_IDS[kind], sid))
+        self.n_recorded += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        tables = json.dumps(
+            {
+                "kinds": EVENT_KINDS,
+                "components": self._component_names,
+                "stations": sorted(self._station_ids, key=self._station_ids.get),
+            }
+        ).encode()
+        self._file.write(tables)
+        self._file.write(struct.pack("<Q", len(tables)))
+        self._file.close()
+
+    def __enter__(self) -> "EventRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_event_trace(filepath: str) -> "pd.DataFrame":
+    """Read a trace file written by EventRecorder into a DataFrame with time, component, kind and station."""
+    import pandas as pd
+
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{filepath} is not an event trace file")
+    (n_tables,) = struct.unpack("<Q", data[-8:])
+    tables = json.loads(data[-8 - n_tables : -8])
+    n_records = (len(data) - len(MAGIC) - n_tables - 8) // RECORD_DTYPE.itemsize
+    records = np.frombuffer(
+        data, dtype=RECORD_DTYPE, offset=len(MAGIC), count=n_records
+    )
+    stations = np.array(tables["stations"] + [None], dtype=object)
+    station_index = np.where(
+        records["station"] == NO_STATION, len(stations) - 1, records["station"]
+    )
+    return pd.DataFrame(
+        {
+            "time": records["time"],
+            "component": np.array(tables["components"], dtype=object)[records["component"]],
+            "kind": np.array(tables["kinds"], dtype=object)[records["kind"]],
+            "station": stations[station_index],
+        }
+    )
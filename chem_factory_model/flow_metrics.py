@@ -0,0 +1,186 @@
+"""
+WIP, throughput and cycle time over time from the batch log of a run (df_log_batches_entered).
+
+Every log entry has the entry and exit time of a completed batch. The batches still in the system
+at the end of the run (df_log_batches_in_system) have an entry time only; pass them as in_system,
+or pass the whole result dict of simulate, which contains both. A sorted sweep over the event
+times gives the exact WIP step function; searchsorted on the sorted exit times gives the rolling
+throughput and cycle time of the completed batches, all vectorized with numpy.
+
+littles_law_check compares the time average WIP with throughput * mean cycle time (L = lambda W)
+of the completed batches. The difference is caused by the batches that are in the system at the
+start or the end of the interval; it is small in steady state and large for a run that is
+filling up or overloaded. Without in_system the WIP of the unfinished batches is missing.
+"""
+
+import ast
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from shared_outputs import SharedTable
+
+WINDOW = 7 * 24  # one week, hours
+STEP = 24  # one day, hours
+LOG_COLUMNS = ["type", "t_entered_system", "t_left_system"]
+LOG_KEY = "df_log_batches_entered"
+IN_SYSTEM_KEY = "df_log_batches_in_system"
+
+
+def _frame(log) -> pd.DataFrame:
+    if isinstance(log, str):
+        log = ast.literal_eval(log)
+    if log is None or (isinstance(log, float) and np.isnan(log)):  # nan: empty Excel cell
+        raise ValueError("Flow metrics need the batch log, run simulate without stats_only.")
+    if isinstance(log, SharedTable):
+        log = log.to_frame()
+    return pd.DataFrame(log, columns=LOG_COLUMNS)
+
+
+def log_frame(
+    log: Union[dict, list, str, pd.DataFrame], product_type: str = None, in_system=None
+) -> pd.DataFrame:
+    """
+    Return the batch log as a DataFrame. The log can be a result dict of simulate, the list of
+    dicts of a result, its string form (as read from the Excel output), a SharedTable or a
+    DataFrame. The batches in_system (taken from a result dict by default) are added with
+    t_left_system nan. Raises ValueError for a run with stats_only, which has no batch log.
+    If product_type is given, only the batches of that type are returned.
+    """
+    if isinstance(log, dict):
+        in_system = log.get(IN_SYSTEM_KEY) if in_system is None else in_system
+        log = log[LOG_KEY]
+    frame = _frame(log)
+    if in_system is not None and len(in_system):
+        frame = pd.concat([frame, _frame(in_system)], ignore_index=True)
+    if product_type is not None:
+        frame = frame[frame["type"] == product_type]
+    return frame
+
+
+def _t_end(log, frame: pd.DataFrame) -> Union[float, None]:
+    """End of the run for a result dict, otherwise the last entry or exit in the log."""
+    if isinstance(log, dict) and log.get("t_end") is not None:
+        return log["t_end"]
+    if not len(frame):
+        return None
+    return float(np.nanmax(frame[["t_entered_system", "t_left_system"]].to_numpy(float)))
+
+
+def wip_curve(log, product_type: str = None, in_system=None) -> pd.DataFrame:
+    """
+    WIP step function: the WIP is `wip` from `time` until the next time.
+    Starts at time 0 with WIP 0. Exact if the batches in the system at the end are included.
+    """
+    frame = log_frame(log, product_type, in_system)
+    exits = frame["t_left_system"].dropna()
+    times = np.concatenate([[0.0], frame["t_entered_system"], exits])
+    steps = np.concatenate([[0], np.ones(len(frame)), -np.ones(len(exits))])
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    wip = np.cumsum(steps[order])
+    last = np.append(times[1:] != times[:-1], True)  # the WIP after all events at a time
+    return pd.DataFrame({"time": times[last], "wip": wip[last].astype(int)})
+
+
+def _wip_area(curve: pd.DataFrame, t: np.ndarray) -> np.ndarray:
+    """Integral of the WIP step function from 0 to every t."""
+    times = curve["time"].to_numpy()
+    wip = curve["wip"].to_numpy()
+    area = np.concatenate([[0.0], np.cumsum(np.diff(times) * wip[:-1])])
+    k = np.maximum(np.searchsorted(times, t, side="right") - 1, 0)
+    return area[k] + (t - times[k]) * wip[k]
+
+
+def _exits(frame: pd.DataFrame):
+    """Exit times in order and the cumulative sum of the cycle times in that order."""
+    frame = frame.dropna(subset=["t_left_system"]).sort_values("t_left_system", kind="stable")
+    exits = frame["t_left_system"].to_numpy()
+    cycle_times = exits - frame["t_entered_system"].to_numpy()
+    return exits, np.concatenate([[0.0], np.cumsum(cycle_times)])
+
+
+def flow_curves(
+    log,
+    window: float = WINDOW,
+    step: float = STEP,
+    t_end: float = None,
+    product_type: str = None,
+    in_system=None,
+) -> pd.DataFrame:
+    """
+    Flow metrics on a time grid (every step, from window to t_end), over the last window:
+        wip             WIP at the grid time
+        wip_mean        time average WIP
+        throughput      batches completed per time unit
+        cycle_time      mean time in system of the batches completed
+        littles_law     throughput * cycle_time, compare with wip_mean
+    t_end defaults to the end of the run for a result dict, otherwise the last event in the log.
+    """
+    frame = log_frame(log, product_type, in_system)
+    curve = wip_curve(frame)
+    if t_end is None:
+        t_end = _t_end(log, frame) or window
+    grid = np.arange(window, t_end + step / 2, step)
+    exits, cumulative_cycle_time = _exits(frame)
+    high = np.searchsorted(exits, grid, side="right")
+    low = np.searchsorted(exits, grid - window, side="right")
+    completed = high - low
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cycle_time = (cumulative_cycle_time[high] - cumulative_cycle_time[low]) / completed
+    throughput = completed / window
+    wip_index = np.searchsorted(curve["time"].to_numpy(), grid, side="right") - 1
+    return pd.DataFrame(
+        {
+            "time": grid,
+            "wip": curve["wip"].to_numpy()[wip_index],
+            "wip_mean": (_wip_area(curve, grid) - _wip_area(curve, grid - window)) / window,
+            "throughput": throughput,
+            "cycle_time": cycle_time,
+            "littles_law": throughput * np.nan_to_num(cycle_time),
+        }
+    )
+
+
+def flow_curves_per_product(
+    log, window: float = WINDOW, step: float = STEP, t_end: float = None, in_system=None
+) -> pd.DataFrame:
+    """flow_curves for all batches ("all") and per product type, stacked with a product column."""
+    frame = log_frame(log, in_system=in_system)
+    if t_end is None:
+        t_end = _t_end(log, frame) or window
+    curves = {"all": flow_curves(frame, window, step, t_end)}
+    for product_type in frame["type"].unique():
+        curves[product_type] = flow_curves(frame, window, step, t_end, product_type)
+    return pd.concat(curves, names=["product", None]).reset_index(level=0)
+
+
+def littles_law_check(
+    log, t_start: float = 0, t_end: float = None, product_type: str = None, in_system=None
+) -> Dict:
+    """
+    Little's law over [t_start, t_end] (default: the whole run, see flow_curves):
+    time average WIP (L), throughput (lambda), mean cycle time of the batches that left (W),
+    lambda * W and the relative difference (L - lambda W) / L.
+    """
+    frame = log_frame(log, product_type, in_system)
+    if t_end is None:
+        t_end = _t_end(log, frame) or t_start
+    duration = t_end - t_start
+    curve = wip_curve(frame)
+    area = _wip_area(curve, np.array([t_start, t_end]))
+    wip_mean = (area[1] - area[0]) / duration if duration > 0 else np.nan
+    left = frame[(frame["t_left_system"] > t_start) & (frame["t_left_system"] <= t_end)]
+    throughput = len(left) / duration if duration > 0 else np.nan
+    cycle_time = (left["t_left_system"] - left["t_entered_system"]).mean()
+    littles_law = throughput * cycle_time
+    return {
+        "t_start": t_start,
+        "t_end": t_end,
+        "wip_mean": wip_mean,
+        "throughput": throughput,
+        "cycle_time": cycle_time,
+        "littles_law": littles_law,
+        "relative_error": (wip_mean - littles_law) / wip_mean if wip_mean else np.nan,
+    }
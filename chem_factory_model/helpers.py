@@ -1,5 +1,5 @@
 import pandas as pd
-import ast
+from timeseries import timeseries_to_frame
 
 
 def transform_timeseries(
@@ -12,16 +12,13 @@ def transform_timeseries(
     startcol = 0
     df = pd.read_excel(file_path, sheet_name=read_sheet_name)
 
-    # Zeitreihenspalte in Liste von Tuples umwandeln
+    # Zeitreihenspalte (komprimiert oder Liste von Tuples) in ein neues DataFrame umwandeln
 
     for index, row in df.iterrows():
         time_series = row[column_name]
-        # list_of_tuples = ast.literal_eval(time_series[0])
-        list_of_tuples = ast.literal_eval(time_series)
-        # Liste von Tuples in ein neues DataFrame umwandeln
-        new_df = pd.DataFrame(
-            list_of_tuples,
-            columns=["time[minutes]", f"queue_preparation_length scenario {index}"],
+        new_df = timeseries_to_frame(
+            time_series,
+            value_column=f"queue_preparation_length scenario {index}",
         )
 
         # Neues DataFrame in ein neues Sheet des Excel-Files schreiben
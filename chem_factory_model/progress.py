@@ -0,0 +1,141 @@
+"""
+Progress and throughput telemetry for simulation sweeps.
+
+SweepProgress collects completed/failed tasks, simulated events, per-worker busy time and an ETA.
+The snapshot is written atomically to a small JSON file (at most every `min_interval` seconds)
+and can optionally be served on a local HTTP endpoint, so long sweeps can be watched from
+another shell, a browser or a notebook.
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+PROGRESS_FILENAME = "progress.json"
+SUCCESS_MSG = "simulation ended"
+
+
+class SweepProgress:
+    """
+    Collects the progress of a sweep of `total` tasks.
+    Call task_done once per finished replication; the metrics file is refreshed
+    at most every `min_interval` seconds, so the overhead per task is negligible.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        filepath: str = PROGRESS_FILENAME,
+        min_interval: float = 2.0,
+    ):
+        self.total = total
+        self.filepath = filepath
+        self.min_interval = min_interval
+        self.completed = 0
+        self.failed = 0
+        self.n_events = 0
+        self.workers: Dict[str, Dict] = {}
+        self.t_start = time.perf_counter()
+        self._t_written = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one writer of the metrics file at a time
+
+    def task_done(
+        self,
+        result: Dict = None,
+        wall_time: float = 0,
+        worker: str = "main",
+        failed: bool = None,
+    ) -> None:
+        """
+        Register a finished task.
+        If failed is None, a task counts as failed if it has no result or its
+        msg is not "simulation ended".
+        """
+        if failed is None:
+            failed = result is None or result.get("msg", SUCCESS_MSG) != SUCCESS_MSG
+        n_events = result.get("n_events", 0) if result else 0
+        with self._lock:
+            self.completed += 1
+            self.failed += failed
+            self.n_events += n_events
+            stats = self.workers.setdefault(
+                str(worker), {"tasks": 0, "busy_time": 0.0, "n_events": 0}
+            )
+            stats["tasks"] += 1
+            stats["busy_time"] += wall_time
+            stats["n_events"] += n_events
+        self.write()
+
+    def snapshot(self) -> Dict:
+        """Return the current metrics as a JSON serializable dict."""
+        with self._lock:
+            elapsed = time.perf_counter() - self.t_start
+            remaining = self.total - self.completed
+            return {
+                "completed": self.completed,
+                "total": self.total,
+                "failed": self.failed,
+                "elapsed_s": elapsed,
+                "eta_s": (
+                    elapsed / self.completed * remaining if self.completed else None
+                ),
+                "tasks_per_s": self.completed / elapsed if elapsed else 0.0,
+                "events": self.n_events,
+                "events_per_s": self.n_events / elapsed if elapsed else 0.0,
+                "workers": {
+                    worker: {
+                        **stats,
+                        "utilization": stats["busy_time"] / elapsed if elapsed else 0.0,
+                    }
+                    for worker, stats in self.workers.items()
+                },
+            }
+
+    def write(self, force: bool = False) -> None:
+        """Write the snapshot to the metrics file, unless it was written less than min_interval ago."""
+        if self.filepath is None:
+            return
+        with self._write_lock:
+            now = time.perf_counter()
+            finished = self.completed >= self.total
+            if (
+                not force
+                and not finished
+                and self._t_written is not None
+                and now - self._t_written < self.min_interval
+            ):
+                return
+            self._t_written = now
+            tmp_filepath = self.filepath + ".tmp"
+            with open(tmp_filepath, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=1)
+            os.replace(tmp_filepath, self.filepath)  # readers never see a partial file
+
+
+def serve_progress(
+    progress: SweepProgress, port: int = 8765, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """
+    Serve the progress snapshot as JSON on http://host:port/ from a daemon thread.
+    Call shutdown() on the returned server to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(progress.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,260 @@
+"""
+Record the visual state changes of a (headless) run and play them back later without re-simulating.
+
+AnimationRecorder collects what the base_library visuals show: entity creation, moves, visibility
+and color changes, the contents of every animated queue and the station labels.
+replay() rebuilds the stations, queues and entities from a recording and plays the changes back
+with the same base_library visuals, starting at any time (seeking) and at any speed (fast-forward).
+"""
+
+import json
+from typing import Dict, Iterable, List, Union
+
+import salabim as sim
+
+from base_library import BasicEntity, BasicStation, on_tally, render_static_stations
+
+REPLAY_SPEED = 2
+REPLAY_MAX_SPEED = 256
+
+
+class AnimationRecorder:
+    """
+    Collects the visual state changes of a run as (time, kind, ...) events.
+    Set it as env.animation_recorder before entities are created, then register
+    the stations and animated queues with add_stations and add_queues.
+    """
+
+    def __init__(self, env: sim.Environment):
+        self.env = env
+        self.stations: List[Dict] = []
+        self.queues: List[Dict] = []
+        self.n_entities = 0
+        self.events: List[list] = []
+        self._entity_ids: Dict[BasicEntity, int] = {}
+        self._stations: List[BasicStation] = []
+        self._labels: List[str] = []  # last recorded label per station
+        self._dirty_labels: Dict[int, float] = {}  # station id -> time of the first change
+
+    def record_entity(self, entity: BasicEntity, kind: str, *args) -> None:
+        self._flush_labels()
+        if kind == "create":
+            self._entity_ids[entity] = self.n_entities
+            self.n_entities += 1
+        eid = self._entity_ids.get(entity)
+        if eid is not None:
+            self.events.append([self.env.now(), kind, eid, *args])
+
+    def add_stations(self, stations: Iterable[BasicStation]) -> None:
+        """Record the layout of the stations and every change of their label."""
+        for station in stations:
+            sid = len(self.stations)
+            self.stations.append({**station.layout, "label": station.label()})
+            self._stations.append(station)
+            self._labels.append(station.label())
+            for monitor in station.label_monitors:
+                on_tally(monitor, self._label_recorder(sid))
+
+    def add_queues(self, animate_queues: Iterable[sim.AnimateQueue] = None) -> None:
+        """
+        Record the position of animated queues and every change of their contents.
+        If animate_queues is omitted, all AnimateQueues of the environment are recorded.
+        """
+        if animate_queues is None:
+            animate_queues = sorted(  # sys_objects is a set: number the queues by name
+                (ao for ao in self.env.sys_objects if isinstance(ao, sim.AnimateQueue)),
+                key=lambda animate_queue: animate_queue._queue.name(),
+            )
+        t = self.env.t()
+        for animate_queue in animate_queues:
+            qid = len(self.queues)
+            self.queues.append(
+                {
+                    "x": animate_queue.x(t),
+                    "y": animate_queue.y(t),
+                    "direction": animate_queue.direction(t),
+                    "max_length": animate_queue.max_length(t),
+                }
+            )
+            queue = animate_queue._queue
+            on_tally(queue.length, self._contents_recorder(queue, qid))
+
+    def _label_recorder(self, sid: int):
+        def record_label(value):
+            # salabim updates counters like number_of_arrivals after the tally,
+            # so the label is read when the next event is recorded
+            self._dirty_labels.setdefault(sid, self.env.now())
+
+        return record_label
+
+    def _flush_labels(self, before: float = None) -> None:
+        """Record the labels that changed (before the given time, if specified)."""
+        for sid, t in list(self._dirty_labels.items()):
+            if before is not None and t >= before:
+                continue
+            del self._dirty_labels[sid]
+            label = self._stations[sid].label()
+            if label != self._labels[sid]:
+                self._labels[sid] = label
+                self.events.append([t, "label", sid, label])
+
+    def _contents_recorder(self, queue: sim.Queue, qid: int):
+        def record_contents(value):
+            # labels changed at this time may still be half updated by salabim
+            self._flush_labels(before=self.env.now())
+            ids = [self._entity_ids[c] for c in queue if c in self._entity_ids]
+            self.events.append([self.env.now(), "queue", qid, ids])
+
+        return record_contents
+
+    def to_dict(self) -> Dict:
+        self._flush_labels()
+        return {
+            "stations": self.stations,
+            "queues": self.queues,
+            "events": self.events,
+        }
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+
+def load_recording(filepath: str) -> Dict:
+    with open(filepath, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ReplayStation(BasicStation):
+    """Station visuals whose label is set from the recording."""
+
+    def __init__(self, label: str = "", **layout):
+        BasicStation.__init__(self, **layout)
+        self.set_label(label)
+
+    def set_label(self, label: str) -> None:
+        self.text = label
+        self.invalidate_label()
+
+    def label(self) -> str:
+        return self.text
+
+
+class ReplayEntity(BasicEntity):
+    """Entity without a process, moved around by the ReplayPlayer."""
+
+
+class ReplayPlayer(sim.Component):
+    """Applies the recorded events at their recorded times."""
+
+    def setup(self, recording: Dict):
+        self.events = recording["events"]
+        self.stations = [ReplayStation(**station) for station in recording["stations"]]
+        self.queues = []
+        for spec in recording["queues"]:
+            queue = sim.Queue(monitor=False)
+            sim.AnimateQueue(
+                queue,
+                x=spec["x"],
+                y=spec["y"],
+                direction=spec["direction"],
+                max_length=spec["max_length"],
+                title="",
+            )
+            self.queues.append(queue)
+        self.entities: Dict[int, ReplayEntity] = {}
+
+    def process(self):
+        for t, kind, index, *args in self.events:
+            if t > self.env.now():
+                self.hold(till=t)
+            self.apply(kind, index, args)
+
+    def apply(self, kind: str, index: int, args: list) -> None:
+        now = self.env.now()
+        if kind == "create":
+            name, x, y, width, height, fillcolor, textcolor, font, fontsize, speed, visible = args
+            self.entities[index] = ReplayEntity(
+                name=name,
+                x=x,
+                y=y,
+                width=width,
+                height=height,
+                fillcolor=fillcolor,
+                textcolor=textcolor,
+                font=font,
+                fontsize=fontsize,
+                speed=speed,
+                visible=visible,
+            )
+        elif kind == "move":
+            x1, y1, t1 = args
+            self.entities[index].move(x1, y1, duration=max(0, t1 - now))
+        elif kind == "fillcolor":
+            fillcolor, t1 = args
+            self.entities[index].update_fillcolor(fillcolor, duration=max(0, t1 - now))
+        elif kind == "visible":
+            self.entities[index].visible(args[0])
+        elif kind == "end":
+            entity = self.entities.pop(index)
+            entity.leave()
+            entity.remove_animation_children()
+        elif kind == "queue":
+            queue = self.queues[index]
+            queue.clear()
+            for eid in args[0]:
+                self.entities[eid].enter(queue)
+        elif kind == "label":
+            self.stations[index].set_label(args[0])
+
+
+def replay(
+    recording: Union[str, Dict],
+    start: float = 0,
+    till: float = None,
+    speed: float = REPLAY_SPEED,
+    video: str = None,
+    video_fps: float = 30,
+) -> sim.Environment:
+    """
+    Play back a recording (file name or dict) with the base_library visuals.
+    start: simulation time to start the playback at; everything before is applied instantly
+    till: simulation time to stop the playback (default: last recorded event)
+    speed: initial animation speed (simulated hours per second), can be changed with the slider
+    video: if given, render headless into this video/image sequence instead of a window
+    """
+    if isinstance(recording, str):
+        recording = load_recording(recording)
+    events = recording["events"]
+    if till is None:
+        till = events[-1][0] if events else start
+    env = sim.Environment(blind_animation=video is not None)
+    player = ReplayPlayer(recording=recording)
+    # seeking: play everything before start without animation (no simulation, just the recorded events)
+    env.animate(False)
+    env.run(till=start)
+    env.animate(True)
+    env.speed(speed)
+    if video is not None:
+        env.fps(video_fps)
+        env.video(video)
+        render_static_stations(player.stations, env=env)
+    else:
+        sim.AnimateSlider(
+            x=100,
+            y=100,
+            vmin=0,
+            vmax=max(REPLAY_MAX_SPEED, speed),
+            resolution=1,
+            v=speed,
+            label="Speed",
+            action=lambda v: env.speed(float(v)),
+            env=env,
+        )
+    try:
+        env.run(till=till)
+    except sim.SimulationStopped:
+        pass
+    if video is not None:
+        env.video_close()
+    return env
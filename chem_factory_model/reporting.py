@@ -0,0 +1,263 @@
+"""
+Scenario comparison and confidence interval report for sweep results.
+
+All functions work on the results DataFrame of sim_runner (one row per replication, a scenario
+column and the result columns of simulate) and are vectorized with groupby/pivot:
+    scenario_summary    mean, standard deviation and confidence interval per scenario
+    paired_differences  difference to a baseline scenario, paired by replication_nr (common seeds)
+    rank_scenarios      ranking with the set of scenarios that cannot be distinguished from the best,
+                        Bonferroni adjusted for the number of comparisons
+    summary_table       all of the above for several result columns in one compact long table
+
+By default the functions report the KPI columns of simulate (KPI_PATTERNS), not the input
+parameters that are copied into the results. Rankings take the direction (lower or higher is
+better) of every KPI from KPI_PATTERNS as well.
+"""
+
+import math
+import re
+from functools import lru_cache
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from sim_runner import RESULTS_SHEET_NAME, read_results_jsonl
+
+CONFIDENCE = 0.95
+SCENARIO_COLUMN = "scenario"
+PAIR_COLUMN = "replication_nr"
+# KPI columns of simulate results: (pattern, minimize), minimize is True if lower values are
+# better, False if higher values are better and None if neither (not ranked by default)
+KPI_PATTERNS = (
+    (r"_waiting_time_(mean|max|p[\d.]+)$", True),
+    (r"_queue_length_(mean|max)$", True),
+    (r"^time_in_system_(mean|max)$", True),
+    (r"^unfinished_batches", True),
+    (r"_batches_processed$", False),
+    (r"^finished_batches", False),
+    (r"^n_assembled_", False),
+    (r"_occupancy$", None),
+    (r"^n_batches_created_", None),
+    (r"_consumed_", None),
+)
+
+
+def load_results(filepath: str, sheet_name: str = RESULTS_SHEET_NAME) -> pd.DataFrame:
+    """Read the summary columns of a sweep from an Excel output file or a JSON Lines result file."""
+    if filepath.endswith(".jsonl"):
+        return read_results_jsonl(filepath, summary_only=True)
+    return pd.read_excel(filepath, sheet_name)
+
+
+@lru_cache(maxsize=None)
+def _t_quantile(p: float, df: float) -> float:
+    """
+    Quantile p (> 0.5) of Student's t distribution with df degrees of freedom.
+    Hill's algorithm (CACM algorithm 396), exact for df 1 and 2, accurate to about 1e-6 otherwise.
+    """
+    if not df > 0:
+        return math.nan
+    if math.isinf(df):
+        return NormalDist().inv_cdf(p)
+    p2 = 2 * (1 - p)  # two-tailed probability
+    if df == 1:
+        return math.cos(p2 * math.pi / 2) / math.sin(p2 * math.pi / 2)
+    if df == 2:
+        return math.sqrt(2 / (p2 * (2 - p2)) - 2)
+    a = 1 / (df - 0.5)
+    b = 48 / (a * a)
+    c = ((20700 * a / b - 98) * a - 16) * a + 96.36
+    d = ((94.5 / (b + c) - 3) / b + 1) * math.sqrt(a * math.pi / 2) * df
+    y = (d * p2) ** (2 / df)
+    if y > 0.05 + a:
+        x = NormalDist().inv_cdf(p2 / 2)
+        y = x * x
+        if df < 5:
+            c += 0.3 * (df - 4.5) * (x + 0.6)
+        c = (((0.05 * d * x - 5) * x - 7) * x - 2) * x + b + c
+        y = (((((0.4 * y + 6.3) * y + 36) * y + 94.5) / c - y - 3) / b + 1) * x
+        y = math.expm1(a * y * y)
+    else:
+        y = (
+            (1 / (((df + 6) / (df * y) - 0.089 * d - 0.822) * (df + 2) * 3) + 0.5 / (df + 4)) * y
+            - 1
+        ) * (df + 1) / (df + 2) + 1 / y
+    return math.sqrt(df * y)
+
+
+def t_quantile(p: float, df: Union[float, np.ndarray, pd.Series]) -> np.ndarray:
+    """Quantile p (> 0.5) of Student's t distribution for every value of df."""
+    df = np.asarray(df, dtype=float)
+    # only a handful of distinct degrees of freedom occur in a sweep
+    values, inverse = np.unique(df, return_inverse=True)
+    quantiles = np.array([_t_quantile(p, value) for value in values.tolist()])
+    return quantiles[inverse].reshape(df.shape)
+
+
+def _kpi_pattern(column: str):
+    return next(
+        (pattern for pattern in KPI_PATTERNS if re.search(pattern[0], column)), None
+    )
+
+
+def is_kpi(column: str) -> bool:
+    return _kpi_pattern(column) is not None
+
+
+def kpi_minimize(column: str) -> Optional[bool]:
+    """True if lower values of the KPI column are better, False if higher, None if neither."""
+    pattern = _kpi_pattern(column)
+    return None if pattern is None else pattern[1]
+
+
+def _columns(results: pd.DataFrame, columns: Union[str, Iterable[str]]) -> List[str]:
+    if columns is None:
+        return [c for c in results.select_dtypes("number").columns if is_kpi(c)]
+    if isinstance(columns, str):
+        return [columns]
+    return list(columns)
+
+
+def _interval(mean, std, n, confidence: float) -> pd.DataFrame:
+    half_width = t_quantile(1 - (1 - confidence) / 2, n - 1) * std / np.sqrt(n)
+    return pd.DataFrame(
+        {
+            "n": n,
+            "mean": mean,
+            "std": std,
+            "ci_low": mean - half_width,
+            "ci_high": mean + half_width,
+            "half_width": half_width,
+        }
+    )
+
+
+def scenario_summary(
+    results: pd.DataFrame,
+    columns: Union[str, Iterable[str]] = None,
+    by: str = SCENARIO_COLUMN,
+    confidence: float = CONFIDENCE,
+) -> pd.DataFrame:
+    """
+    Mean and t confidence interval of every result column per scenario.
+    Returns a long table indexed by (column, scenario) with n, mean, std, ci_low, ci_high and half_width.
+    columns: result column(s), default the KPI columns (see KPI_PATTERNS)
+    """
+    columns = _columns(results, columns)
+    stats = results.groupby(by)[columns].agg(["count", "mean", "std"]).stack(0, future_stack=True)
+    stats = stats.swaplevel().sort_index(level=0, sort_remaining=False)
+    stats.index.names = ["column", by]
+    summary = _interval(stats["mean"], stats["std"], stats["count"], confidence)
+    return summary.loc[columns]
+
+
+def paired_differences(
+    results: pd.DataFrame,
+    columns: Union[str, Iterable[str]] = None,
+    baseline=None,
+    by: str = SCENARIO_COLUMN,
+    pair_on: str = PAIR_COLUMN,
+    confidence: float = CONFIDENCE,
+) -> pd.DataFrame:
+    """
+    Difference (scenario - baseline) of every result column with a t confidence interval.
+    Replications are paired on pair_on: with common seeds per replication_nr (make_replications),
+    the paired differences have a much smaller variance than the difference of independent means.
+    baseline: scenario to compare against, default the first scenario
+    Returns a long table indexed by (column, scenario), without the baseline itself,
+    with n, mean, std, ci_low, ci_high, half_width and significant (interval excludes 0).
+    """
+    columns = _columns(results, columns)
+    wide = results.pivot_table(index=pair_on, columns=by, values=columns, aggfunc="mean")
+    if baseline is None:
+        baseline = wide.columns.get_level_values(1)[0]
+    differences = wide.sub(wide.xs(baseline, axis=1, level=1), level=0)
+    differences = differences.drop(columns=baseline, level=1)
+    stats = differences.agg(["count", "mean", "std"]).T
+    stats.index.names = ["column", by]
+    summary = _interval(stats["mean"], stats["std"], stats["count"], confidence)
+    summary["significant"] = (summary["ci_low"] > 0) | (summary["ci_high"] < 0)
+    return summary.loc[columns]
+
+
+def rank_scenarios(
+    results: pd.DataFrame,
+    column: str,
+    by: str = SCENARIO_COLUMN,
+    pair_on: str = PAIR_COLUMN,
+    confidence: float = CONFIDENCE,
+    minimize: bool = None,
+) -> pd.DataFrame:
+    """
+    Rank the scenarios on the mean of column (rank 1 is the best, lowest if minimize).
+    minimize defaults to the direction of the KPI (see KPI_PATTERNS).
+    Every scenario is compared with the best one by paired differences; the confidence level
+    is Bonferroni adjusted for the k - 1 comparisons. best_set marks the scenarios whose
+    difference to the best is not significant, i.e. that may be the best at the given confidence.
+    """
+    if minimize is None:
+        minimize = kpi_minimize(column)
+        if minimize is None:
+            raise ValueError(f"No direction known for {column}, pass minimize.")
+    means = results.groupby(by)[column].mean()
+    best = means.idxmin() if minimize else means.idxmax()
+    n_comparisons = max(len(means) - 1, 1)
+    adjusted_confidence = 1 - (1 - confidence) / n_comparisons
+    differences = paired_differences(
+        results, column, best, by, pair_on, adjusted_confidence
+    ).loc[column]
+    ranking = pd.DataFrame(
+        {
+            "rank": means.rank(method="min", ascending=minimize).astype(int),
+            "mean": means,
+            "diff_to_best": differences["mean"],
+            "diff_ci_low": differences["ci_low"],
+            "diff_ci_high": differences["ci_high"],
+        }
+    )
+    ranking.loc[best, ["diff_to_best", "diff_ci_low", "diff_ci_high"]] = 0.0
+    ranking["best_set"] = ~differences["significant"].reindex(ranking.index, fill_value=False)
+    return ranking.sort_values("rank")
+
+
+def summary_table(
+    results: pd.DataFrame,
+    columns: Union[str, Iterable[str]] = None,
+    baseline=None,
+    by: str = SCENARIO_COLUMN,
+    pair_on: str = PAIR_COLUMN,
+    confidence: float = CONFIDENCE,
+    minimize: Union[bool, Dict[str, bool]] = None,
+) -> pd.DataFrame:
+    """
+    Compact report for the result columns: per (column, scenario) the mean and confidence interval,
+    the paired difference to the baseline with its interval, the rank and the adjusted best set.
+    minimize: direction for all columns or per column (dict); by default, and for columns missing
+        in the dict, the direction of the KPI (see KPI_PATTERNS). Columns without a direction
+        are not ranked.
+    """
+    columns = _columns(results, columns)
+    summary = scenario_summary(results, columns, by, confidence)[
+        ["n", "mean", "ci_low", "ci_high"]
+    ]
+    differences = paired_differences(results, columns, baseline, by, pair_on, confidence)
+    summary = summary.join(
+        differences[["mean", "ci_low", "ci_high", "significant"]].add_prefix("diff_")
+    )
+    if not isinstance(minimize, dict):
+        minimize = {column: minimize for column in columns if minimize is not None}
+    directions = {column: minimize.get(column, kpi_minimize(column)) for column in columns}
+    rankings = {
+        column: rank_scenarios(results, column, by, pair_on, confidence, direction)[
+            ["rank", "best_set"]
+        ]
+        for column, direction in directions.items()
+        if direction is not None
+    }
+    if rankings:
+        summary = summary.join(pd.concat(rankings, names=["column", by]))
+    else:
+        summary = summary.assign(rank=pd.NA, best_set=pd.NA)
+    return summary.astype({"rank": "Int64", "best_set": "boolean"})
@@ -0,0 +1,240 @@
+"""
+Global sensitivity analysis of simulate() parameters: Morris screening and Sobol indices.
+
+The parameters to study are declared with their ranges, e.g.
+    ranges = {
+        "server_packaging_capacity": (1, 3, int),
+        "server_distillation_pt_mode": (3, 6),
+        "cleaning_time_reaction_product2": (5, 15),
+    }
+A sample design is generated in the unit cube, scaled to the ranges and evaluated with
+sim_runner.run_simulations (in parallel with workers > 1). All design points use the same
+random_seed (common random numbers), so the differences between points are not blurred by noise.
+
+    morris_analysis  elementary effects (mu, mu_star, sigma), cheap screening: r * (k + 1) runs
+    sobol_analysis   first order (S1) and total order (ST) indices, N * (k + 2) runs
+
+Both return a long table indexed by (output, parameter) with the parameters ranked per output.
+"""
+
+import inspect
+from typing import Callable, Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from sim_runner import run_simulations
+
+OUTPUTS = ("time_in_system_mean", "throughput_per_day")
+N_BOOTSTRAP = 100
+
+
+def throughput_per_day(results: pd.DataFrame) -> pd.Series:
+    """Number of finished batches (all products) per day."""
+    finished = results.filter(like="finished_batches").sum(axis=1)
+    return finished / results["t_end"] * 24
+
+
+DERIVED_OUTPUTS = {"throughput_per_day": throughput_per_day}
+
+
+def scale(unit: np.ndarray, ranges: Dict[str, Tuple]) -> pd.DataFrame:
+    """Scale a design in the unit cube to the parameter ranges (low, high[, int])."""
+    design = {}
+    for column, (name, spec) in enumerate(ranges.items()):
+        low, high = spec[0], spec[1]
+        values = low + unit[:, column] * (high - low)
+        if len(spec) > 2 and spec[2] is int:
+            # every integer value gets an equal share of the unit interval
+            values = np.minimum(
+                np.floor(low + unit[:, column] * (high - low + 1)), high
+            ).astype(int)
+        design[name] = values
+    return pd.DataFrame(design)
+
+
+def ordered_triangular(params: Dict, defaults: Dict) -> Dict:
+    """Sort the low, mode and high of every triangular distribution (*_pt_low/mode/high)."""
+    params = dict(params)
+    names = {key[: -len("_low")] for key in params if key.endswith("_pt_low")}
+    names |= {key.rsplit("_", 1)[0] for key in params if key.endswith(("_pt_mode", "_pt_high"))}
+    for name in names:
+        keys = [f"{name}_low", f"{name}_mode", f"{name}_high"]
+        values = sorted(params.get(key, defaults.get(key)) for key in keys)
+        params.update(zip(keys, values))
+    return params
+
+
+def evaluate(
+    simulate: Callable,
+    design: pd.DataFrame,
+    base_params: Dict = None,
+    outputs=OUTPUTS,
+    random_seed=0,
+    workers: int = None,
+) -> pd.DataFrame:
+    """Run simulate for every row of the design and return the outputs, one column each."""
+    defaults = {
+        name: parameter.default
+        for name, parameter in inspect.signature(simulate).parameters.items()
+    }
+    params_seq = [
+        ordered_triangular(
+            {**(base_params or {}), **row, "random_seed": random_seed}, defaults
+        )
+        for row in design.to_dict("records")
+    ]
+    results = run_simulations(params_seq, simulate, workers=workers)
+    return pd.DataFrame(
+        {
+            output: (
+                DERIVED_OUTPUTS[output](results)
+                if output in DERIVED_OUTPUTS
+                else results[output]
+            )
+            for output in outputs
+        }
+    )
+
+
+def morris_design(
+    k: int, n_trajectories: int = 10, levels: int = 4, seed: int = None
+) -> np.ndarray:
+    """
+    Morris one-at-a-time trajectories in the unit cube: n_trajectories * (k + 1) points.
+    Every trajectory starts at a random grid point and moves each parameter once by
+    delta = levels / (2 * (levels - 1)), in random order (down if up would leave the cube).
+    """
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    points = np.empty((n_trajectories, k + 1, k))
+    for r in range(n_trajectories):
+        x = rng.choice(grid, size=k)
+        points[r, 0] = x
+        for step, i in enumerate(rng.permutation(k), 1):
+            x = x.copy()
+            x[i] += delta if x[i] + delta <= 1 else -delta
+            points[r, step] = x
+    return points.reshape(-1, k)
+
+
+def morris_indices(unit: np.ndarray, y: np.ndarray, k: int) -> pd.DataFrame:
+    """Elementary effects statistics per parameter from the outputs y of a morris_design."""
+    points = unit.reshape(-1, k + 1, k)
+    y = np.asarray(y, dtype=float).reshape(-1, k + 1)
+    steps = np.diff(points, axis=1)  # one parameter changes per step
+    changed = np.argmax(steps != 0, axis=2)
+    delta = np.take_along_axis(steps, changed[..., None], axis=2)[..., 0]
+    effects = np.empty((len(points), k))
+    np.put_along_axis(effects, changed, np.diff(y, axis=1) / delta, axis=1)
+    return pd.DataFrame(
+        {
+            "mu": effects.mean(axis=0),
+            "mu_star": np.abs(effects).mean(axis=0),
+            "sigma": effects.std(axis=0, ddof=1),
+        }
+    )
+
+
+def sobol_design(k: int, n: int = 256, seed: int = None) -> np.ndarray:
+    """Saltelli design in the unit cube: blocks A, B and AB_i (A with column i of B), n * (k + 2) points."""
+    rng = np.random.default_rng(seed)
+    a = rng.random((n, k))
+    b = rng.random((n, k))
+    ab = np.repeat(a[None], k, axis=0)
+    ab[np.arange(k), :, np.arange(k)] = b.T
+    return np.concatenate([a, b, ab.reshape(-1, k)])
+
+
+def sobol_indices(
+    y: np.ndarray, k: int, n_bootstrap: int = N_BOOTSTRAP, seed: int = None
+) -> pd.DataFrame:
+    """
+    First order (Saltelli 2010) and total order (Jansen) indices from the outputs y of a
+    sobol_design, with bootstrap 95% half widths (S1_conf, ST_conf).
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y) // (k + 2)
+    y_a, y_b, y_ab = y[:n], y[n : 2 * n], y[2 * n :].reshape(k, n)
+
+    def indices(rows):
+        a, b, ab = y_a[rows], y_b[rows], y_ab[:, rows]
+        variance = np.concatenate([a, b]).var()
+        if variance == 0:
+            return np.zeros(k), np.zeros(k)
+        first = (b * (ab - a)).mean(axis=1) / variance
+        total = 0.5 * ((a - ab) ** 2).mean(axis=1) / variance
+        return first, total
+
+    first, total = indices(np.arange(n))
+    rng = np.random.default_rng(seed)
+    samples = [indices(rng.integers(n, size=n)) for _ in range(n_bootstrap)]
+    first_samples = np.array([s[0] for s in samples])
+    total_samples = np.array([s[1] for s in samples])
+    return pd.DataFrame(
+        {
+            "S1": first,
+            "S1_conf": 1.96 * first_samples.std(axis=0),
+            "ST": total,
+            "ST_conf": 1.96 * total_samples.std(axis=0),
+        }
+    )
+
+
+def _ranked(per_output: Dict[str, pd.DataFrame], ranges: Dict, by: str) -> pd.DataFrame:
+    tables = {}
+    for output, table in per_output.items():
+        table.index = pd.Index(list(ranges), name="parameter")
+        table["rank"] = table[by].rank(ascending=False, method="min").astype(int)
+        tables[output] = table.sort_values("rank")
+    return pd.concat(tables, names=["output"])
+
+
+def morris_analysis(
+    simulate: Callable,
+    ranges: Dict[str, Tuple],
+    base_params: Dict = None,
+    n_trajectories: int = 10,
+    levels: int = 4,
+    outputs=OUTPUTS,
+    random_seed=0,
+    seed: int = None,
+    workers: int = None,
+) -> pd.DataFrame:
+    """
+    Morris screening of the parameters in ranges, with base_params for all other parameters.
+    Parameters are ranked on mu_star (mean absolute elementary effect) per output.
+    """
+    k = len(ranges)
+    unit = morris_design(k, n_trajectories, levels, seed)
+    y = evaluate(simulate, scale(unit, ranges), base_params, outputs, random_seed, workers)
+    return _ranked(
+        {output: morris_indices(unit, y[output], k) for output in outputs},
+        ranges,
+        "mu_star",
+    )
+
+
+def sobol_analysis(
+    simulate: Callable,
+    ranges: Dict[str, Tuple],
+    base_params: Dict = None,
+    n: int = 256,
+    outputs=OUTPUTS,
+    random_seed=0,
+    seed: int = None,
+    workers: int = None,
+) -> pd.DataFrame:
+    """
+    Sobol indices of the parameters in ranges, with base_params for all other parameters.
+    Parameters are ranked on the total order index ST per output.
+    """
+    k = len(ranges)
+    unit = sobol_design(k, n, seed)
+    y = evaluate(simulate, scale(unit, ranges), base_params, outputs, random_seed, workers)
+    return _ranked(
+        {output: sobol_indices(y[output], k, seed=seed) for output in outputs},
+        ranges,
+        "ST",
+    )
@@ -0,0 +1,244 @@
+"""
+Transfer of large per-replication outputs from worker processes through memory-mapped files.
+
+A result dict of simulate holds a few bulky entries: the batch log (df_log_batches_entered), the
+window report (lists of dicts) and the queue length time series (CompressedTimeSeries). Returned
+from a worker process, they are pickled and unpickled object by object. share_outputs, called in
+the worker, writes them as numpy arrays into .npy files (in /dev/shm, i.e. shared memory, where
+available) and replaces them by small handles; only the handles are pickled back.
+
+The parent maps the files read-only: SharedTable.to_frame builds a DataFrame on the mapped columns
+without copying them and time_series_table stacks the time series of many replications in one go.
+
+A handle received from a worker (unpickled) owns its files: they are removed when the handle is
+garbage collected, at the latest when the interpreter exits, also after an exception in the
+sweep. release_outputs removes them right away. Frames and arrays already mapped stay valid.
+Only a killed parent process leaves its files behind.
+"""
+
+import os
+import tempfile
+import uuid
+import weakref
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+import numpy as np
+
+from timeseries import TIME_COLUMN, VALUE_COLUMN, CompressedTimeSeries
+
+if TYPE_CHECKING:  # pandas is only needed in the parent
+    import pandas as pd
+
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+RUN_DTYPE = np.dtype([("start", "<f8"), ("count", "<i4"), ("value", "<i4")])
+
+
+def _path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"chem_{os.getpid()}_{uuid.uuid4().hex}_{name}.npy")
+
+
+def _save(path: str, array: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+
+
+def _remove(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedHandle:
+    """
+    Base class of the handles. An unpickled handle, i.e. one received from a worker, owns its
+    files and removes them when it is garbage collected (or at exit).
+    """
+
+    def files(self) -> List[str]:
+        raise NotImplementedError
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state.pop("_finalizer", None)
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._finalizer = weakref.finalize(self, _remove, self.files())
+
+    def unlink(self) -> None:
+        finalizer = self.__dict__.get("_finalizer")
+        if finalizer is not None:
+            finalizer()
+        else:
+            _remove(self.files())
+
+
+class SharedTable(SharedHandle):
+    """
+    Handle of a list of records (dicts) stored column-wise in .npy files.
+    String columns are stored as integer codes (-1 for missing) with their categories in the handle;
+    missing numbers are nan.
+    """
+
+    def __init__(self, paths: Dict[str, str], categories: Dict[str, List[str]], n_rows: int):
+        self.paths = paths
+        self.categories = categories
+        self.n_rows = n_rows
+
+    @classmethod
+    def write(
+        cls, records: List[Dict], directory: str = SHARED_DIR, name: str = "table"
+    ) -> "SharedTable":
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        paths, categories = {}, {}
+        for column in columns:
+            values = [record.get(column) for record in records]
+            if all(value is None or isinstance(value, str) for value in values):
+                labels = sorted({value for value in values if value is not None})
+                codes = {label: code for code, label in enumerate(labels)}
+                array = np.array([codes.get(value, -1) for value in values], dtype=np.int32)
+                categories[column] = labels
+            else:
+                array = np.asarray([np.nan if value is None else value for value in values])
+            paths[column] = _path(directory, f"{name}_{len(paths)}")
+            _save(paths[column], array)
+        return cls(paths, categories, len(records))
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """The columns as read-only memory maps (string columns as codes)."""
+        return {column: np.load(path, mmap_mode="r") for column, path in self.paths.items()}
+
+    def to_frame(self) -> "pd.DataFrame":
+        """DataFrame on the mapped columns (no copy); string columns become categoricals."""
+        import pandas as pd
+
+        data = {
+            column: (
+                pd.Categorical.from_codes(values, self.categories[column])
+                if column in self.categories
+                else values
+            )
+            for column, values in self.columns().items()
+        }
+        return pd.DataFrame(data, copy=False)
+
+    def to_records(self) -> List[Dict]:
+        """The records, all with every column (missing strings None, missing numbers nan)."""
+        columns = {
+            column: (
+                [self.categories[column][code] if code >= 0 else None for code in values.tolist()]
+                if column in self.categories
+                else values.tolist()
+            )
+            for column, values in self.columns().items()
+        }
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def files(self) -> List[str]:
+        return list(self.paths.values())
+
+    def __repr__(self) -> str:
+        return f"SharedTable(rows={self.n_rows}, columns={list(self.paths)})"
+
+
+class SharedTimeSeries(SharedHandle):
+    """Handle of a CompressedTimeSeries stored as one array of runs (start, count, value)."""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+
+    @classmethod
+    def write(
+        cls, time_series: CompressedTimeSeries, directory: str = SHARED_DIR, name: str = "ts"
+    ) -> "SharedTimeSeries":
+        runs = np.empty(time_series.n_runs(), dtype=RUN_DTYPE)
+        runs["start"] = time_series.starts
+        runs["count"] = time_series.counts
+        runs["value"] = time_series.values
+        path = _path(directory, name)
+        _save(path, runs)
+        return cls(path, time_series.interval)
+
+    def runs(self) -> np.ndarray:
+        return np.load(self.path, mmap_mode="r")
+
+    def decode(self):
+        """Sample times and values, like CompressedTimeSeries.decode."""
+        runs = self.runs()
+        counts = runs["count"]
+        run_index = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(len(run_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return runs["start"][run_index] + offsets * self.interval, runs["value"][run_index]
+
+    def to_timeseries(self) -> CompressedTimeSeries:
+        runs = self.runs()
+        return CompressedTimeSeries(self.interval, runs["start"], runs["count"], runs["value"])
+
+    def files(self) -> List[str]:
+        return [self.path]
+
+    def __repr__(self) -> str:
+        return f"SharedTimeSeries(runs={len(self.runs())}, interval={self.interval})"
+
+
+def share_outputs(result: Dict, directory: str = SHARED_DIR) -> Dict:
+    """Return the result with its lists of records and time series replaced by shared handles."""
+    shared = {}
+    for key, value in result.items():
+        if isinstance(value, CompressedTimeSeries):
+            value = SharedTimeSeries.write(value, directory, key)
+        elif isinstance(value, list) and value and isinstance(value[0], dict):
+            value = SharedTable.write(value, directory, key)
+        shared[key] = value
+    return shared
+
+
+def _handles(results) -> Iterable:
+    if hasattr(results, "columns"):  # DataFrame: the handles are in the object columns
+        values = (
+            value
+            for column in results.columns
+            if results[column].dtype == object
+            for value in results[column]
+        )
+    else:
+        values = (value for row in results for value in row.values())
+    return (value for value in values if isinstance(value, SharedHandle))
+
+
+def release_outputs(results) -> None:
+    """Remove the files of all handles in the results (a DataFrame or dicts) right away."""
+    for handle in _handles(results):
+        handle.unlink()
+
+
+def time_series_table(
+    results: "pd.DataFrame",
+    column: str = "queue_reaction_length",
+    keys: Iterable[str] = ("scenario", "replication_nr"),
+) -> "pd.DataFrame":
+    """
+    Stack the time series of one column of all replications into one long table with the keys,
+    time and value columns.
+    """
+    import pandas as pd
+
+    keys = [key for key in keys if key in results.columns]
+    times, values, rows = [], [], []
+    for row, series in enumerate(results[column]):
+        t, v = series.decode()
+        times.append(t)
+        values.append(v)
+        rows.append(np.full(len(t), row))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=int)
+    table = {key: results[key].to_numpy()[rows] for key in keys}
+    table[TIME_COLUMN] = np.concatenate(times) if times else np.empty(0)
+    table[VALUE_COLUMN] = np.concatenate(values) if values else np.empty(0, dtype=np.int32)
+    return pd.DataFrame(table)
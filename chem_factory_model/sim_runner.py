@@ -1,9 +1,29 @@
 from typing import Callable
-import pandas as pd
-from typing import Dict, List, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import atexit
+import importlib
+import json
+import numbers
+import os
+import random
+import signal
+import time
+from typing import TYPE_CHECKING, Dict, List, Iterable, Union
+from timeseries import CompressedTimeSeries
+from progress import SweepProgress
+from shared_outputs import SHARED_DIR, SharedTable, SharedTimeSeries, share_outputs
+
+if TYPE_CHECKING:  # pandas is imported when results are collected, not in the workers
+    import pandas as pd
 
 EXPERIMENTS_SHEET_NAME = "experiments"
 RESULTS_SHEET_NAME = "results"
+PRELOAD_MODULES = ("chem_simulation",)
+TIMEOUT_MSG = "simulation timed out"
+
+_pools: Dict[int, ProcessPoolExecutor] = {}  # persistent worker pools by size, see worker_pool
 
 
 def run_scenarios(
@@ -13,12 +33,23 @@ def run_scenarios(
     num_replications=10,
     reproducible=True,
     start_seed=0,
-) -> pd.DataFrame:
+    sink=None,
+    progress_filename: str = None,
+    antithetic=False,
+    workers: int = None,
+) -> "pd.DataFrame":
     scenarios = read_scenarios_excel(input_filename)
     replications = make_replications(
-        scenarios, num_replications, reproducible, start_seed
+        scenarios, num_replications, reproducible, start_seed, antithetic
+    )
+    progress = (
+        SweepProgress(len(replications), progress_filename)
+        if progress_filename
+        else None
+    )
+    results = run_simulations(
+        replications, simulate, sink=sink, progress=progress, workers=workers
     )
-    results = run_simulations(replications, simulate)
     write_results_excel(results, output_filename)
     return results
 
@@ -27,6 +58,8 @@ def read_scenarios_excel(
     filepath: str, sheet_name: str = EXPERIMENTS_SHEET_NAME
 ) -> List[Dict]:
     """Read scenarios from Excel file and return as list of dictionaries."""
+    import pandas as pd
+
     df_scenarios = pd.read_excel(filepath, sheet_name)
     if animation == True:
         df_scenarios = df_scenarios.head(1)
@@ -34,21 +67,253 @@ def read_scenarios_excel(
 
 
 def make_replications(
-    scenarios: Iterable[Dict], n_replications: int = 10, reproducible=True, start_seed=0
+    scenarios: Iterable[Dict],
+    n_replications: int = 10,
+    reproducible=True,
+    start_seed=0,
+    antithetic=False,
 ) -> List[Dict]:
+    """
+    Return the parameter dicts for n_replications runs per scenario.
+    If antithetic is True, every replication is a pair of runs with the same seed, the second
+    one with antithetic variates (simulate(antithetic=True)); combine the results with
+    combine_antithetic_pairs. Pairs need a shared seed, so non reproducible pairs get a random one,
+    and both runs use block_sampling (a stream per distribution, see distributions.py).
+    """
+    if not antithetic:
+        return [
+            {**params, "replication_nr": n, "random_seed": (seed if reproducible else "*")}
+            for params in scenarios
+            for n, seed in enumerate(range(start_seed, start_seed + n_replications))
+        ]
     return [
-        {**params, "replication_nr": n, "random_seed": (seed if reproducible else "*")}
+        {
+            **params,
+            "replication_nr": n,
+            "random_seed": seed,
+            "block_sampling": True,
+            "antithetic": is_antithetic,
+        }
         for params in scenarios
-        for n, seed in enumerate(range(start_seed, start_seed + n_replications))
+        for n, seed in enumerate(
+            range(start_seed, start_seed + n_replications)
+            if reproducible
+            else [random.randrange(2**31) for _ in range(n_replications)]
+        )
+        for is_antithetic in (False, True)
     ]
 
 
+def combine_antithetic_pairs(
+    results: "pd.DataFrame", kpis: Iterable[str] = None
+) -> "pd.DataFrame":
+    """
+    Combine each antithetic pair (same scenario and replication_nr) into one row with the mean
+    of the pair for the kpis (default: all numeric summary columns).
+    The pair means are independent replications. Their variance is smaller than that of the mean
+    of two independent runs as far as the runs of a pair are negatively correlated; check the
+    correlation for the kpis of interest.
+    """
+    keys = [key for key in ("scenario", "replication_nr") if key in results.columns]
+    if kpis is None:
+        kpis = [
+            column
+            for column in results.select_dtypes("number").columns
+            if column not in keys and column not in ("random_seed", "antithetic")
+        ]
+    pairs = results.groupby(keys, sort=False)
+    combined = pairs[list(kpis)].mean()
+    combined["random_seed"] = pairs["random_seed"].first()
+    combined["pair_size"] = pairs.size()
+    return combined.reset_index()
+
+
 def run_simulations(
-    params_seq: Iterable[Dict], simulate: Callable, animate=False, chatty=False
-) -> pd.DataFrame:
-    """Run a simulation for each parameter se (dict) in sequence and return a dataframe with the results."""
-    run = lambda params: run_model_params_dict(params, simulate, animate, chatty)
-    return pd.DataFrame(map(run, params_seq))
+    params_seq: Iterable[Dict],
+    simulate: Callable,
+    animate=False,
+    chatty=False,
+    sink: "JsonlResultWriter" = None,
+    progress: SweepProgress = None,
+    workers: int = None,
+    chunksize: int = 1,
+    shared_outputs: Union[bool, str] = False,
+) -> "pd.DataFrame":
+    """
+    Run a simulation for each parameter se (dict) in sequence and return a dataframe with the results.
+    If a sink is given, every result is appended to the sink as soon as it is produced and
+    only the summary (scalar) columns are kept in memory and returned.
+    If progress is given, every finished replication is reported to it.
+    If workers > 1, the simulations run in the persistent pool of that many worker processes
+    (see worker_pool; simulate has to be a module level function), in chunks of chunksize
+    replications per message; the results keep the order of params_seq.
+    If shared_outputs is True (or a directory), the workers write the logs and time series into
+    memory-mapped files and return handles instead (see shared_outputs.py). The handles own the
+    files: they are removed when the results are garbage collected or the interpreter exits, or
+    right away with shared_outputs.release_outputs.
+    """
+    import pandas as pd
+
+    if workers is not None and workers > 1:
+        share_dir = _share_dir(shared_outputs)
+        results = _run_parallel(
+            params_seq, simulate, animate, chatty, workers, progress, chunksize, share_dir
+        )
+    else:
+        run = lambda params: run_model_params_dict(params, simulate, animate, chatty)
+        if progress is not None:
+            run = _with_progress(run, progress)
+        results = map(run, params_seq)
+    if sink is None:
+        return pd.DataFrame(results)
+    return pd.DataFrame([sink.append(result) for result in results])
+
+
+def _share_dir(shared_outputs: Union[bool, str]) -> Union[str, None]:
+    if not shared_outputs:
+        return None
+    return SHARED_DIR if shared_outputs is True else shared_outputs
+
+
+def _timed_run(
+    params: Dict,
+    simulate: Callable,
+    animate=False,
+    chatty=False,
+    share_dir: str = None,
+    timeout: float = None,
+):
+    """
+    Run one replication and return (result, wall time, pid).
+    timeout: wall time in seconds from the start of the replication, enforced with SIGALRM
+        (Unix, main thread of the process only); a replication that takes longer is interrupted
+        and returns its parameters with msg TIMEOUT_MSG
+    """
+    t0 = time.perf_counter()
+    if timeout is not None:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            result = run_model_params_dict(params, simulate, animate, chatty)
+        finally:
+            if timeout is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+    except _ReplicationTimeout:  # also when the alarm went off in the finally clause
+        result = {**params, "msg": TIMEOUT_MSG}
+    if share_dir is not None:
+        result = share_outputs(result, share_dir)
+    return result, time.perf_counter() - t0, os.getpid()
+
+
+class _ReplicationTimeout(BaseException):
+    """Raised by SIGALRM in _timed_run; not an Exception, so that simulate does not catch it."""
+
+
+def _raise_timeout(signum, frame):
+    raise _ReplicationTimeout()
+
+
+def _preload(modules: Iterable[str]) -> None:
+    """Worker initializer: import the modules once, they stay resident for every replication."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _worker_pid(_=None) -> int:
+    return os.getpid()
+
+
+def worker_pool(
+    workers: int = None, preload: Iterable[str] = PRELOAD_MODULES
+) -> ProcessPoolExecutor:
+    """
+    Return the persistent pool of worker processes (default: one per cpu).
+    The pool is started on first use; all workers are started and import the preload modules
+    right away, so the first sweep does not pay for the startup. Later sweeps (run_simulations,
+    run_scenarios and async_runner with workers), also from other notebook cells, reuse the
+    warm workers. There is one pool per number of workers: a sweep with another number of
+    workers starts its own pool and never stops a pool that another sweep may be using.
+    """
+    workers = workers or os.cpu_count() or 1
+    executor = _pools.get(workers)
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            workers, initializer=_preload, initargs=(tuple(preload),)
+        )
+        list(executor.map(_worker_pid, range(workers)))  # one task per worker starts them all
+        _pools[workers] = executor
+    return executor
+
+
+def shutdown_worker_pool(workers: int = None) -> None:
+    """
+    Stop the workers of the persistent pool of that size, or of all pools if workers is None
+    (a next sweep starts a new one). Replications that have not started are cancelled, the
+    running ones are waited for: without waiting, the pool's management thread can still be
+    using its pipes while the interpreter exits (OSError: Bad file descriptor).
+    Called at exit for the pools that are left.
+    """
+    for size in list(_pools) if workers is None else [workers]:
+        executor = _pools.pop(size, None)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_worker_pool)
+
+
+def _discard_pool(executor: ProcessPoolExecutor) -> None:
+    """
+    Forget a broken pool, so that the next sweep of its size starts a new one.
+    Not waited for: the workers of a broken pool are gone already.
+    """
+    for size, pool in list(_pools.items()):
+        if pool is executor:
+            del _pools[size]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_parallel(
+    params_seq: Iterable[Dict],
+    simulate: Callable,
+    animate: bool,
+    chatty: bool,
+    workers: int,
+    progress: SweepProgress = None,
+    chunksize: int = 1,
+    share_dir: str = None,
+):
+    """Yield the results of the simulations run in the persistent worker pool, in order."""
+    run = partial(
+        _timed_run, simulate=simulate, animate=animate, chatty=chatty, share_dir=share_dir
+    )
+    executor = worker_pool(workers)
+    try:
+        for result, wall_time, worker in executor.map(run, params_seq, chunksize=chunksize):
+            if progress is not None:
+                progress.task_done(result, wall_time, worker=worker)
+            yield result
+    except BrokenProcessPool:
+        _discard_pool(executor)  # a worker died: start a fresh pool on the next sweep
+        raise
+
+
+def _with_progress(run: Callable, progress: SweepProgress) -> Callable:
+    """Wrap run so that every call (successful or not) is reported to progress."""
+
+    def run_with_progress(params: Dict) -> Dict:
+        t0 = time.perf_counter()
+        try:
+            result = run(params)
+        except Exception:
+            progress.task_done(None, time.perf_counter() - t0, failed=True)
+            raise
+        progress.task_done(result, time.perf_counter() - t0)
+        return result
+
+    return run_with_progress
 
 
 def run_model_params_dict(
@@ -62,14 +327,96 @@ def run_model_params_dict(
     return simulate(animate=animate, **params_dict)
 
 
+def summary_columns(result: Dict) -> Dict:
+    """Return the scalar entries of a result dict, i.e. everything except logs and time series."""
+    return {
+        key: value
+        for key, value in result.items()
+        if value is None or isinstance(value, (str, bool, numbers.Number))
+    }
+
+
+def _to_json(value):
+    """json.dump fallback for the non-standard objects found in result dicts."""
+    if isinstance(value, CompressedTimeSeries):
+        return value.to_literal()
+    if isinstance(value, SharedTimeSeries):
+        return value.to_timeseries().to_literal()
+    if isinstance(value, SharedTable):
+        return value.to_records()
+    if hasattr(value, "tolist"):  # numpy scalars and arrays
+        return value.tolist()
+    return str(value)
+
+
+class JsonlResultWriter:
+    """
+    Result sink that appends every replication result as one line to a JSON Lines file.
+    Lines are flushed immediately, so the file can be read with read_results_jsonl
+    while the sweep is still running.
+    """
+
+    def __init__(self, filepath: str, mode: str = "w"):
+        self.filepath = filepath
+        self.n_written = 0
+        self._file = open(filepath, mode, encoding="utf-8")
+
+    def append(self, result: Dict) -> Dict:
+        """Write the full result and return its summary columns."""
+        self._file.write(json.dumps(result, default=_to_json) + "\n")
+        self._file.flush()
+        self.n_written += 1
+        return summary_columns(result)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "JsonlResultWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_results_jsonl(filepath: str, summary_only: bool = False) -> "pd.DataFrame":
+    """
+    Read results written by JsonlResultWriter.
+    An incomplete last line (sweep still running) is ignored.
+    Time series columns are returned as CompressedTimeSeries.
+    """
+    import pandas as pd
+
+    rows = []
+    with open(filepath, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if summary_only:
+                row = summary_columns(row)
+            else:
+                row = {
+                    key: (
+                        CompressedTimeSeries.from_literal(value)
+                        if isinstance(value, dict) and "counts" in value
+                        else value
+                    )
+                    for key, value in row.items()
+                }
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
 def write_results_excel(
-    df: pd.DataFrame, filepath: str, sheet_name: str = RESULTS_SHEET_NAME
+    df: "pd.DataFrame", filepath: str, sheet_name: str = RESULTS_SHEET_NAME
 ) -> None:
     """Write results to Excel file."""
     df.to_excel(filepath, sheet_name, index=False)
 
 
 if __name__ == "__main__":
+    import pandas as pd
     import chem_simulation as simulation
     from helpers import transform_timeseries
 
@@ -0,0 +1,80 @@
+"""
+Early detection of unstable (overloaded) runs.
+
+In an overloaded plant the WIP grows without bound and every further simulated day costs more
+events while the replication will be discarded anyway. InstabilityDetector samples a level
+(e.g. the WIP) at a fixed interval and stops the run as soon as the level has a significant
+increasing trend in n_windows consecutive windows.
+
+The trend test is the Mann-Kendall test on the block means of a window; the block means damp the
+autocorrelation of the samples. A single window is not enough: a stable plant filling up from
+empty, or a long busy spell, also has a rising window, but not several in a row.
+"""
+
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from base_library import DualModeComponent
+
+DAY = 24  # hours
+INTERVAL = 1 * DAY
+WINDOW = 60 * DAY
+N_BLOCKS = 6
+N_WINDOWS = 2
+Z_CRITICAL = 2.5
+
+
+def mann_kendall_z(x) -> float:
+    """Mann-Kendall trend statistic (normal approximation with continuity and tie correction)."""
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    s = np.sign(x[None, :] - x[:, None])[np.triu_indices(n, 1)].sum()
+    _, ties = np.unique(x, return_counts=True)
+    variance = (n * (n - 1) * (2 * n + 5) - (ties * (ties - 1) * (2 * ties + 5)).sum()) / 18
+    if variance <= 0:
+        return 0.0
+    return float((s - np.sign(s)) / np.sqrt(variance))
+
+
+class InstabilityDetector(DualModeComponent):
+    """
+    Samples level() every interval and stops the run when the samples of each of the last
+    n_windows windows (of length window) have an increasing trend with z >= z_critical.
+    The detection time is in detected_at (None if the run is stable).
+    """
+
+    def setup(
+        self,
+        level: Callable[[], float],
+        interval: float = INTERVAL,
+        window: float = WINDOW,
+        n_blocks: int = N_BLOCKS,
+        n_windows: int = N_WINDOWS,
+        z_critical: float = Z_CRITICAL,
+    ):
+        self.level = level
+        self.interval = interval
+        self.n_blocks = n_blocks
+        self.n_windows = n_windows
+        self.z_critical = z_critical
+        # whole blocks of whole samples
+        self.samples_per_block = max(1, round(window / interval / n_blocks))
+        self.samples = deque(maxlen=self.samples_per_block * n_blocks * n_windows)
+        self.detected_at = None
+
+    def unstable(self) -> bool:
+        if len(self.samples) < self.samples.maxlen:
+            return False
+        block_means = np.reshape(self.samples, (self.n_windows, self.n_blocks, -1)).mean(axis=2)
+        return all(mann_kendall_z(means) >= self.z_critical for means in block_means)
+
+    def steps(self):
+        while True:
+            yield self.hold(self.interval)
+            self.samples.append(self.level())
+            if self.unstable():
+                self.detected_at = self.env.now()
+                self.env.main().activate()  # ends env.run
+                return
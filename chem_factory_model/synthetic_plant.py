@@ -0,0 +1,313 @@
+"""
+Synthetic plants of any size for stress testing base_library and the batch process logic.
+
+SyntheticPlant builds n_lines parallel lines of n_stages ResourceStations from the base_library
+primitives, with a QueueStation buffer per stage and n_products product types. Every batch passes
+all stages; at each stage it waits in the buffer and joins the line with the fewest requesters.
+Arrival rates are set for a target utilization; initial_wip batches are released at time 0,
+so tens of thousands of concurrent batches are easy to get.
+
+benchmark measures build time, event throughput and peak memory of one plant, scaling_benchmark
+does that for growing values of one size parameter and scaling_exponent fits the growth
+(1 is linear; clearly above 1 points at a super-linear hot spot).
+process_mode_benchmark compares the event throughput of salabim's yieldless (greenlet) and
+yield based process modes, for the synthetic plant and optionally for simulate.
+Run this module to print the scaling of the default plant in every size parameter and the
+comparison of the process modes.
+"""
+
+import math
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+import salabim as sim
+
+from base_library import (
+    BasicEntity,
+    DualModeComponent,
+    QueueStation,
+    ResourceStation,
+    STATION_HEIGHT,
+    STATION_WIDTH,
+)
+
+PRODUCT_COLORS = ("royalblue", "seagreen", "darkorange", "purple", "firebrick", "teal")
+MEAN_PROCESSING_TIME = 1  # mean processing time per stage, hours
+BENCHMARK_RUN_DURATION = 200
+BENCHMARK_SIZES = (1, 2, 4, 8, 16, 32)
+
+
+class SyntheticBatch(BasicEntity):
+    """Batch of one product that passes all stages of a SyntheticPlant."""
+
+    def setup(self, product: int, plant: "SyntheticPlant"):
+        super().setup(
+            fillcolor=PRODUCT_COLORS[product % len(PRODUCT_COLORS)], visible=False
+        )
+        self.product = product
+        self.plant = plant
+
+    def steps(self):
+        t_entered = self.env.now()
+        self.plant.batch_entered()
+        for stage, buffer in enumerate(self.plant.buffers):
+            buffer.add(self)
+            server = min(self.plant.servers[stage], key=lambda s: len(s.requesters()))
+            yield from self.move_and_hold_steps(server.x, server.y, duration=self.plant.transport_time)
+            yield self.request(server, mode="requesting")
+            self.leave(buffer)
+            self.visible()
+            yield self.hold(self.plant.processing_times[self.product][stage](), mode="processing")
+            self.release(server)
+            self.invisible()
+        self.plant.batch_left(self.env.now() - t_entered)
+
+
+class SyntheticSource(DualModeComponent):
+    """Creates batches of one product with exponential inter-arrival times."""
+
+    def setup(self, product: int, plant: "SyntheticPlant", arrival_rate: float):
+        self.product = product
+        self.plant = plant
+        self.inter_arrival_time = sim.Exponential(mean=1 / arrival_rate)
+
+    def steps(self):
+        while True:
+            yield self.hold(self.inter_arrival_time())
+            SyntheticBatch(product=self.product, plant=self.plant)
+
+
+class SyntheticPlant:
+    """
+    Parameterized plant: n_lines parallel lines, n_stages stages, n_products products.
+    capacity: capacity of every server
+    utilization: target utilization of the servers, sets the arrival rate
+    initial_wip: number of batches released at time 0
+    stats_only: statistics only monitors in the stations (see base_library.QueueStation)
+    seed: seed of the layout of the processing times (the run itself uses the salabim stream)
+    """
+
+    def __init__(
+        self,
+        n_lines: int = 2,
+        n_stages: int = 3,
+        n_products: int = 2,
+        capacity: int = 1,
+        utilization: float = 0.8,
+        initial_wip: int = 0,
+        transport_time: float = 0.1,
+        stats_only: bool = True,
+        seed: int = 0,
+        queue_animate: bool = False,
+    ):
+        layout = random.Random(seed)
+        self.transport_time = transport_time
+        self.buffers = []
+        self.servers = []
+        for stage in range(n_stages):
+            x = stage * STATION_WIDTH * 2
+            self.buffers.append(
+                QueueStation(
+                    name=f"buffer.{stage}",
+                    display_name=f"B{stage}",
+                    x=x,
+                    y=-STATION_HEIGHT * 2,
+                    queue_animate=queue_animate,
+                    stats_only=stats_only,
+                )
+            )
+            self.servers.append(
+                [
+                    ResourceStation(
+                        name=f"server.{stage}.{line}",
+                        display_name=f"S{stage}.{line}",
+                        capacity=capacity,
+                        x=x + STATION_WIDTH,
+                        y=line * STATION_HEIGHT * 2,
+                        queue_animate=queue_animate,
+                        stats_only=stats_only,
+                    )
+                    for line in range(n_lines)
+                ]
+            )
+        # processing time per product and stage: triangular around a random mode
+        self.processing_times = []
+        for product in range(n_products):
+            modes = [
+                MEAN_PROCESSING_TIME * layout.uniform(0.5, 1.5) for _ in range(n_stages)
+            ]
+            self.processing_times.append(
+                [sim.Triangular(low=0.5 * m, high=2 * m, mode=m) for m in modes]
+            )
+        mean_processing_time = np.mean(
+            [[pt.mean() for pt in times] for times in self.processing_times]
+        )
+        arrival_rate = utilization * n_lines * capacity / mean_processing_time
+        self.sources = [
+            SyntheticSource(product=product, plant=self, arrival_rate=arrival_rate / n_products)
+            for product in range(n_products)
+        ]
+        self.time_in_system = sim.Monitor("time_in_system", stats_only=True)
+        self.wip = 0
+        self.max_wip = 0
+        for i in range(initial_wip):
+            SyntheticBatch(product=i % n_products, plant=self)
+
+    @property
+    def stations(self) -> list:
+        return [*self.buffers, *(server for servers in self.servers for server in servers)]
+
+    def batch_entered(self) -> None:
+        self.wip += 1
+        self.max_wip = max(self.max_wip, self.wip)
+
+    def batch_left(self, time_in_system: float) -> None:
+        self.wip -= 1
+        self.time_in_system.tally(time_in_system)
+
+
+def benchmark(
+    run_duration: float = BENCHMARK_RUN_DURATION,
+    random_seed: int = 0,
+    trace_memory: bool = True,
+    yieldless: bool = True,
+    **plant_kwargs,
+) -> Dict:
+    """
+    Build and run one synthetic plant and return its size, build and run time, the number of
+    events, events per second and (if trace_memory) the peak memory. The memory is measured in a
+    separate run, because tracemalloc slows the simulation down.
+    """
+
+    def run(measure_memory: bool) -> Dict:
+        if measure_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        env = sim.Environment(random_seed=random_seed, yieldless=yieldless)
+        env.animate(False)
+        plant = SyntheticPlant(**plant_kwargs)
+        t1 = time.perf_counter()
+        env.run(till=run_duration)
+        t2 = time.perf_counter()
+        n_events = getattr(env, "n_events", 0)
+        stats = {
+            "n_stations": len(plant.stations),
+            "build_s": t1 - t0,
+            "run_s": t2 - t1,
+            "events": n_events,
+            "events_per_s": n_events / (t2 - t1) if t2 > t1 else math.inf,
+            "max_wip": plant.max_wip,
+            "completed": plant.time_in_system.number_of_entries(),
+        }
+        if measure_memory:
+            stats["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        return stats
+
+    stats = run(False)
+    if trace_memory:
+        stats["peak_memory_mb"] = run(True)["peak_memory_mb"]
+    return {**plant_kwargs, **stats}
+
+
+def scaling_benchmark(
+    parameter: str = "n_lines",
+    values: Iterable[int] = BENCHMARK_SIZES,
+    run_duration: float = BENCHMARK_RUN_DURATION,
+    **plant_kwargs,
+) -> pd.DataFrame:
+    """Benchmark the plant for every value of one size parameter, the others fixed."""
+    return pd.DataFrame(
+        [
+            benchmark(run_duration=run_duration, **{**plant_kwargs, parameter: value})
+            for value in values
+        ]
+    )
+
+
+def process_mode_benchmark(
+    simulate: Callable = None,
+    params: Dict = None,
+    repeats: int = 3,
+    run_duration: float = BENCHMARK_RUN_DURATION,
+    **plant_kwargs,
+) -> pd.DataFrame:
+    """
+    Event throughput of the yieldless and the yield based process mode, best of repeats:
+    for the synthetic plant and, if given, for simulate(**params).
+    Both modes give the same events, so events_per_s compares the mode overhead only.
+    """
+    rows = []
+    for yieldless in (True, False):
+        runs = [
+            benchmark(run_duration, trace_memory=False, yieldless=yieldless, **plant_kwargs)
+            for _ in range(repeats)
+        ]
+        best = min(runs, key=lambda stats: stats["run_s"])
+        rows.append(
+            {
+                "model": "synthetic_plant",
+                "yieldless": yieldless,
+                "run_s": best["run_s"],
+                "events": best["events"],
+            }
+        )
+        if simulate is not None:
+            run_times = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                result = simulate(**{**(params or {}), "yieldless": yieldless})
+                run_times.append(time.perf_counter() - t0)
+            rows.append(
+                {
+                    "model": "simulate",
+                    "yieldless": yieldless,
+                    "run_s": min(run_times),
+                    "events": result["n_events"],
+                }
+            )
+    results = pd.DataFrame(rows).sort_values(["model", "yieldless"], ignore_index=True)
+    results["events_per_s"] = results["events"] / results["run_s"]
+    return results
+
+
+def scaling_exponent(results: pd.DataFrame, x: str, y: str = "run_s") -> float:
+    """Slope of log(y) against log(x): y grows like x ** exponent."""
+    valid = (results[x] > 0) & (results[y] > 0)
+    return float(np.polyfit(np.log(results[x][valid]), np.log(results[y][valid]), 1)[0])
+
+
+if __name__ == "__main__":
+    pd.set_option("display.width", 200)
+    # run time and memory should grow like the number of events (or the wip);
+    # a clearly larger exponent points at a super-linear hot spot
+    for parameter, plant_kwargs in (
+        ("n_lines", {}),
+        ("n_stages", {}),
+        ("n_products", {}),
+        ("initial_wip", {"utilization": 0.5}),
+    ):
+        values = (
+            [1000 * size for size in BENCHMARK_SIZES]
+            if parameter == "initial_wip"
+            else BENCHMARK_SIZES
+        )
+        results = scaling_benchmark(parameter, values, **plant_kwargs)
+        print(results)
+        for y in ("events", "build_s", "run_s", "peak_memory_mb"):
+            print(f"{parameter}: {y} ~ {parameter} ** {scaling_exponent(results, parameter, y):.2f}")
+        print()
+    from chem_simulation import simulate
+
+    print(
+        process_mode_benchmark(
+            simulate,
+            {"animate": False, "random_seed": 0, "run_duration": 365 * 24},
+            n_lines=8,
+            n_stages=8,
+        )
+    )
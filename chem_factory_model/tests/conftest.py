@@ -0,0 +1,19 @@
+"""
+Shared fixtures. The modules of the model are imported flat (as the notebooks do), so the
+package directory is put on sys.path.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chem_simulation import DAY, simulate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def short_run():
+    """Result of a short run of the model, shared by the tests that only read it."""
+    return simulate(animate=False, random_seed=1, run_duration=20 * DAY)
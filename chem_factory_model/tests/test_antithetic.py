@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chem_simulation import DAY, simulate
+from distributions import BlockExponential, variate_stream
+from sim_runner import combine_antithetic_pairs, make_replications
+
+
+def test_replications_come_in_pairs():
+    replications = make_replications([{"scenario": 1}, {"scenario": 2}], 3, antithetic=True)
+    assert len(replications) == 12
+    for plain, mirrored in zip(replications[::2], replications[1::2]):
+        assert not plain["antithetic"] and mirrored["antithetic"]
+        assert plain["block_sampling"] and mirrored["block_sampling"]
+        assert {**plain, "antithetic": True} == mirrored
+    assert [params["random_seed"] for params in replications[:6:2]] == [0, 1, 2]
+
+
+def test_non_reproducible_pairs_share_a_seed():
+    replications = make_replications([{"scenario": 1}], 4, reproducible=False, antithetic=True)
+    seeds = [params["random_seed"] for params in replications]
+    assert all(isinstance(seed, int) for seed in seeds)
+    assert seeds[::2] == seeds[1::2]
+
+
+def test_plain_replications_are_unchanged():
+    replications = make_replications([{"scenario": 1}], 2, start_seed=5)
+    assert replications == [
+        {"scenario": 1, "replication_nr": 0, "random_seed": 5},
+        {"scenario": 1, "replication_nr": 1, "random_seed": 6},
+    ]
+
+
+def test_combine_pairs():
+    results = pd.DataFrame(
+        {
+            "scenario": [1, 1, 1, 1],
+            "replication_nr": [0, 0, 1, 1],
+            "random_seed": [0, 0, 1, 1],
+            "antithetic": [False, True, False, True],
+            "throughput": [10.0, 14.0, 9.0, 11.0],
+            "msg": ["", "", "", ""],
+        }
+    )
+    combined = combine_antithetic_pairs(results)
+    assert combined["throughput"].tolist() == [12.0, 10.0]
+    assert combined["random_seed"].tolist() == [0, 1]
+    assert combined["pair_size"].tolist() == [2, 2]
+    assert "antithetic" not in combined.columns
+    assert list(combine_antithetic_pairs(results, kpis=["throughput"]).columns) == [
+        "scenario",
+        "replication_nr",
+        "throughput",
+        "random_seed",
+        "pair_size",
+    ]
+
+
+def test_antithetic_variates_are_negatively_correlated():
+    plain = BlockExponential(2, rng=variate_stream(1, "e"))
+    mirrored = BlockExponential(2, rng=variate_stream(1, "e"), antithetic=True)
+    samples = np.array([(plain(), mirrored()) for _ in range(5000)])
+    assert np.corrcoef(samples.T)[0, 1] < -0.5
+
+
+def test_antithetic_run_needs_block_sampling():
+    with pytest.raises(ValueError, match="block_sampling"):
+        simulate(animate=False, random_seed=1, run_duration=DAY, antithetic=True)
+
+
+def test_antithetic_run_differs_from_its_counterpart():
+    kwargs = dict(animate=False, random_seed=1, run_duration=5 * DAY, block_sampling=True)
+    plain = simulate(**kwargs)
+    mirrored = simulate(**kwargs, antithetic=True)
+    assert mirrored["n_events"] == simulate(**kwargs, antithetic=True)["n_events"]
+    assert plain["n_events"] != mirrored["n_events"]
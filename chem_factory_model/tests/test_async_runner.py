@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from async_runner import iter_simulations, run_simulations_async
+from sim_runner import TIMEOUT_MSG
+
+calls = []
+
+
+def fake_simulate(animate=False, duration=0.0, fail=False, **params):
+    """Module level, so that worker processes can unpickle it."""
+    calls.append(params.get("n"))
+    time.sleep(duration)
+    if fail:
+        raise RuntimeError("boom")
+    return {**params, "duration": duration, "msg": "simulation ended"}
+
+
+@pytest.fixture(scope="module")
+def processes():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+def collect(params_seq, **kwargs):
+    async def run():
+        return [result async for result in iter_simulations(params_seq, fake_simulate, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_results_in_order_of_params(processes):
+    params_seq = [{"n": n, "duration": 0.05 * (3 - n)} for n in range(4)]
+    results = asyncio.run(
+        run_simulations_async(params_seq, fake_simulate, workers=2, executor=processes)
+    )
+    assert results["n"].tolist() == [0, 1, 2, 3]
+    assert (results["msg"] == "simulation ended").all()
+
+
+def test_failing_replication_yields_its_parameters(processes):
+    (result,) = collect([{"n": 0, "fail": True}], workers=2, executor=processes)
+    assert result["n"] == 0 and result["msg"] == "another exception: boom"
+
+
+def test_every_replication_timing_out_in_processes(processes):
+    t0 = time.perf_counter()
+    results = collect(
+        [{"n": n, "duration": 5} for n in range(4)], workers=2, executor=processes, timeout=0.2
+    )
+    assert time.perf_counter() - t0 < 2
+    assert sorted(result["n"] for result in results) == [0, 1, 2, 3]
+    assert all(result["msg"] == TIMEOUT_MSG for result in results)
+
+
+def test_every_replication_timing_out_in_threads():
+    executor = ThreadPoolExecutor(2)
+    t0 = time.perf_counter()
+    results = collect(
+        [{"n": n, "duration": 1} for n in range(2)], workers=2, executor=executor, timeout=0.2
+    )
+    assert time.perf_counter() - t0 < 0.8
+    assert [result["msg"] for result in results] == [TIMEOUT_MSG, TIMEOUT_MSG]
+    executor.shutdown(wait=True)
+
+
+def test_closing_the_iterator_stops_submitting():
+    calls.clear()
+    executor = ThreadPoolExecutor(2)
+
+    async def first():
+        results = iter_simulations(
+            ({"n": n, "duration": 0.05} for n in range(20)),
+            fake_simulate,
+            workers=2,
+            executor=executor,
+        )
+        result = await results.__anext__()
+        await results.aclose()
+        return result
+
+    assert asyncio.run(first())["msg"] == "simulation ended"
+    executor.shutdown(wait=True)
+    assert len(calls) <= 4
+
+
+def test_back_pressure_limits_pending_replications():
+    running, peak = set(), [0]
+    lock = threading.Lock()
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            def counted():
+                with lock:
+                    running.add(threading.get_ident())
+                    peak[0] = max(peak[0], len(running))
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    with lock:
+                        running.discard(threading.get_ident())
+
+            return super().submit(counted)
+
+    with CountingExecutor(4) as executor:
+        results = collect(
+            [{"n": n, "duration": 0.02} for n in range(8)], workers=4, executor=executor, max_pending=2
+        )
+    assert len(results) == 8 and peak[0] <= 2
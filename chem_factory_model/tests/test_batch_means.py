@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from batch_means import batch_means, lag1_autocorrelation, run_batch_means, steady_state_series
+from chem_simulation import DAY, simulate
+
+
+def ar1(phi, n, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=n)
+    x = np.empty(n)
+    x[0] = noise[0]
+    for i in range(1, n):
+        x[i] = phi * x[i - 1] + noise[i]
+    return x + 10
+
+
+def test_lag1_autocorrelation():
+    assert lag1_autocorrelation(np.ones(5)) == 0.0
+    assert lag1_autocorrelation(ar1(0.9, 20_000)) == pytest.approx(0.9, abs=0.02)
+    assert lag1_autocorrelation(np.array([1.0, -1.0] * 50)) < -0.9
+
+
+def test_independent_observations_keep_the_smallest_batches():
+    x = np.random.default_rng(1).normal(5, 1, size=4096)
+    estimate = batch_means(x)
+    assert estimate["batch_size"] == 4 and estimate["n_batches"] == 1024
+    assert estimate["independent"]
+    assert estimate["mean"] == pytest.approx(x.mean())
+    assert estimate["ci_low"] < 5 < estimate["ci_high"]
+
+
+def test_correlated_observations_get_larger_batches():
+    x = ar1(0.95, 20_000)
+    estimate = batch_means(x)
+    assert estimate["independent"]
+    assert estimate["batch_size"] > 20_000 // 1024
+    assert estimate["ci_low"] < 10 < estimate["ci_high"]
+    naive_half_width = 1.96 * x.std(ddof=1) / np.sqrt(len(x))
+    assert estimate["half_width"] > 3 * naive_half_width
+
+
+def test_too_few_observations():
+    estimate = batch_means(np.arange(5.0))
+    assert estimate["n_batches"] == 0 and estimate["batch_size"] is None
+    assert np.isnan(estimate["mean"]) and not estimate["independent"]
+
+
+def test_dependence_that_does_not_vanish_is_flagged():
+    estimate = batch_means(np.arange(1000.0), max_batches=100)
+    assert not estimate["independent"]
+    assert estimate["n_batches"] >= 10
+
+
+def test_steady_state_series(short_run):
+    series = steady_state_series(short_run, warmup=5 * DAY)
+    assert {"time_in_system", "queue_reaction_length", "throughput"} <= set(series)
+    assert len(series["throughput"]) == 15
+    assert (series["time_in_system"] > 0).all()
+    assert series["throughput"].sum() <= len(series["time_in_system"])
+
+
+def test_series_need_the_batch_log():
+    result = simulate(animate=False, random_seed=1, run_duration=2 * DAY, stats_only=True)
+    with pytest.raises(ValueError, match="batch log"):
+        steady_state_series(result, warmup=DAY)
+
+
+def test_run_batch_means():
+    scenarios = [{"scenario": 1, "run_duration": 30 * DAY}, {"scenario": 2, "run_duration": 30 * DAY}]
+    table = run_batch_means(scenarios, simulate, warmup=5 * DAY)
+    assert set(table.index.get_level_values("scenario")) == {1, 2}
+    assert {"mean", "ci_low", "ci_high", "batch_size", "independent"} <= set(table.columns)
+    assert table.loc[("throughput", 1), "n"] == 25
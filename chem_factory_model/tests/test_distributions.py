@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from chem_simulation import DAY, simulate
+from distributions import BlockExponential, BlockSampled, BlockTriangular, variate_stream
+
+
+def draw(distribution, n):
+    return np.array([distribution() for _ in range(n)])
+
+
+def test_streams_are_reproducible_and_independent_per_name():
+    assert variate_stream(1, "a").random() == variate_stream(1, "a").random()
+    assert variate_stream(1, "a").random() != variate_stream(1, "b").random()
+    assert variate_stream(1, "a").random() != variate_stream(2, "a").random()
+
+
+def test_unseeded_streams_differ():
+    assert variate_stream("*", "a").random() != variate_stream("*", "a").random()
+    assert variate_stream(None, "a").random() != variate_stream(None, "a").random()
+
+
+def test_sequence_does_not_depend_on_the_block_size():
+    small = BlockTriangular(1, 5, 2, rng=variate_stream(1, "t"), block_size=7)
+    large = BlockTriangular(1, 5, 2, rng=variate_stream(1, "t"))
+    np.testing.assert_allclose(draw(small, 50), draw(large, 50))
+
+
+def test_triangular_bounds_and_mean():
+    samples = draw(BlockTriangular(1, 5, 2, rng=variate_stream(1, "t")), 20_000)
+    assert samples.min() >= 1 and samples.max() <= 5
+    assert samples.mean() == pytest.approx(BlockTriangular(1, 5, 2, rng=None).mean(), rel=0.01)
+    assert np.median(samples) == pytest.approx(5 - np.sqrt(0.5 * 4 * 3), rel=0.02)
+
+
+def test_degenerate_triangular_is_constant():
+    assert set(draw(BlockTriangular(3, 3, 3, rng=variate_stream(1, "t")), 10)) == {3.0}
+
+
+def test_exponential_mean():
+    distribution = BlockExponential(4, rng=variate_stream(1, "e"))
+    samples = draw(distribution, 20_000)
+    assert samples.min() >= 0
+    assert samples.mean() == pytest.approx(distribution.mean(), rel=0.03)
+
+
+def test_antithetic_uses_the_mirrored_uniforms():
+    plain = BlockSampled(lambda u: u, variate_stream(1, "u"), block_size=5)
+    mirrored = BlockSampled(lambda u: u, variate_stream(1, "u"), block_size=5, antithetic=True)
+    np.testing.assert_allclose(draw(plain, 12) + draw(mirrored, 12), 1.0)
+    assert plain.sample() + mirrored.sample() == pytest.approx(1.0)
+
+
+def test_block_sampled_runs_are_reproducible():
+    kwargs = dict(animate=False, random_seed=3, run_duration=5 * DAY, block_sampling=True)
+    first, second = simulate(**kwargs), simulate(**kwargs)
+    assert first["n_events"] == second["n_events"]
+    for key in ("finished_batchesproduct_1", "finished_batchesproduct_2", "distillation_batches_processed"):
+        assert first[key] == second[key]
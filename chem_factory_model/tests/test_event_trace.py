@@ -0,0 +1,67 @@
+import salabim as sim
+
+from base_library import DualModeComponent
+from chem_simulation import DAY, simulate
+from event_trace import EventRecorder, read_event_trace
+
+
+def run_worker(path, **recorder_kwargs):
+    env = sim.Environment(yieldless=True)
+    machine = sim.Resource("machine", env=env)
+    stock = sim.Resource("stock", capacity=10, anonymous=True, env=env)
+    env.event_recorder = EventRecorder(path, **recorder_kwargs)
+
+    class Worker(DualModeComponent):
+        def steps(self):
+            yield self.request(stock)  # consumed, never released
+            yield self.request(machine)
+            yield self.hold(2)
+            self.release(machine)
+            yield self.hold(1)
+
+    Worker(name="worker", env=env)
+    Worker(name="other", env=env)
+    env.run()
+    env.event_recorder.close()
+    return env, read_event_trace(path)
+
+
+def test_events_and_stations(tmp_path):
+    env, trace = run_worker(str(tmp_path / "trace.bin"), components="worker")
+    assert set(trace["component"]) == {"worker"}
+    assert list(zip(trace["kind"], trace["station"])) == [
+        ("request", "stock"),
+        ("request", "machine"),
+        ("hold", "machine"),
+        ("release", "machine"),
+        ("hold", None),  # released: not labelled with the old station, nor with the stock
+    ]
+    assert trace["time"].tolist() == [0, 0, 0, 2, 2]
+    assert env.n_events == 10  # both workers are counted, also when not recorded
+
+
+def test_sampling_is_deterministic(tmp_path):
+    _, trace = run_worker(str(tmp_path / "trace.bin"), sample_rate=0.5)
+    assert len(trace) == 5
+    _, again = run_worker(str(tmp_path / "again.bin"), sample_rate=0.5)
+    assert trace.equals(again)
+
+
+def test_simulate_trace_file(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    result = simulate(
+        animate=False, random_seed=1, run_duration=5 * DAY, trace_file=path, trace_components="batch"
+    )
+    trace = read_event_trace(path)
+    assert len(trace) > 0
+    assert trace["component"].str.startswith("batch").all()
+    assert trace["time"].is_monotonic_increasing
+    assert len(trace) < result["n_events"]
+
+
+def test_n_events_is_the_same_in_both_process_modes():
+    results = [
+        simulate(animate=False, random_seed=2, run_duration=5 * DAY, yieldless=yieldless)
+        for yieldless in (True, False)
+    ]
+    assert results[0]["n_events"] == results[1]["n_events"] > 0
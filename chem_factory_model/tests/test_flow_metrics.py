@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chem_simulation import DAY, simulate
+from flow_metrics import flow_curves, flow_curves_per_product, littles_law_check, log_frame, wip_curve
+
+LOG = [
+    {"type": "product_1", "t_entered_system": 0.0, "t_left_system": 4.0},
+    {"type": "product_2", "t_entered_system": 1.0, "t_left_system": 3.0},
+]
+IN_SYSTEM = [{"type": "product_1", "t_entered_system": 2.0}]
+
+
+def test_wip_curve():
+    curve = wip_curve(LOG, in_system=IN_SYSTEM)
+    assert curve["time"].tolist() == [0, 1, 2, 3, 4]
+    assert curve["wip"].tolist() == [1, 2, 3, 2, 1]
+    assert wip_curve(LOG, product_type="product_2")["wip"].tolist() == [0, 1, 0]
+
+
+def test_log_forms():
+    expected = log_frame(LOG)
+    pd.testing.assert_frame_equal(log_frame(str(LOG)), expected)
+    pd.testing.assert_frame_equal(log_frame({"df_log_batches_entered": LOG}), expected)
+    assert len(log_frame({"df_log_batches_entered": LOG, "df_log_batches_in_system": IN_SYSTEM})) == 3
+
+
+def test_littles_law_holds_for_an_empty_system():
+    check = littles_law_check(LOG)
+    assert check["t_end"] == 4
+    assert check["wip_mean"] == pytest.approx(1.5)
+    assert check["throughput"] == pytest.approx(0.5)
+    assert check["cycle_time"] == pytest.approx(3)
+    assert check["relative_error"] == pytest.approx(0)
+
+
+def test_batches_left_in_the_system_count_in_the_wip():
+    check = littles_law_check(LOG, in_system=IN_SYSTEM)
+    assert check["wip_mean"] == pytest.approx(2)
+    assert check["littles_law"] == pytest.approx(1.5)
+    assert check["relative_error"] == pytest.approx(0.25)
+
+
+def test_flow_curves():
+    curves = flow_curves(LOG, window=2, step=1, in_system=IN_SYSTEM)
+    assert curves["time"].tolist() == [2, 3, 4]
+    assert curves["wip"].tolist() == [3, 2, 1]
+    assert curves["wip_mean"].tolist() == pytest.approx([1.5, 2.5, 2.5])
+    assert curves["throughput"].tolist() == [0, 0.5, 1]
+    assert np.isnan(curves["cycle_time"][0])
+    assert curves["cycle_time"].tolist()[1:] == [2, 3]
+
+
+def test_flow_curves_of_a_run(short_run):
+    curves = flow_curves_per_product(short_run, window=5 * DAY, step=DAY)
+    assert set(curves["product"]) == {"all", "product_1", "product_2"}
+    total = curves[curves["product"] == "all"].set_index("time")
+    per_product = curves[curves["product"] != "all"].groupby("time")[["wip", "throughput"]].sum()
+    pd.testing.assert_frame_equal(total[["wip", "throughput"]], per_product, check_dtype=False)
+    assert total.index[-1] == short_run["t_end"]
+    check = littles_law_check(short_run)
+    assert check["wip_mean"] == pytest.approx(_time_average_wip(short_run))
+
+
+def _time_average_wip(result):
+    curve = wip_curve(result)
+    durations = np.diff(np.append(curve["time"], result["t_end"]))
+    return (curve["wip"] * durations).sum() / result["t_end"]
+
+
+def test_stats_only_results_have_no_flow_metrics():
+    result = simulate(animate=False, random_seed=1, run_duration=2 * DAY, stats_only=True)
+    with pytest.raises(ValueError, match="stats_only"):
+        wip_curve(result)
+    with pytest.raises(ValueError, match="stats_only"):
+        log_frame(float("nan"))
@@ -0,0 +1,25 @@
+import pytest
+
+from chem_simulation import BILL_OF_MATERIALS, DAY, simulate
+
+
+@pytest.mark.parametrize("product_type", ["product_1", "product_2"])
+def test_consumption_follows_the_bill_of_materials(short_run, product_type):
+    n_assembled = short_run[f"n_assembled_{product_type}"]
+    assert n_assembled >= short_run[f"finished_batches{product_type}"] > 0
+    parts = BILL_OF_MATERIALS[product_type]["parts"]
+    for material, quantity in parts.items():
+        assert short_run[f"{product_type}_consumed_{material}"] == n_assembled * quantity
+    weight = n_assembled * sum(
+        quantity * BILL_OF_MATERIALS[material]["weight"] for material, quantity in parts.items()
+    )
+    assert short_run[f"{product_type}_consumed_weight"] == pytest.approx(weight)
+
+
+def test_batches_wait_for_stock(monkeypatch):
+    monkeypatch.setitem(BILL_OF_MATERIALS["homofarnesol"], "initial_stock", 3)
+    result = simulate(animate=False, random_seed=1, run_duration=20 * DAY)
+    assert result["n_assembled_product_2"] == 3
+    assert result["product_2_consumed_homofarnesol"] == 3
+    assert result["n_batches_created_product_2"] > 3
+    assert result["n_assembled_product_1"] > 3
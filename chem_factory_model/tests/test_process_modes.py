@@ -0,0 +1,63 @@
+import pytest
+import salabim as sim
+
+from base_library import BasicEntity
+from chem_simulation import DAY, simulate
+
+
+class Mover(BasicEntity):
+    """Moves to (30, 40) at speed 10 and then 10 to the right in 2 time units."""
+
+    def steps(self):
+        yield from self.move_and_hold_steps(30, 40, mode="moving")
+        self.arrived = (self.env.now(), self.mode())
+        yield from self.move_and_hold_steps(40, 40, duration=2)
+
+
+class YieldlessMover(BasicEntity):
+    def process(self):
+        self.move_and_hold(30, 40)
+        self.move_and_hold(40, 40, duration=lambda: 2)
+
+
+class BlockingMoveInGenerator(BasicEntity):
+    def process(self):
+        self.move_and_hold(30, 40)
+        yield self.hold(1)
+
+
+def run(entity_class, yieldless: bool):
+    env = sim.Environment(yieldless=yieldless)
+    env.animate(False)
+    entity = entity_class(x=0, y=0, speed=10)
+    env.run()
+    return env, entity
+
+
+@pytest.mark.parametrize("yieldless", [True, False])
+def test_move_and_hold_steps_in_both_modes(yieldless):
+    env, entity = run(Mover, yieldless)
+    assert entity.arrived == (5, "moving")
+    assert env.now() == 7
+    assert (entity.x, entity.y) == (40, 40)
+    assert env.n_events == 2
+
+
+def test_yieldless_move_and_hold():
+    env, entity = run(YieldlessMover, yieldless=True)
+    assert env.now() == 7
+    assert (entity.x, entity.y) == (40, 40)
+    assert list(entity.anim_rect.rectangle(t=env.now())[:2]) == [40, 40]
+
+
+def test_move_and_hold_in_a_yield_based_process_raises():
+    with pytest.raises(TypeError, match="move_and_hold_steps"):
+        run(BlockingMoveInGenerator, yieldless=False)
+
+
+def test_both_modes_give_the_same_results():
+    kwargs = dict(animate=False, random_seed=1, run_duration=10 * DAY)
+    yieldless, generators = simulate(**kwargs), simulate(**kwargs, yieldless=False)
+    for key, value in yieldless.items():
+        if isinstance(value, (int, float)) and key != "yieldless":
+            assert generators[key] == pytest.approx(value, nan_ok=True), key
@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.request
+
+from progress import SweepProgress, serve_progress
+
+
+def test_counts_failures_events_and_workers(tmp_path):
+    progress = SweepProgress(3, str(tmp_path / "progress.json"))
+    progress.task_done({"msg": "simulation ended", "n_events": 10}, 1.0, worker=1)
+    progress.task_done({"msg": "simulation timed out"}, 2.0, worker=1)
+    progress.task_done(None, 0.5, worker=2)
+    snapshot = progress.snapshot()
+    assert (snapshot["completed"], snapshot["failed"], snapshot["events"]) == (3, 2, 10)
+    assert snapshot["workers"]["1"]["tasks"] == 2
+    assert snapshot["workers"]["1"]["busy_time"] == 3.0
+    assert snapshot["eta_s"] == 0
+
+
+def test_writes_are_throttled_until_the_sweep_ends(tmp_path):
+    path = tmp_path / "progress.json"
+    progress = SweepProgress(3, str(path), min_interval=3600)
+    progress.task_done({"msg": "simulation ended"})
+    assert json.loads(path.read_text())["completed"] == 1
+    progress.task_done({"msg": "simulation ended"})
+    assert json.loads(path.read_text())["completed"] == 1  # within min_interval
+    progress.task_done({"msg": "simulation ended"})
+    assert json.loads(path.read_text())["completed"] == 3  # finished: always written
+
+
+def test_concurrent_task_done_leaves_a_valid_file(tmp_path):
+    path = tmp_path / "progress.json"
+    progress = SweepProgress(400, str(path), min_interval=0)
+
+    def work():
+        for _ in range(100):
+            progress.task_done({"msg": "simulation ended", "n_events": 1})
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = json.loads(path.read_text())
+    assert snapshot["completed"] == snapshot["events"] == 400
+    assert not (tmp_path / "progress.json.tmp").exists()
+
+
+def test_serve_progress():
+    progress = SweepProgress(2, None)
+    progress.task_done({"msg": "simulation ended"})
+    server = serve_progress(progress, port=0)
+    try:
+        host, port = server.server_address
+        with urllib.request.urlopen(f"http://{host}:{port}/") as response:
+            assert json.load(response)["completed"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_run_simulations_reports_every_replication():
+    from sim_runner import run_simulations
+
+    def simulate(animate=False, **params):
+        return {**params, "msg": "simulation ended", "n_events": 5}
+
+    progress = SweepProgress(2, None)
+    run_simulations([{"i": 0}, {"i": 1}], simulate, progress=progress)
+    snapshot = progress.snapshot()
+    assert (snapshot["completed"], snapshot["failed"], snapshot["events"]) == (2, 0, 10)
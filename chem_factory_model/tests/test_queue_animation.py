@@ -0,0 +1,48 @@
+import salabim as sim
+
+from base_library import BasicEntity
+
+
+def queue_with_entity():
+    env = sim.Environment(yieldless=True)
+    queue = sim.Queue("queue", env=env)
+    animate_queue = sim.AnimateQueue(queue, x=0, y=0)
+    return env, queue, animate_queue, BasicEntity(x=0, y=0, env=env)
+
+
+def queue_rectangle(animate_queue, entity):
+    animate_queue.update(animate_queue.env.now())
+    return animate_queue.current_aos[entity][2]
+
+
+def test_objects_are_reused_when_the_entity_reenters():
+    env, queue, animate_queue, entity = queue_with_entity()
+    entity.enter(queue)
+    first = queue_rectangle(animate_queue, entity)
+    entity.leave(queue)
+    animate_queue.update(env.now())
+    assert first.is_removed()
+    entity.enter(queue)
+    assert queue_rectangle(animate_queue, entity) is first
+    assert not first.is_removed()
+
+
+def test_a_color_change_builds_new_objects():
+    env, queue, animate_queue, entity = queue_with_entity()
+    entity.enter(queue)
+    first = queue_rectangle(animate_queue, entity)
+    entity.leave(queue)
+    animate_queue.update(env.now())
+    entity.update_fillcolor("red")
+    entity.enter(queue)
+    second = queue_rectangle(animate_queue, entity)
+    assert second is not first
+    assert second.fillcolor(env.now()) == "red"
+
+
+def test_objects_still_shown_elsewhere_are_not_reused():
+    env, queue, animate_queue, entity = queue_with_entity()
+    entity.enter(queue)
+    shown = queue_rectangle(animate_queue, entity)
+    other = entity.animation_objects(animate_queue.id(env.now()))  # object still in use
+    assert other[2] is not shown
@@ -0,0 +1,53 @@
+import pytest
+import salabim as sim
+
+from chem_simulation import DAY, HOUR, simulate
+from replay import ReplayPlayer, load_recording, replay
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("replay") / "run.json")
+    simulate(animate=False, random_seed=1, run_duration=10 * DAY, animation_recording=path)
+    return load_recording(path)
+
+
+def test_recording_contents(recording):
+    assert len(recording["stations"]) == 9
+    assert all("label" in station and "x" in station for station in recording["stations"])
+    assert recording["queues"]
+    times = [event[0] for event in recording["events"]]
+    assert times == sorted(times)
+    kinds = {event[1] for event in recording["events"]}
+    assert {"create", "move", "fillcolor", "visible", "queue", "label", "end"} <= kinds
+
+
+def test_recording_is_reproducible(recording, tmp_path):
+    path = str(tmp_path / "again.json")
+    simulate(animate=False, random_seed=1, run_duration=10 * DAY, animation_recording=path)
+    assert load_recording(path) == recording
+
+
+def test_player_ends_in_the_recorded_state(recording):
+    env = sim.Environment(yieldless=True)
+    env.animate(False)
+    player = ReplayPlayer(recording=recording, env=env)
+    env.run()
+    events = recording["events"]
+    created = sum(1 for event in events if event[1] == "create")
+    ended = sum(1 for event in events if event[1] == "end")
+    assert len(player.entities) == created - ended
+    last_contents = {}
+    for _, kind, index, *args in events:
+        if kind == "queue":
+            last_contents[index] = args[0]
+    ids = {entity: eid for eid, entity in player.entities.items()}
+    for qid, contents in last_contents.items():
+        assert [ids[entity] for entity in player.queues[qid]] == contents
+
+
+def test_replay_renders_frames_from_any_start(recording, tmp_path):
+    till = recording["events"][-1][0]
+    env = replay(recording, start=till - HOUR, till=till, video=str(tmp_path / "f*.png"), video_fps=2)
+    assert env.now() == till
+    assert len(list(tmp_path.glob("f*.png"))) >= 1
@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from reporting import (
+    is_kpi,
+    kpi_minimize,
+    paired_differences,
+    rank_scenarios,
+    scenario_summary,
+    summary_table,
+    t_quantile,
+)
+
+
+@pytest.mark.parametrize(
+    "p, df, expected",
+    [
+        (0.975, 1, 12.7062),
+        (0.975, 2, 4.3027),
+        (0.975, 5, 2.5706),
+        (0.975, 10, 2.2281),
+        (0.975, 30, 2.0423),
+        (0.995, 4, 4.6041),
+        (0.9, 3, 1.6377),
+        (0.975, math.inf, 1.9600),
+    ],
+)
+def test_t_quantile_matches_tables(p, df, expected):
+    assert t_quantile(p, df) == pytest.approx(expected, abs=1e-4)
+
+
+def test_t_quantile_is_vectorized():
+    quantiles = t_quantile(0.975, pd.Series([5, 1, 5, 0]))
+    assert quantiles.shape == (4,)
+    assert quantiles[0] == quantiles[2] == pytest.approx(2.5706, abs=1e-4)
+    assert math.isnan(quantiles[3])
+
+
+def test_kpi_directions():
+    assert kpi_minimize("server_reaction_waiting_time_mean") is True
+    assert kpi_minimize("finished_batchesproduct_1") is False
+    assert kpi_minimize("server_reaction_occupancy") is None
+    assert not is_kpi("rate_multiplier")
+
+
+@pytest.fixture
+def results():
+    # scenario 2 is clearly worse, scenario 3 equal to 1 up to noise; replications share seeds
+    rng = np.random.default_rng(0)
+    common = rng.normal(10, 3, size=8)
+    rows = []
+    for scenario, shift in ((1, 0.0), (2, 5.0), (3, 0.0)):
+        noise = rng.normal(0, 0.1, size=8)
+        for n in range(8):
+            rows.append(
+                {
+                    "scenario": scenario,
+                    "replication_nr": n,
+                    "x_waiting_time_mean": common[n] + shift + noise[n],
+                    "rate_multiplier": 1.0,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def test_scenario_summary(results):
+    summary = scenario_summary(results)
+    assert list(summary.index.get_level_values("column").unique()) == ["x_waiting_time_mean"]
+    row = summary.loc[("x_waiting_time_mean", 1)]
+    values = results.loc[results["scenario"] == 1, "x_waiting_time_mean"]
+    assert row["n"] == 8
+    assert row["mean"] == pytest.approx(values.mean())
+    assert row["half_width"] == pytest.approx(
+        t_quantile(0.975, 7) * values.std() / math.sqrt(8)
+    )
+
+
+def test_paired_differences_use_common_seeds(results):
+    differences = paired_differences(results, "x_waiting_time_mean").loc["x_waiting_time_mean"]
+    assert list(differences.index) == [2, 3]
+    assert differences.loc[2, "mean"] == pytest.approx(5, abs=0.2)
+    assert differences.loc[2, "significant"]
+    # the paired interval is much narrower than the spread between replications
+    assert differences.loc[2, "half_width"] < 0.5
+
+
+def test_rank_scenarios(results):
+    ranking = rank_scenarios(results, "x_waiting_time_mean")
+    assert ranking.loc[2, "rank"] == 3
+    assert ranking.loc[2, "diff_to_best"] > 0
+    assert not ranking.loc[2, "best_set"]
+    assert ranking.loc[1, "best_set"] and ranking.loc[3, "best_set"]
+    flipped = rank_scenarios(results, "x_waiting_time_mean", minimize=False)
+    assert flipped.index[0] == 2 and flipped["best_set"].sum() == 1
+
+
+def test_rank_needs_a_direction(results):
+    with pytest.raises(ValueError, match="pass minimize"):
+        rank_scenarios(results, "rate_multiplier")
+
+
+def test_summary_table(results):
+    table = summary_table(results)
+    assert list(table.columns) == [
+        "n",
+        "mean",
+        "ci_low",
+        "ci_high",
+        "diff_mean",
+        "diff_ci_low",
+        "diff_ci_high",
+        "diff_significant",
+        "rank",
+        "best_set",
+    ]
+    assert table.loc[("x_waiting_time_mean", 2), "rank"] == 3
+    assert pd.isna(table.loc[("x_waiting_time_mean", 1), "diff_mean"])
+    unranked = summary_table(results, "rate_multiplier")
+    assert unranked["rank"].isna().all()
@@ -0,0 +1,44 @@
+from sim_runner import JsonlResultWriter, read_results_jsonl, run_simulations
+from timeseries import CompressedTimeSeries
+
+
+def fake_simulate(animate=False, **params):
+    series = CompressedTimeSeries.from_samples([(0, 1), (1, 1), (2, 3)])
+    return {**params, "msg": "simulation ended", "log": [{"t": 1}], "series": series}
+
+
+def test_sink_keeps_summary_columns_only(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with JsonlResultWriter(path) as sink:
+        results = run_simulations([{"i": 0}, {"i": 1}], fake_simulate, sink=sink)
+    assert list(results.columns) == ["i", "msg"]
+    assert sink.n_written == 2
+
+
+def test_read_back_full_results(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with JsonlResultWriter(path) as sink:
+        run_simulations([{"i": 0}, {"i": 1}], fake_simulate, sink=sink)
+    results = read_results_jsonl(path)
+    assert results["i"].tolist() == [0, 1]
+    assert results["log"][0] == [{"t": 1}]
+    assert results["series"][1] == fake_simulate()["series"]
+    assert list(read_results_jsonl(path, summary_only=True).columns) == ["i", "msg"]
+
+
+def test_incomplete_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with JsonlResultWriter(path) as sink:
+        sink.append(fake_simulate(i=0))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"i": 1, "msg": "simul')  # sweep still writing
+    assert read_results_jsonl(path)["i"].tolist() == [0]
+
+
+def test_real_result_round_trip(tmp_path, short_run):
+    path = str(tmp_path / "results.jsonl")
+    with JsonlResultWriter(path) as sink:
+        summary = sink.append(short_run)
+    row = read_results_jsonl(path).iloc[0]
+    assert row["queue_reaction_length"] == short_run["queue_reaction_length"]
+    assert row["n_events"] == summary["n_events"] == short_run["n_events"]
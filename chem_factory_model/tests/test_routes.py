@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+from chem_simulation import PRODUCT_ROUTES, Batch, compile_routes
+
+
+def fake_env():
+    """Stand-ins for the attributes that simulate() sets on the environment."""
+    names = {name for route in PRODUCT_ROUTES.values() for _, *step in route for name in step}
+    env = SimpleNamespace(**{name: name for name in names})
+    env.batch_queue_reaction = {product_type: f"queue {product_type}" for product_type in PRODUCT_ROUTES}
+    return env
+
+
+def test_routes_are_resolved_per_product_type():
+    routes = compile_routes(fake_env())
+    assert set(routes) == set(PRODUCT_ROUTES)
+    assert routes["product_1"][0] == (
+        Batch.collect_batches,
+        ("queue product_1", "n_batches_product1"),
+    )
+    assert routes["product_2"][0][1][0] == "queue product_2"
+    assert Batch.diminish_batchgroup not in [step for step, _ in routes["product_2"]]
+    assert routes["product_1"][-1] == (
+        Batch.subprocess,
+        ("server_packaging", "server_packaging_product1_pt"),
+    )
+
+
+def test_every_step_kind_maps_to_a_batch_method():
+    routes = compile_routes(fake_env())
+    kinds = {
+        "collect": Batch.collect_batches,
+        "move": Batch.move_to,
+        "reaction": Batch.subprocess_reaction,
+        "diminish": Batch.diminish_batchgroup,
+        "process": Batch.subprocess,
+    }
+    for product_type, route in PRODUCT_ROUTES.items():
+        assert [kinds[kind] for kind, *_ in route] == [step for step, _ in routes[product_type]]
+
+
+def test_unknown_step_is_rejected():
+    with pytest.raises(ValueError, match="Unknown route step"):
+        compile_routes(fake_env(), {"product_1": [("teleport", "server_reaction")]})
+
+
+def test_both_products_complete_their_route(short_run):
+    assert short_run["finished_batchesproduct_1"] > 0
+    assert short_run["finished_batchesproduct_2"] > 0
+    assert short_run["distillation_batches_processed"] > 0
+    assert short_run["server_crystallization_batches_processed"] > 0
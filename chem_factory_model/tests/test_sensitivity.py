@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sensitivity import (
+    morris_analysis,
+    morris_design,
+    morris_indices,
+    ordered_triangular,
+    scale,
+    sobol_analysis,
+    sobol_design,
+    sobol_indices,
+)
+
+
+def linear(a=0.0, b=0.0, c=0, animate=False, random_seed=0):
+    """Cheap stand-in for simulate: y = 3a + b, c has no effect."""
+    return {"y": 3 * a + b, "t_end": 48, "finished_batchesproduct_1": 4 * a}
+
+
+def test_scale():
+    unit = np.array([[0.0, 0.0], [0.5, 0.5], [1.0, 1.0]])
+    design = scale(unit, {"x": (2, 4), "n": (1, 3, int)})
+    assert design["x"].tolist() == [2, 3, 4]
+    assert design["n"].tolist() == [1, 2, 3]
+
+
+def test_ordered_triangular():
+    defaults = {"s_pt_low": 1, "s_pt_mode": 2, "s_pt_high": 3}
+    assert ordered_triangular({"s_pt_low": 5}, defaults) == {"s_pt_low": 2, "s_pt_mode": 3, "s_pt_high": 5}
+    assert ordered_triangular({"other": 1}, defaults) == {"other": 1}
+
+
+def test_morris_design_moves_one_parameter_per_step():
+    points = morris_design(3, n_trajectories=5, seed=1).reshape(5, 4, 3)
+    steps = np.diff(points, axis=1)
+    assert ((steps != 0).sum(axis=2) == 1).all()
+    assert np.allclose(np.abs(steps[steps != 0]), 4 / 6)
+    assert ((points >= 0) & (points <= 1)).all()
+
+
+def test_morris_indices_of_a_linear_function():
+    unit = morris_design(3, n_trajectories=8, seed=2)
+    indices = morris_indices(unit, unit @ np.array([3.0, -1.0, 0.0]), 3)
+    assert indices["mu"].tolist() == pytest.approx([3, -1, 0])
+    assert indices["mu_star"].tolist() == pytest.approx([3, 1, 0])
+    assert indices["sigma"].tolist() == pytest.approx([0, 0, 0], abs=1e-12)
+
+
+def test_sobol_indices_of_a_linear_function():
+    k, n = 3, 4096
+    unit = sobol_design(k, n, seed=3)
+    assert unit.shape == (n * (k + 2), k)
+    indices = sobol_indices(unit @ np.array([3.0, 1.0, 0.0]), k, seed=3)
+    assert indices["S1"].tolist() == pytest.approx([0.9, 0.1, 0], abs=0.05)
+    assert indices["ST"].tolist() == pytest.approx([0.9, 0.1, 0], abs=0.05)
+    assert (np.abs(indices["S1"] - [0.9, 0.1, 0]) <= indices["S1_conf"]).all()
+    assert indices.loc[2, "S1_conf"] == 0
+
+
+def test_constant_output_has_no_sensitivity():
+    indices = sobol_indices(np.ones(5 * 10), 3)
+    assert (indices[["S1", "ST"]] == 0).all().all()
+
+
+def test_morris_analysis_ranks_per_output():
+    ranges = {"a": (0, 1), "b": (0, 1), "c": (1, 3, int)}
+    table = morris_analysis(linear, ranges, outputs=("y", "throughput_per_day"), seed=0)
+    assert table.index.names == ["output", "parameter"]
+    assert table.loc["y"].index.tolist()[:2] == ["a", "b"]
+    assert table.loc[("y", "c"), "mu_star"] == 0
+    assert table.loc[("throughput_per_day", "a"), "mu"] == pytest.approx(2)
+
+
+def test_sobol_analysis():
+    table = sobol_analysis(linear, {"a": (0, 1), "b": (0, 1)}, n=512, outputs=("y",), seed=0)
+    assert table.loc["y"].index.tolist() == ["a", "b"]
+    assert table.loc["y", "rank"].tolist() == [1, 2]
+    assert isinstance(table, pd.DataFrame)
@@ -0,0 +1,115 @@
+import gc
+import math
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from chem_simulation import DAY, simulate
+from shared_outputs import (
+    SharedTable,
+    SharedTimeSeries,
+    release_outputs,
+    share_outputs,
+    time_series_table,
+)
+from sim_runner import run_simulations, shutdown_worker_pool
+from timeseries import CompressedTimeSeries
+
+RECORDS = [
+    {"type": "product_1", "t_entered_system": 0.5, "t_left_system": 4.0},
+    {"type": None, "t_entered_system": 1.0, "t_left_system": None},
+    {"type": "product_2", "t_entered_system": 2.0},
+]
+SAMPLES = [(0.0, 0), (1.0, 0), (2.0, 3), (3.0, 3), (5.0, 1)]
+
+
+def received(handle):
+    """The handle as the parent receives it from a worker."""
+    return pickle.loads(pickle.dumps(handle))
+
+
+def test_table_round_trip(tmp_path):
+    table = SharedTable.write(RECORDS, str(tmp_path))
+    assert len(table) == 3
+    records = table.to_records()
+    assert [record["type"] for record in records] == ["product_1", None, "product_2"]
+    assert records[0]["t_left_system"] == 4.0
+    assert math.isnan(records[1]["t_left_system"]) and math.isnan(records[2]["t_left_system"])
+    frame = table.to_frame()
+    assert frame["type"].cat.categories.tolist() == ["product_1", "product_2"]
+    assert frame["t_entered_system"].tolist() == [0.5, 1.0, 2.0]
+    assert received(table).to_records()[0] == records[0]
+
+
+def test_time_series_round_trip(tmp_path):
+    series = CompressedTimeSeries.from_samples(SAMPLES)
+    shared = received(SharedTimeSeries.write(series, str(tmp_path)))
+    assert shared.to_timeseries() == series
+    for decoded, expected in zip(shared.decode(), series.decode()):
+        np.testing.assert_array_equal(decoded, expected)
+
+
+def test_only_received_handles_own_their_files(tmp_path):
+    table = SharedTable.write(RECORDS, str(tmp_path))
+    handle = received(table)
+    files = table.files()
+    del table
+    gc.collect()
+    assert all(os.path.exists(path) for path in files)  # the worker's handle does not remove them
+    frame = handle.to_frame()
+    del handle
+    gc.collect()
+    assert not any(os.path.exists(path) for path in files)
+    assert frame["t_entered_system"].tolist() == [0.5, 1.0, 2.0]  # mapped data stays valid
+
+
+def test_unlink(tmp_path):
+    written = SharedTimeSeries.write(CompressedTimeSeries.from_samples(SAMPLES), str(tmp_path))
+    written.unlink()
+    assert not os.listdir(tmp_path)
+    series = CompressedTimeSeries.from_samples(SAMPLES)
+    handle = received(SharedTimeSeries.write(series, str(tmp_path)))
+    handle.unlink()
+    handle.unlink()  # twice is fine
+    assert not os.listdir(tmp_path)
+
+
+def test_share_outputs(tmp_path):
+    result = simulate(animate=False, random_seed=1, run_duration=5 * DAY)
+    shared = share_outputs(result, str(tmp_path))
+    assert isinstance(shared["df_log_batches_entered"], SharedTable)
+    assert isinstance(shared["queue_reaction_length"], SharedTimeSeries)
+    assert shared["df_log_batches_entered"].to_records() == result["df_log_batches_entered"]
+    assert shared["n_events"] == result["n_events"]
+    release_outputs([shared])
+    assert not os.listdir(tmp_path)
+
+
+def test_sweep_with_shared_outputs(tmp_path):
+    params = [
+        {"scenario": 1, "replication_nr": n, "random_seed": 2 * n + 1, "run_duration": 20 * DAY}
+        for n in range(2)
+    ]
+    try:
+        results = run_simulations(params, simulate, workers=2, shared_outputs=str(tmp_path))
+    finally:
+        shutdown_worker_pool(2)
+    assert all(isinstance(log, SharedTable) for log in results["df_log_batches_entered"])
+    assert len(os.listdir(tmp_path)) > 0
+    table = time_series_table(results)
+    assert table["replication_nr"].unique().tolist() == [0, 1]
+    assert len(table) == sum(len(ts.to_timeseries()) for ts in results["queue_reaction_length"])
+    release_outputs(results)
+    assert not os.listdir(tmp_path)
+    del results
+    gc.collect()  # the finalizers of released handles do nothing
+
+
+def test_released_handles_cannot_be_read(tmp_path):
+    handle = received(SharedTable.write(RECORDS, str(tmp_path)))
+    release_outputs([{"log": handle, "n": 1}])
+    assert not os.listdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        handle.to_frame()
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import salabim as sim
+
+from chem_simulation import DAY, simulate
+from stability import InstabilityDetector, mann_kendall_z
+
+
+def test_mann_kendall_z():
+    assert mann_kendall_z([1, 2, 3, 4, 5]) == pytest.approx(9 / np.sqrt(50 / 3))
+    assert mann_kendall_z([5, 4, 3, 2, 1]) == pytest.approx(-9 / np.sqrt(50 / 3))
+    assert mann_kendall_z([3, 3, 3, 3]) == 0
+    assert mann_kendall_z([1, 2]) == 0
+
+
+def test_mann_kendall_ties_reduce_the_variance():
+    # S = 9, variance without ties 50 / 3, with a pair of ties 50 / 3 - 2 * 1 * 9 / 18
+    assert mann_kendall_z([1, 2, 2, 3, 4]) == pytest.approx(8 / np.sqrt(50 / 3 - 1))
+
+
+def test_noise_has_no_trend():
+    rng = np.random.default_rng(0)
+    z = [mann_kendall_z(rng.normal(size=30)) for _ in range(200)]
+    assert np.mean(np.abs(z) >= 2.5) < 0.05
+
+
+def detect(level, till=1000):
+    env = sim.Environment(yieldless=True)
+    env.animate(False)
+    detector = InstabilityDetector(level=lambda: level(env), interval=1, window=60, n_blocks=6)
+    env.run(till=till)
+    return env, detector
+
+
+def test_growing_level_stops_the_run():
+    env, detector = detect(lambda env: env.now())
+    # two windows of 60 samples are needed before the first test
+    assert detector.detected_at == 120
+    assert env.now() == 120
+
+
+def test_single_rising_window_is_not_enough():
+    rng = np.random.default_rng(1)
+    # fills up in the first window, then fluctuates around a level
+    env, detector = detect(lambda env: min(env.now(), 60) + rng.normal())
+    assert detector.detected_at is None
+    assert env.now() == 1000
+
+
+def test_simulate_stops_an_overloaded_run():
+    overloaded = simulate(animate=False, random_seed=1, run_duration=400 * DAY, stop_unstable=True)
+    assert overloaded["unstable"]
+    assert overloaded["t_end"] == overloaded["unstable_at"] < 400 * DAY
+    stable = simulate(
+        animate=False, random_seed=1, run_duration=200 * DAY, rate_multiplier=0.2, stop_unstable=True
+    )
+    assert not stable["unstable"] and stable["unstable_at"] is None
+    assert stable["t_end"] == 200 * DAY
@@ -0,0 +1,56 @@
+import salabim as sim
+
+from base_library import QueueStation, ResourceStation
+
+
+def counting_station(env):
+    station = ResourceStation(name="server", capacity=2, env=env)
+    calls = []
+    label = station.label
+
+    def counted_label():
+        calls.append(env.now())
+        return label()
+
+    station.label = counted_label
+    return station, calls
+
+
+def test_label_is_recomputed_only_after_a_state_change():
+    env = sim.Environment(blind_animation=True, yieldless=True)
+    env.animate(True)
+    station, calls = counting_station(env)
+    first = station.label_text()
+    assert station.label_text() == first
+    assert len(calls) == 1
+
+    class User(sim.Component):
+        def process(self):
+            self.request(station)
+            self.hold(1)
+
+    User(env=env)
+    env.run(0.5)
+    assert station.label_text().startswith("cap: 1/2")
+    assert len(calls) == 2
+    env.run(2)
+    assert station.label_text() == "cap: 0/2\nqueue: 0\ndone: 1"  # released when the process ended
+
+
+def test_headless_labels_are_not_cached():
+    env = sim.Environment(yieldless=True)
+    env.animate(False)
+    station, calls = counting_station(env)
+    station.label_text()
+    station.label_text()
+    assert len(calls) == 2
+    assert not station.label_monitors[0]._stats_only  # monitors untouched
+
+
+def test_queue_station_label_follows_arrivals():
+    env = sim.Environment(blind_animation=True, yieldless=True)
+    env.animate(True)
+    station = QueueStation(name="queue", env=env)
+    assert station.label_text() == "count: 0\nqueue: 0"
+    sim.Component(env=env).enter(station)
+    assert station.label_text() == "count: 1\nqueue: 1"
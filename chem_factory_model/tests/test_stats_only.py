@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import salabim as sim
+
+from base_library import QuantileSketch, on_tally, stats_only_monitors
+from chem_simulation import DAY, simulate
+
+WAITING_TIMES = (
+    "server_reaction_waiting_time_mean",
+    "distillation_waiting_time_mean",
+    "server_packaging_waiting_time_mean",
+)
+
+
+def test_sketch_is_exact_for_the_first_five_values():
+    sketch = QuantileSketch((0.5, 0.9))
+    assert np.isnan(sketch.quantile(0.5))
+    for value in (4, 1, 3):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == np.quantile([4, 1, 3], 0.5)
+    assert sketch.quantile(0.9) == pytest.approx(np.quantile([4, 1, 3], 0.9))
+
+
+@pytest.mark.parametrize("p", [0.5, 0.9, 0.99])
+def test_sketch_estimates_quantiles(p):
+    values = np.random.default_rng(1).exponential(2, size=20_000)
+    sketch = QuantileSketch((0.5, 0.9, 0.99))
+    for value in values.tolist():
+        sketch.add(value)
+    assert sketch.n == len(values)
+    assert sketch.quantiles()[p] == pytest.approx(np.quantile(values, p), rel=0.03)
+
+
+def test_sketch_attached_to_a_monitor():
+    sim.Environment(yieldless=True)
+    monitor = sim.Monitor("waiting", stats_only=True)
+    sketch = QuantileSketch.attach(monitor, (0.5,))
+    seen = []
+    on_tally(monitor, seen.append)
+    for value in range(1, 8):
+        monitor.tally(value)
+    assert sketch.n == 7 and seen == list(range(1, 8))
+    assert monitor.mean() == 4
+    assert 1 <= sketch.quantile(0.5) <= 7
+
+
+def test_stats_only_monitors():
+    env = sim.Environment(yieldless=True)
+    resource = sim.Resource("machine")
+    component = sim.Component("worker")
+    queue = sim.Queue("waiting")
+    stats_only_monitors(resource, component, queue)
+    assert resource.occupancy.stats_only()
+    assert resource.requesters().length_of_stay.stats_only()
+    assert not component.status.monitor() and not component.mode.monitor()
+    assert queue.length.stats_only() and not queue.available_quantity.monitor()
+    env.run(1)
+    assert component.status() == sim.data
+
+
+def test_stats_only_run_keeps_the_kpis():
+    kwargs = dict(animate=False, random_seed=1, run_duration=20 * DAY)
+    full, lean = simulate(**kwargs), simulate(**kwargs, stats_only=True)
+    assert lean["n_events"] == full["n_events"]
+    for key in WAITING_TIMES + ("finished_batchesproduct_1", "server_reaction_occupancy"):
+        assert lean[key] == pytest.approx(full[key])
+
+
+def test_quantiles_do_not_change_the_run(short_run):
+    with_quantiles = simulate(
+        animate=False, random_seed=1, run_duration=20 * DAY, waiting_time_quantiles=(0.5, 0.9)
+    )
+    for key in WAITING_TIMES:
+        assert with_quantiles[key] == short_run[key]
+    assert with_quantiles["distillation_waiting_time_p90"] >= with_quantiles["distillation_waiting_time_p50"]
+    assert "distillation_waiting_time_p90" not in short_run
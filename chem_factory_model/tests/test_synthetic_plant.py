@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from chem_simulation import DAY, simulate
+from synthetic_plant import benchmark, process_mode_benchmark, scaling_benchmark, scaling_exponent
+
+SMALL = dict(run_duration=50, n_lines=2, n_stages=3, n_products=2)
+
+
+def test_benchmark_of_a_small_plant():
+    stats = benchmark(**SMALL)
+    assert stats["n_stations"] == 3 * (1 + 2)
+    assert stats["events"] > 0 and stats["completed"] > 0
+    assert stats["peak_memory_mb"] > 0
+    assert stats["n_lines"] == 2
+
+
+def test_benchmark_is_reproducible_in_both_process_modes():
+    runs = [benchmark(**SMALL, trace_memory=False, yieldless=mode) for mode in (True, True, False)]
+    assert len({(stats["events"], stats["completed"], stats["max_wip"]) for stats in runs}) == 1
+    assert "peak_memory_mb" not in runs[0]
+
+
+def test_initial_wip():
+    stats = benchmark(run_duration=1, trace_memory=False, initial_wip=500, utilization=0.1)
+    assert stats["max_wip"] >= 500
+
+
+def test_scaling_benchmark_and_exponent():
+    results = scaling_benchmark("n_lines", (1, 2, 4), run_duration=50, trace_memory=False)
+    assert results["n_lines"].tolist() == [1, 2, 4]
+    assert scaling_exponent(results, "n_lines", "events") == pytest.approx(1, abs=0.25)
+    quadratic = pd.DataFrame({"x": [1, 2, 4, 8], "y": [3, 12, 48, 192]})
+    assert scaling_exponent(quadratic, "x", "y") == pytest.approx(2)
+
+
+def test_process_mode_benchmark():
+    results = process_mode_benchmark(
+        simulate, {"animate": False, "random_seed": 1, "run_duration": 2 * DAY}, repeats=1, **SMALL
+    )
+    assert results[["model", "yieldless"]].values.tolist() == [
+        ["simulate", False],
+        ["simulate", True],
+        ["synthetic_plant", False],
+        ["synthetic_plant", True],
+    ]
+    for _, model in results.groupby("model"):
+        assert model["events"].nunique() == 1
+    assert (results["events_per_s"] > 0).all()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from timeseries import CompressedTimeSeries, timeseries_to_frame
+
+
+SAMPLES = [(0.0, 0), (1.0, 0), (2.0, 0), (3.0, 2), (4.0, 2), (6.0, 2), (7.0, 1)]
+
+
+def test_round_trip_is_lossless():
+    ts = CompressedTimeSeries.from_samples(SAMPLES)
+    assert ts.to_list() == SAMPLES
+    assert len(ts) == len(SAMPLES)
+
+
+def test_runs_break_on_value_change_and_off_grid_sample():
+    ts = CompressedTimeSeries.from_samples(SAMPLES)
+    # 0 x3, 2 x2, 2 at 6.0 (the sample at 5.0 is missing), 1
+    assert ts.n_runs() == 4
+    assert ts.counts.tolist() == [3, 2, 1, 1]
+
+
+def test_literal_and_string_round_trip():
+    ts = CompressedTimeSeries.from_samples(SAMPLES, interval=1)
+    assert CompressedTimeSeries.from_literal(ts.to_literal()) == ts
+    assert CompressedTimeSeries.from_literal(str(ts)) == ts
+
+
+def test_timeseries_to_frame_accepts_every_stored_form():
+    ts = CompressedTimeSeries.from_samples(SAMPLES)
+    for stored in (ts, ts.to_literal(), str(ts), SAMPLES):
+        frame = timeseries_to_frame(stored)
+        np.testing.assert_array_equal(frame["value"], [v for _, v in SAMPLES])
+
+
+def test_queue_monitor_samples_every_hour(short_run):
+    ts = short_run["queue_reaction_length"]
+    times, values = ts.decode()
+    np.testing.assert_array_equal(np.diff(times), 1.0)
+    assert ts.n_runs() <= len(ts)
+    assert (values >= 0).all()
@@ -0,0 +1,40 @@
+import salabim as sim
+from PIL import Image, ImageChops
+
+from base_library import render_static
+from chem_simulation import HOUR, simulate
+
+
+def test_render_static_keeps_the_picture(tmp_path):
+    env = sim.Environment(blind_animation=True)
+    env.animation_parameters(animate=True, width=300, height=200)
+    static = [
+        sim.AnimateRectangle(spec=(10, 10, 100, 100), fillcolor="chocolate", text="station"),
+        sim.AnimateRectangle(spec=(150, 10, 250, 100), fillcolor="red"),
+    ]
+    dynamic = sim.AnimateCircle(radius=20, x=lambda t: 50 + t, y=150, fillcolor="blue")
+    env.snapshot(str(tmp_path / "before.png"))
+
+    image = render_static(static, env=env)
+
+    assert isinstance(image, sim.AnimateImage)
+    assert all(ao.is_removed() for ao in static)
+    assert not dynamic.is_removed()
+    env.snapshot(str(tmp_path / "after.png"))
+    with Image.open(tmp_path / "before.png") as before, Image.open(tmp_path / "after.png") as after:
+        assert ImageChops.difference(before.convert("RGB"), after.convert("RGB")).getbbox() is None
+
+
+def test_simulate_writes_frames_headless(tmp_path):
+    result = simulate(
+        animate=False,
+        random_seed=1,
+        run_duration=4 * HOUR,
+        video=str(tmp_path / "frame*.png"),
+        video_fps=2,
+    )
+    frames = sorted(tmp_path.glob("frame*.png"))
+    assert result["msg"] == "simulation ended"
+    assert len(frames) >= 4  # 4 hours at 2 simulated hours per video second and 2 fps
+    with Image.open(frames[-1]) as frame:
+        assert frame.getbbox() is not None
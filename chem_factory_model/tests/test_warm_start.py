@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from chem_simulation import DAY, check_forkable, simulate
+from warm_start import fork_continuations
+
+PARAMS = dict(animate=False, random_seed=1, run_duration=20 * DAY)
+KPIS = ("n_events", "finished_batchesproduct_1", "server_evaluation_queue_length_mean")
+
+
+def test_forkable_parameters():
+    check_forkable({"server_packaging_capacity": 2, "n_batches_distillation": 3})
+    check_forkable({"server_distillation_pt_high": 5})
+    for key in ("rate_multiplier", "random_seed", "unknown_pt_low"):
+        with pytest.raises(ValueError, match=key):
+            check_forkable({key: 1})
+
+
+def test_variants_are_checked_before_the_run():
+    def never(**params):
+        raise AssertionError("simulate should not be called")
+
+    with pytest.raises(ValueError):
+        fork_continuations(never, PARAMS, 5 * DAY, [{}, {"rate_multiplier": 2}])
+    assert fork_continuations(never, PARAMS, 5 * DAY, []) == []
+
+
+def test_continuations_match_straight_runs(short_run):
+    variant = {"server_evaluation_capacity": 0}  # evaluation stops after the warm-up
+    unchanged, changed = fork_continuations(simulate, PARAMS, 5 * DAY, [{}, variant], max_parallel=1)
+    for key in KPIS:
+        assert unchanged[key] == short_run[key]
+    sequential = simulate(**PARAMS, fork_at=5 * DAY, fork=lambda env: variant)
+    for key in KPIS:
+        assert changed[key] == sequential[key]
+    assert changed["server_evaluation_capacity"] == 0
+    assert unchanged["server_evaluation_queue_length_mean"] == 0
+    assert changed["server_evaluation_queue_length_mean"] > 0
+
+
+def test_a_dying_continuation_is_reported():
+    def dying(fork_at, fork, **params):
+        def die_in_child(env):
+            variant = fork(env)
+            if variant:  # only the first variant runs in a child
+                os._exit(1)
+            return variant
+
+        return simulate(**params, fork_at=fork_at, fork=die_in_child)
+
+    with pytest.raises(RuntimeError, match="died"):
+        fork_continuations(dying, PARAMS, 5 * DAY, [{"server_packaging_capacity": 2}, {}])
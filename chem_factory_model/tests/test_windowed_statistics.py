@@ -0,0 +1,80 @@
+import math
+
+import pandas as pd
+import pytest
+import salabim as sim
+
+from base_library import WindowedStatistics, resource_window_statistics, window_report
+from chem_simulation import DAY, simulate
+
+
+class Tallier(sim.Component):
+    """Tallies the (time, value) pairs into the monitor."""
+
+    def setup(self, monitor, values):
+        self.monitor = monitor
+        self.values = values
+
+    def process(self):
+        for t, value in self.values:
+            self.hold(till=t)
+            self.monitor.tally(value)
+
+
+def run(level: bool, values, till: float = 25):
+    env = sim.Environment(yieldless=True)
+    env.animate(False)
+    monitor = sim.Monitor("m", level=level, initial_tally=0 if level else None)
+    statistics = WindowedStatistics.attach(monitor, window=10)
+    Tallier(monitor=monitor, values=values)
+    env.run(till=till)
+    return statistics
+
+
+def test_level_monitor_is_time_weighted_per_window():
+    statistics = run(level=True, values=[(2, 4), (13, 1)])
+    rows = statistics.rows()
+    assert list(rows) == [0, 1, 2]
+    assert rows[0] == {"mean": pytest.approx(3.2), "max": 4}
+    assert rows[1] == {"mean": pytest.approx(1.9), "max": 4}
+    assert rows[2] == {"mean": 1, "max": 1}
+
+
+def test_other_monitors_aggregate_the_tallied_values():
+    statistics = run(level=False, values=[(1, 1), (5, 3), (15, 10)])
+    assert statistics.rows() == {0: {"mean": 2, "max": 3, "n": 2}, 1: {"mean": 10, "max": 10, "n": 1}}
+
+
+def test_window_report_fills_empty_windows():
+    env = sim.Environment(yieldless=True)
+    env.animate(False)
+    resource = sim.Resource("machine")
+    statistics = resource_window_statistics(resource, window=10)
+
+    class User(sim.Component):
+        def process(self):
+            self.request(resource)
+            self.hold(5)
+
+    User()
+    User()
+    env.run(till=25)
+    report = window_report(statistics)
+    assert [(row["window_start"], row["window_end"]) for row in report] == [(0, 10), (10, 20), (20, 30)]
+    first, second, third = report
+    assert first["utilization_mean"] == pytest.approx(1)
+    assert first["queue_length_max"] == 1
+    assert first["waiting_time_n"] == 2 and first["waiting_time_max"] == 5
+    assert second["utilization_mean"] == 0 and second["waiting_time_n"] == 0
+    assert math.isnan(second["waiting_time_mean"])
+    assert third["utilization_mean"] == 0
+    assert window_report({}) == []
+
+
+def test_station_report_of_a_run():
+    result = simulate(animate=False, random_seed=1, run_duration=10 * DAY, report_window=DAY)
+    report = pd.DataFrame(result["window_report"])
+    reaction = report[report["station"] == "ReactionServer"]
+    assert len(reaction) == 10
+    assert reaction["utilization_mean"].mean() == pytest.approx(result["server_reaction_occupancy"])
+    assert simulate(animate=False, random_seed=1, run_duration=DAY)["window_report"] is None
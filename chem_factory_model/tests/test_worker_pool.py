@@ -0,0 +1,68 @@
+import os
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from sim_runner import _pools, run_simulations, shutdown_worker_pool, worker_pool
+
+
+def fake_simulate(animate=False, crash=False, **params):
+    """Module level, so that worker processes can unpickle it."""
+    if crash:
+        os._exit(1)
+    return {**params, "pid": os.getpid(), "msg": "simulation ended"}
+
+
+def preloaded(module: str) -> bool:
+    return module in sys.modules
+
+
+@pytest.fixture(autouse=True)
+def no_pools_left():
+    yield
+    shutdown_worker_pool()
+    assert not _pools
+
+
+def sweep(n: int, workers: int = 2):
+    return run_simulations([{"n": i} for i in range(n)], fake_simulate, workers=workers)
+
+
+def test_one_pool_per_size():
+    pool = worker_pool(2)
+    assert worker_pool(2) is pool
+    other = worker_pool(1)
+    assert other is not pool
+    shutdown_worker_pool(1)
+    assert list(_pools) == [2] and worker_pool(2) is pool
+
+
+def test_workers_import_the_preload_modules():
+    assert "wave" not in sys.modules  # workers are forked, so the module must not be in the parent
+    pool = worker_pool(1, preload=("wave",))
+    assert pool.submit(preloaded, "wave").result()
+    assert not preloaded("wave")
+
+
+def test_sweeps_reuse_the_warm_workers():
+    first, second = sweep(4), sweep(4)
+    assert first["n"].tolist() == [0, 1, 2, 3]
+    pids = set(first["pid"])
+    assert pids <= {process.pid for process in worker_pool(2)._processes.values()}
+    assert set(second["pid"]) <= pids
+    assert os.getpid() not in pids
+
+
+def test_shutdown_starts_a_new_pool_next_time():
+    pids = set(sweep(2)["pid"])
+    shutdown_worker_pool()
+    assert not _pools
+    assert not set(sweep(2)["pid"]) & pids
+
+
+def test_broken_pool_is_replaced():
+    with pytest.raises(BrokenProcessPool):
+        run_simulations([{"crash": True}, {"n": 1}], fake_simulate, workers=2)
+    assert 2 not in _pools
+    assert sweep(2)["msg"].tolist() == ["simulation ended"] * 2
@@ -0,0 +1,144 @@
+"""
+Compact storage for sampled time series such as the queue length samples of QueueMonitor.
+
+Consecutive samples with the same value are stored as one run (start time, sample count, value),
+so a queue that does not change for days costs a single run instead of one tuple per sample.
+The encoding is lossless: decoding returns exactly the sampled (time, value) pairs.
+"""
+
+import ast
+from typing import TYPE_CHECKING, Iterable, List, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:  # pandas is imported when a DataFrame is built, not by simulate
+    import pandas as pd
+
+
+TIME_COLUMN = "time[minutes]"
+VALUE_COLUMN = "value"
+
+
+class CompressedTimeSeries:
+    """
+    Run-length encoded time series sampled at a fixed interval.
+
+    A run covers `counts[i]` samples with value `values[i]` at the times
+    `starts[i] + k * interval` (k = 0 .. counts[i] - 1).
+    A new run is started whenever the value changes or a sample time deviates
+    from the regular grid, which keeps decoding exact for any input.
+    """
+
+    def __init__(self, interval: float = 1, starts=(), counts=(), values=()):
+        self.interval = float(interval)
+        self._starts = [float(t) for t in starts]
+        self._counts = [int(n) for n in counts]
+        self._values = [int(v) for v in values]
+
+    @classmethod
+    def from_samples(
+        cls, samples: Iterable[Tuple[float, int]], interval: float = 1
+    ) -> "CompressedTimeSeries":
+        """Encode a sequence of (time, value) tuples."""
+        ts = cls(interval=interval)
+        for t, value in samples:
+            ts.append(t, value)
+        return ts
+
+    def append(self, t: float, value: int) -> None:
+        """Add one sample; extends the current run if the value and the sample grid match."""
+        if (
+            self._values
+            and value == self._values[-1]
+            and self._starts[-1] + self._counts[-1] * self.interval == t
+        ):
+            self._counts[-1] += 1
+        else:
+            self._starts.append(t)
+            self._counts.append(1)
+            self._values.append(value)
+
+    @property
+    def starts(self) -> np.ndarray:
+        return np.asarray(self._starts, dtype=np.float64)
+
+    @property
+    def counts(self) -> np.ndarray:
+        return np.asarray(self._counts, dtype=np.int32)
+
+    @property
+    def values(self) -> np.ndarray:
+        return np.asarray(self._values, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def n_runs(self) -> int:
+        return len(self._counts)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CompressedTimeSeries):
+            return NotImplemented
+        return self.to_literal() == other.to_literal()
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the sample times (float64) and values (int32) as numpy arrays."""
+        counts = self.counts
+        run_index = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(len(run_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+        times = self.starts[run_index] + offsets * self.interval
+        return times, self.values[run_index]
+
+    def to_list(self) -> List[Tuple[float, int]]:
+        """Return the samples as list of (time, value) tuples, the format QueueMonitor used to return."""
+        times, values = self.decode()
+        return list(zip(times.tolist(), values.tolist()))
+
+    def to_frame(
+        self, time_column: str = TIME_COLUMN, value_column: str = VALUE_COLUMN
+    ) -> "pd.DataFrame":
+        """Decode into a DataFrame with one row per sample."""
+        import pandas as pd
+
+        times, values = self.decode()
+        return pd.DataFrame({time_column: times, value_column: values})
+
+    def to_literal(self) -> dict:
+        """Return a dict of plain Python lists, suitable for str()/ast.literal_eval and JSON."""
+        return {
+            "interval": self.interval,
+            "starts": list(self._starts),
+            "counts": list(self._counts),
+            "values": list(self._values),
+        }
+
+    @classmethod
+    def from_literal(cls, literal) -> "CompressedTimeSeries":
+        """Inverse of to_literal; also accepts the str() representation."""
+        if isinstance(literal, str):
+            literal = ast.literal_eval(literal)
+        return cls(**literal)
+
+    def __str__(self) -> str:
+        return str(self.to_literal())
+
+    def __repr__(self) -> str:
+        return f"CompressedTimeSeries(samples={len(self)}, runs={self.n_runs()}, interval={self.interval})"
+
+
+def timeseries_to_frame(
+    time_series, time_column: str = TIME_COLUMN, value_column: str = VALUE_COLUMN
+) -> "pd.DataFrame":
+    """
+    Convert a stored time series to a DataFrame.
+    Accepts a CompressedTimeSeries, its literal (dict or string) or a legacy list of (time, value) tuples.
+    """
+    if isinstance(time_series, str):
+        time_series = ast.literal_eval(time_series)
+    if isinstance(time_series, dict):
+        time_series = CompressedTimeSeries.from_literal(time_series)
+    if isinstance(time_series, CompressedTimeSeries):
+        return time_series.to_frame(time_column, value_column)
+    import pandas as pd
+
+    return pd.DataFrame(list(time_series), columns=[time_column, value_column])
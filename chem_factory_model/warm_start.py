@@ -0,0 +1,124 @@
+"""
+Fork many what-if continuations from one warmed-up simulation state.
+
+A salabim run cannot be pickled (its processes are greenlets), so the warm state is shared with
+os.fork: simulate runs until fork_at, then the process is forked once per continuation. Every child
+inherits the complete state (queues, stock, batches in flight, random streams and monitors),
+applies its own downstream parameters and runs on to run_duration. The results are sent back to
+the parent through a pipe. At most max_parallel continuations run at the same time and they use
+common random numbers.
+
+Without os.fork (Windows) every continuation repeats the warm-up, with identical results.
+"""
+
+import os
+import pickle
+import random
+import select
+import sys
+from typing import Callable, Dict, List
+
+from chem_simulation import check_forkable
+
+
+def fork_continuations(
+    simulate: Callable,
+    params: Dict,
+    fork_at: float,
+    variants: List[Dict],
+    max_parallel: int = None,
+    check_variant: Callable[[Dict], None] = check_forkable,
+) -> List[Dict]:
+    """
+    Run simulate(**params) until fork_at and continue it once per variant, a dict with the
+    changed parameters (see chem_simulation.check_forkable), e.g.
+        fork_continuations(simulate, {"random_seed": 0}, 30 * DAY,
+                           [{"server_packaging_capacity": c} for c in (1, 2, 3)])
+    Every variant is checked with check_variant before the run.
+    max_parallel: maximum number of continuations running at the same time
+        (default: the number of CPUs)
+    Returns the results in the order of the variants.
+    """
+    for variant in variants:
+        check_variant(variant)
+    if not variants:
+        return []
+    if not hasattr(os, "fork"):
+        return [
+            simulate(**params, fork_at=fork_at, fork=lambda env, variant=variant: variant)
+            for variant in variants
+        ]
+    max_parallel = max(1, max_parallel or os.cpu_count() or 1)
+    results = [None] * len(variants)
+    children = {}  # read end of the result pipe -> (variant index, pid) per running child
+    child_pipe = None
+
+    def collect(read_fd: int) -> None:
+        index, pid = children.pop(read_fd)
+        with os.fdopen(read_fd, "rb") as f:
+            try:
+                results[index] = pickle.load(f)
+            except EOFError:
+                results[index] = RuntimeError(f"continuation process {pid} died")
+        os.waitpid(pid, 0)
+
+    def wait_for_slots(n_free: int) -> None:
+        """Collect finished children until at most max_parallel - n_free are running."""
+        while len(children) > max_parallel - n_free:
+            ready, _, _ = select.select(list(children), [], [])
+            collect(ready[0])
+
+    def fork(env) -> Dict:
+        nonlocal child_pipe
+        sys.stdout.flush()  # otherwise buffered output is printed by every child
+        sys.stderr.flush()
+        random_state = random.getstate()
+        for index, variant in enumerate(variants[:-1]):
+            wait_for_slots(1)
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # the random module reseeds its global stream (used by salabim) in a forked child
+                random.setstate(random_state)
+                os.close(read_fd)
+                for fd in children:
+                    os.close(fd)
+                children.clear()
+                child_pipe = write_fd
+                return variant
+            os.close(write_fd)
+            children[read_fd] = (index, pid)
+        wait_for_slots(1)
+        return variants[-1]  # the parent runs the last continuation itself
+
+    try:
+        try:
+            result = simulate(**params, fork_at=fork_at, fork=fork)
+        except BaseException as e:
+            if child_pipe is None:
+                raise
+            result = e
+        if child_pipe is not None:
+            _send_and_exit(child_pipe, result)
+    finally:
+        # also when the parent fails: no child is left unwaited or with an open pipe
+        while children:
+            collect(next(iter(children)))
+
+    results[-1] = result
+    for child_result in results:
+        if isinstance(child_result, BaseException):
+            raise child_result
+    return results
+
+
+def _send_and_exit(pipe: int, result) -> None:
+    """Send the result of a forked continuation to the parent and end the child process."""
+    try:
+        with os.fdopen(pipe, "wb") as f:
+            try:
+                pickle.dump(result, f)
+            except Exception as e:
+                pickle.dump(RuntimeError(f"result cannot be sent: {e}"), f)
+    finally:
+        os._exit(0)